@@ -0,0 +1,40 @@
+"""
+特征计算基准：比较全量历史计算与只计算尾部（windows + 预热长度）的耗时，以及 PSY 向量化前后的耗时
+
+    python benchmarks/bench_features.py --bars 10000 20000 50000 --windows 50
+"""
+import argparse
+import time
+from fin_mcp_server.stock.stock_feature import create_tech_indiction_features, psy
+from synthetic import synthetic_ohlcv
+
+
+def timeit(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, nargs="+", default=[10000, 20000, 50000])
+    parser.add_argument("--windows", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'bars':>8} {'psy_lambda':>12} {'psy_vector':>12} {'full':>10} {'tail':>10} {'speedup':>8}")
+    for bars in args.bars:
+        df = synthetic_ohlcv(bars)
+        close = df["Close"]
+        psy_lambda = timeit(lambda: close.rolling(12).apply(lambda x: sum(x > x.shift(1)) / 12 * 100), 1)
+        psy_vector = timeit(lambda: psy(close, 12), args.repeat)
+        full = timeit(lambda: create_tech_indiction_features(df, {}), args.repeat)
+        tail = timeit(lambda: create_tech_indiction_features(df, {}, windows=args.windows), args.repeat)
+        print(f"{bars:>8} {psy_lambda:>11.3f}s {psy_vector:>11.4f}s {full:>9.4f}s {tail:>9.4f}s {full / tail:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
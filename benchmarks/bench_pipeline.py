@@ -0,0 +1,251 @@
+"""
+离线流水线基准：合成行情 + 桩 Yahoo/LLM 后端，测量特征计算、绘图、图片编码、plot_with_tech_indicators
+以及多个并发客户端下端到端 generate_fin_report 的耗时，结果写入 JSON，便于在评审中对比性能回退
+
+    python benchmarks/bench_pipeline.py --output benchmarks/results/latest.json
+    python benchmarks/bench_pipeline.py --bars 1000 10000 50000 --clients 1 8 32 --compare baseline.json
+    python benchmarks/bench_pipeline.py --bars 1000 --clients 1 8 --modes vision fast   # 对比两种报告模式
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+from stubs import StubLLMClient, StubYahooClient
+from synthetic import synthetic_ohlcv
+
+
+def summarize(samples: list) -> dict:
+    return {"runs": len(samples), "min": min(samples), "median": statistics.median(samples),
+            "mean": statistics.fmean(samples), "max": max(samples)}
+
+
+def measure(fn, repeat: int, setup=None) -> dict:
+    """执行 repeat 次 fn，setup 在每次计时前执行且不计入耗时"""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def write_config(workdir: str, args) -> str:
+    """生成基准使用的配置文件：报告缓存立即过期，数据目录位于临时目录"""
+    config = {
+        "transport": "stdio",
+        "mcp": {},
+        "stock": {"source": "yahoo", "data_dir": os.path.join(workdir, "data"), "store_format": "parquet",
+                  "render": {"preset": "llm", "fast": True}, "public_base_url": "http://localhost"},
+        "executor": {"io_workers": 16, "io_queue": 1024, "cpu_workers": args.cpu_workers, "cpu_queue": 1024},
+        "report_cache": {"ttl_seconds": 0},
+        "llm": {"llm_type": "openai", "base_url": "http://localhost", "api_key": "bench", "model": "stub-llm",
+                "stream": True},
+    }
+    path = os.path.join(workdir, "config.yml")
+    with open(path, "w", encoding="utf-8") as file:
+        yaml.safe_dump(config, file)
+    return path
+
+
+def bench_features(results: list, args):
+    from fin_mcp_server.stock.stock_feature import create_tech_indiction_features
+    for bars in args.bars:
+        df = synthetic_ohlcv(bars)
+        params = {"bars": bars, "windows": args.windows}
+        results.append({"name": "create_tech_indiction_features.full", "params": params,
+                        **measure(lambda: create_tech_indiction_features(df, {}), args.repeat)})
+        results.append({"name": "create_tech_indiction_features.tail", "params": params,
+                        **measure(lambda: create_tech_indiction_features(df, {}, windows=args.windows), args.repeat)})
+        results.append({"name": "create_tech_indiction_features.chart", "params": params,
+                        **measure(lambda: create_tech_indiction_features(df, {}, windows=args.windows,
+                                                                         indicators="chart"), args.repeat)})
+
+
+def bench_render(results: list, args, workdir: str) -> dict:
+    """测量各渲染预设的 plot_kline 与图片编码，返回 {preset: 图片路径}"""
+    from fin_mcp_server.stock.frames import compact_frame
+    from fin_mcp_server.stock.stock_feature import create_tech_indiction_features, feature_lookback
+    from fin_mcp_server.utils.image import encode_image_for_llm, encode_image_to_base64
+    from fin_mcp_server.utils.plot import plot_kline
+
+    # 与 LocalStore 读取的数据一致使用 float32 价格列，fast 与 classic 两种渲染都覆盖该精度
+    history = compact_frame(synthetic_ohlcv(args.windows + feature_lookback({}, "chart")))
+    data = create_tech_indiction_features(history, {}, windows=args.windows, indicators="chart")
+    frame, current = data[-args.windows:], data.iloc[-1]
+    chart_dir = os.path.join(workdir, "charts")
+    images = {}
+    for preset in ("llm", "human"):
+        for fast in (True, False):
+            name = f"bench-{preset}-{'fast' if fast else 'classic'}.png"
+            results.append({"name": "plot_kline", "params": {"preset": preset, "fast": fast, "windows": args.windows},
+                            **measure(lambda: plot_kline(frame, current, chart_dir, "BENCH", name, preset=preset,
+                                                         fast=fast), args.repeat)})
+            images.setdefault(preset, os.path.join(chart_dir, name))
+
+    for preset, path in images.items():
+        params = {"preset": preset, "bytes": os.path.getsize(path)}
+        results.append({"name": "encode_image_to_base64", "params": params,
+                        **measure(lambda: encode_image_to_base64(path), args.repeat)})
+
+        def clear_sidecars():
+            for sidecar in glob.glob(f"{path}.*"):
+                os.remove(sidecar)
+
+        results.append({"name": "encode_image_for_llm.cold", "params": params,
+                        **measure(lambda: encode_image_for_llm(path), args.repeat, setup=clear_sidecars)})
+        results.append({"name": "encode_image_for_llm.cached", "params": params,
+                        **measure(lambda: encode_image_for_llm(path), args.repeat)})
+    return images
+
+
+def bench_plot_with_tech_indicators(results: list, args, stock_config: dict):
+    from fin_mcp_server.stock import Stock
+
+    def clear_charts():
+        for chart in glob.glob(os.path.join(stock_config["data_dir"], "kline-*")):
+            os.remove(chart)
+
+    for preset in ("llm", "human"):
+        stock = Stock("PLOT", stock_config, {})
+        params = {"preset": preset, "windows": args.windows, "history_bars": args.history_bars}
+        results.append({"name": "Stock.plot_with_tech_indicators.cold", "params": params,
+                        **measure(lambda: stock.plot_with_tech_indicators(args.windows, preset), args.repeat,
+                                  setup=clear_charts)})
+        results.append({"name": "Stock.plot_with_tech_indicators.cached", "params": params,
+                        **measure(lambda: stock.plot_with_tech_indicators(args.windows, preset), args.repeat)})
+
+
+async def bench_reports(results: list, args, server, llm: StubLLMClient):
+    """
+    每轮使用新的股票代码，测量下载、渲染、编码与模型生成的完整冷启动路径；
+    各报告模式分别测量，对比 vision（K线图）与 fast（指标摘要）的延迟和 prompt token。
+    全部轮次在同一个事件循环中运行，与服务进程一致
+    """
+    for mode, clients in ((mode, clients) for mode in args.modes for clients in args.clients):
+        rounds, latencies = [], []
+        calls_before, prompt_tokens_before = llm.calls, llm.prompt_tokens
+        for round_index in range(args.repeat):
+            symbols = [f"R{mode[0].upper()}{clients}X{round_index}X{i}" for i in range(clients)]
+
+            async def request(symbol):
+                start = time.perf_counter()
+                content = await server.generate_fin_report(symbol, args.windows, mode=mode, ctx=None)
+                if content[0].text.startswith('{"error"'):
+                    raise RuntimeError(content[0].text)
+                latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(request(symbol) for symbol in symbols))
+            rounds.append(time.perf_counter() - start)
+        latencies.sort()
+        calls = llm.calls - calls_before
+        results.append({"name": "generate_fin_report", "params": {"mode": mode, "clients": clients,
+                                                                   "windows": args.windows,
+                                                                   "llm_latency": args.llm_latency},
+                        **summarize(rounds),
+                        "latency_p50": latencies[len(latencies) // 2],
+                        "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                        "throughput": clients * len(rounds) / sum(rounds),
+                        "llm_calls": calls,
+                        "prompt_tokens_per_call": (llm.prompt_tokens - prompt_tokens_before) / calls if calls else 0})
+
+
+def metadata(args) -> dict:
+    import matplotlib
+    import numpy
+    import pandas
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "commit": commit, "python": sys.version.split()[0],
+            "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "versions": {"pandas": pandas.__version__, "numpy": numpy.__version__,
+                         "matplotlib": matplotlib.__version__},
+            "args": vars(args)}
+
+
+def result_key(result: dict) -> str:
+    return f"{result['name']} {json.dumps(result['params'], sort_keys=True)}"
+
+
+def compare(results: list, baseline_path: str, threshold: float) -> bool:
+    """与基线比较中位数，返回是否存在超过阈值的回退"""
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = {result_key(r): r for r in json.load(file)["results"]}
+    regressed = False
+    print(f"\n{'case':<100} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for result in results:
+        base = baseline.get(result_key(result))
+        if base is None:
+            continue
+        ratio = result["median"] / base["median"] if base["median"] else float("inf")
+        flag = " !" if ratio > 1 + threshold else ""
+        regressed = regressed or bool(flag)
+        print(f"{result_key(result):<100} {base['median']:>9.4f}s {result['median']:>9.4f}s {ratio:>6.2f}x{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--history-bars", type=int, default=5000, help="桩 Yahoo 后端每只股票的历史K线数")
+    parser.add_argument("--windows", type=int, default=50)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--modes", nargs="+", default=["vision", "fast"], choices=["vision", "fast"],
+                        help="generate_fin_report 的报告模式")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cpu-workers", type=int, default=0, help="进程池大小，0 表示在 I/O 线程池中渲染")
+    parser.add_argument("--yahoo-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--output", help="结果 JSON 路径，默认只打印")
+    parser.add_argument("--compare", help="基线结果 JSON，中位数变慢超过阈值时以非零状态退出")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="fin-bench-")
+    try:
+        os.environ["YML"] = write_config(workdir, args)
+        from fin_mcp_server import server
+        from fin_mcp_server.utils.http import set_yahoo_client
+
+        yahoo = set_yahoo_client(StubYahooClient(args.history_bars, args.yahoo_latency))
+        server.yahoo_client = yahoo
+        llm = server.llm_client = server.text_llm_client = StubLLMClient(latency=args.llm_latency)
+
+        results = []
+        bench_features(results, args)
+        bench_render(results, args, workdir)
+        bench_plot_with_tech_indicators(results, args, server.stock_config)
+        asyncio.run(bench_reports(results, args, server, llm))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'case':<100} {'median':>10} {'min':>10} {'max':>10}")
+    for result in results:
+        print(f"{result_key(result):<100} {result['median']:>9.4f}s {result['min']:>9.4f}s {result['max']:>9.4f}s")
+    report = {"meta": metadata(args), "results": results}
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
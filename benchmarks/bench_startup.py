@@ -0,0 +1,153 @@
+"""
+启动基准：测量服务模块的冷启动导入耗时，以及 stdio 传输下从启动进程到响应 tools/list 的耗时，
+并检查启动时没有导入 pandas、matplotlib、talib、yfinance、openai 等重依赖
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --target 1.5 --importtime 20
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+# 启动时不应导入的重依赖，在首次调用工具时才加载
+HEAVY_MODULES = ["pandas", "numpy", "matplotlib", "mplfinance", "talib", "yfinance", "openai", "pyarrow"]
+IMPORT_SCRIPT = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import fin_mcp_server.server\n"
+    "elapsed = time.perf_counter() - start\n"
+    f"print(json.dumps({{'import': elapsed, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+)
+
+
+def write_config(workdir: str) -> str:
+    config = {
+        "transport": "stdio",
+        "mcp": {},
+        "stock": {"source": "yahoo", "data_dir": os.path.join(workdir, "data"), "public_base_url": "http://localhost"},
+        "executor": {"cpu_workers": 0},
+        "llm": {"llm_type": "openai", "base_url": "http://localhost", "api_key": "bench", "model": "stub-llm"},
+    }
+    path = os.path.join(workdir, "config.yml")
+    with open(path, "w", encoding="utf-8") as file:
+        yaml.safe_dump(config, file)
+    return path
+
+
+def measure_import(env: dict) -> dict:
+    """新的解释器中导入 fin_mcp_server.server，返回导入耗时、进程总耗时与已导入的重依赖"""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], env=env, capture_output=True, text=True, check=True)
+    total = time.perf_counter() - start
+    return {**json.loads(output.stdout.strip().splitlines()[-1]), "process": total}
+
+
+def measure_stdio(env: dict, timeout: float = 30) -> float:
+    """以 stdio 传输启动服务，返回从启动进程到收到 tools/list 响应的耗时"""
+    from mcp.types import LATEST_PROTOCOL_VERSION
+
+    requests = [
+        {"jsonrpc": "2.0", "id": 1, "method": "initialize",
+         "params": {"protocolVersion": LATEST_PROTOCOL_VERSION, "capabilities": {},
+                    "clientInfo": {"name": "bench-startup", "version": "0"}}},
+        {"jsonrpc": "2.0", "method": "notifications/initialized"},
+        {"jsonrpc": "2.0", "id": 2, "method": "tools/list"},
+    ]
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "fin_mcp_server"], env=env, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        process.stdin.write("".join(json.dumps(request) + "\n" for request in requests))
+        process.stdin.flush()
+        for line in process.stdout:
+            message = json.loads(line)
+            if message.get("id") == 2:
+                elapsed = time.perf_counter() - start
+                if "error" in message or not message["result"]["tools"]:
+                    raise RuntimeError(f"tools/list 失败: {message}")
+                return elapsed
+            if time.perf_counter() - start > timeout:
+                break
+        raise RuntimeError("服务未响应 tools/list")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def import_profile(env: dict, top: int) -> list:
+    """-X importtime 中累计耗时最长的顶层模块，(模块, 秒)"""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import fin_mcp_server.server"], env=env,
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in output.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)", line)
+        # 只统计直接由服务模块导入的第一层依赖，避免父子模块重复计算
+        if match and len(match.group(2)) <= 2:
+            modules[match.group(3)] = int(match.group(1)) / 1e6
+    return sorted(modules.items(), key=lambda item: -item[1])[:top]
+
+
+def summarize(samples: list) -> dict:
+    return {"runs": len(samples), "min": min(samples), "median": statistics.median(samples), "max": max(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--target", type=float, default=1.5,
+                        help="stdio 启动到响应 tools/list 的中位数目标（秒），超出时以非零状态退出")
+    parser.add_argument("--importtime", type=int, default=10, help="列出导入耗时最长的模块数，0 表示不列出")
+    parser.add_argument("--output", help="结果 JSON 路径，默认只打印")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="fin-bench-startup-")
+    try:
+        env = {**os.environ, "YML": write_config(workdir)}
+        imports = [measure_import(env) for _ in range(args.repeat)]
+        stdio = [measure_stdio(env) for _ in range(args.repeat)]
+        profile = import_profile(env, args.importtime) if args.importtime else []
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    heavy = sorted({module for run in imports for module in run["heavy"]})
+    results = {
+        "import": summarize([run["import"] for run in imports]),
+        "import_process": summarize([run["process"] for run in imports]),
+        "stdio_tools_list": summarize(stdio),
+        "heavy_modules": heavy,
+        "importtime": profile,
+        "target": args.target,
+    }
+    for name in ("import", "import_process", "stdio_tools_list"):
+        result = results[name]
+        print(f"{name:<20} median {result['median']:.3f}s  min {result['min']:.3f}s  max {result['max']:.3f}s")
+    print(f"{'heavy_modules':<20} {', '.join(heavy) or '无'}")
+    for module, seconds in profile:
+        print(f"  {module:<40} {seconds:.3f}s")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+
+    failed = False
+    if heavy:
+        print(f"启动时导入了重依赖: {', '.join(heavy)}")
+        failed = True
+    if results["stdio_tools_list"]["median"] > args.target:
+        print(f"stdio 启动耗时 {results['stdio_tools_list']['median']:.3f}s 超过目标 {args.target:.3f}s")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
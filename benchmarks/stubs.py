@@ -0,0 +1,108 @@
+"""
+离线基准使用的桩后端：不访问网络的 Yahoo 客户端与多模态模型客户端，按配置模拟网络延迟
+"""
+import asyncio
+import time
+import pandas as pd
+from fin_mcp_server.stock.store import slice_period
+from fin_mcp_server.utils.http import YahooClient
+from fin_mcp_server.utils.llm import LLMClient
+from synthetic import symbol_seed, synthetic_ohlcv
+
+
+class StubYahooClient(YahooClient):
+    """
+    返回合成行情的 YahooClient，仍经过限流、重试与指标统计，只替换实际的网络请求
+
+    Args:
+        bars: 每只股票的历史K线数
+        latency: 每次请求模拟的网络延迟（秒）
+    """
+
+    def __init__(self, bars: int = 5000, latency: float = 0.05):
+        super().__init__({"rate": 1000, "burst": 1000}, session=object())
+        self.bars = bars
+        self.latency = latency
+        self._frames = {}
+
+    def frame(self, symbol: str) -> pd.DataFrame:
+        if symbol not in self._frames:
+            self._frames[symbol] = synthetic_ohlcv(self.bars, symbol_seed(symbol))
+        return self._frames[symbol]
+
+    def _bars(self, symbol: str, start=None, period: str = "max") -> pd.DataFrame:
+        data = self.frame(symbol)
+        if start is not None:
+            data = data[data["Date"] >= pd.Timestamp(start)]
+        else:
+            data = slice_period(data, period)
+        return data.set_index("Date")
+
+    def download(self, tickers, start=None, period: str = "max", group_by: str = "column", **kwargs):
+        def fetch():
+            time.sleep(self.latency)
+            symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+            if len(symbols) == 1:
+                return self._bars(symbols[0], start, period)
+            return pd.concat({symbol: self._bars(symbol, start, period) for symbol in symbols}, axis=1)
+        return self.call(fetch)
+
+    def ticker_attr(self, symbol: str, attr: str, *args, **kwargs):
+        def fetch():
+            time.sleep(self.latency)
+            if attr == "history":
+                return self._bars(symbol, period=kwargs.get("period", "1mo"))
+            if attr == "info":
+                return {"shortName": symbol, "longName": f"{symbol} Inc.", "currency": "USD",
+                        "exchangeTimezoneName": "America/New_York"}
+            if attr == "calendar":
+                return {}
+            if attr == "quarterly_balance_sheet":
+                return pd.DataFrame({"2024-09-30": [1.0e9, 4.0e8]}, index=["Total Assets", "Total Debt"])
+            raise AttributeError(attr)
+        return self.call(fetch)
+
+
+class StubLLMClient(LLMClient):
+    """
+    模拟多模态模型：按 latency 等待后返回固定长度的报告，流式模式下分块回调
+
+    Args:
+        latency: 首个 token 之前的等待时间（秒）
+        tokens: 生成的 token 数
+        tokens_per_second: 生成速度
+    """
+
+    def __init__(self, latency: float = 0.5, tokens: int = 800, tokens_per_second: float = 400.0):
+        super().__init__("stub-llm")
+        self.latency = latency
+        self.tokens = tokens
+        self.tokens_per_second = tokens_per_second
+        self.calls = 0
+        self.prompt_tokens = 0
+
+    def _usage(self, message):
+        # 按消息字符数估算，图片以 base64 形式计入，用于比较各报告模式的输入规模
+        prompt_tokens = len(str(message)) // 4
+        self.prompt_tokens += prompt_tokens
+        return type("Usage", (), {"prompt_tokens": prompt_tokens, "completion_tokens": self.tokens,
+                                  "total_tokens": prompt_tokens + self.tokens})()
+
+    async def chat_completions(self, message, temperature: float = None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency + self.tokens / self.tokens_per_second)
+        return "# 报告\n" + "分析 " * self.tokens, self._usage(message)
+
+    async def chat_completions_stream(self, message, on_delta=None, temperature: float = None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        parts = []
+        chunk = 20
+        for start in range(0, self.tokens, chunk):
+            count = min(chunk, self.tokens - start)
+            await asyncio.sleep(count / self.tokens_per_second)
+            delta = "分析 " * count
+            parts.append(delta)
+            if on_delta is not None:
+                await on_delta(delta)
+        return "".join(parts), self._usage(message)
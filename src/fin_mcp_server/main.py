@@ -1,7 +1,9 @@
+from contextlib import asynccontextmanager
 from starlette.applications import Starlette
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse
 from starlette.routing import Route
+from starlette.concurrency import run_in_threadpool
 import logging
 import uvicorn
 import json
@@ -9,14 +11,16 @@ import os
 import yaml
 from argparse import Namespace
 from fin_mcp_server.stock import Stock
+from fin_mcp_server.utils.metrics import REGISTRY, span
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s -  %(filename)s:%(lineno)d - %(message)s"
 )
 logger = logging.getLogger("FIN_MCP_SERVER")
-async def startup_event():
+@asynccontextmanager
+async def lifespan(app):
     logger.info("Application initialized")
-async def shutdown_event():
+    yield
     logger.info("Application shutting down")
 
 def load_config(yaml_file:str = None, encoding: str = "utf-8"):
@@ -42,35 +46,56 @@ async def gen_report(request: Request) -> str:
     params =  request.query_params
     symbol = params.get("symbol")
     windows = int(params.get("windows", 30))
+    preset = params.get("preset", "human")
+    timeframe = params.get("timeframe", "1d")
     try:
         logger.info(f"Getting data for {symbol}")
-        stock = Stock(symbol=symbol, stock_config=stock_config, config = {})
-        chart_path = stock.plot_with_tech_indicators(windows=windows)
+        stock = Stock(symbol=symbol, stock_config=stock_config, config = {}, timeframe=timeframe)
+        with span("chart"):
+            chart_path = await run_in_threadpool(stock.plot_with_tech_indicators, windows=windows, preset=preset)
         print(chart_path)
     except Exception as e:
         print(f"Error fetching data: {str(e)}")
         return JSONResponse(content={"error": str(e)})
     return JSONResponse(content=chart_path)
 
+async def metrics(request: Request):
+    """Prometheus 文本格式的指标"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 def create_starlette_app():
     """Create a Starlette application that can server the provied fin server with API."""
     # 合并所有路由
     app = Starlette(
-        debug=True,
+        # 调试页面会暴露异常堆栈，只在开发（reload）模式下开启
+        debug=bool((getattr(global_config, "server", None) or {}).get("reload", False)),
         routes=[
-            Route("/report", gen_report, methods=["GET"])
+            Route("/report", gen_report, methods=["GET"]),
+            Route("/metrics", metrics, methods=["GET"]),
         ],
-        on_startup=[startup_event],
-        on_shutdown=[shutdown_event]
+        lifespan=lifespan,
     )
     return app
 
 app=create_starlette_app()
 def start():
+    """
+    默认以生产模式启动：不自动重载，按 server.workers 启动多个进程；--reload 用于开发
+    """
+    import argparse
+    server_config = {"workers": 1, "reload": False, **(getattr(global_config, "server", None) or {})}
+    parser = argparse.ArgumentParser(description="fin_mcp_server HTTP 服务")
+    parser.add_argument("--workers", type=int, default=int(server_config["workers"]), help="服务进程数")
+    parser.add_argument("--reload", action="store_true", default=bool(server_config["reload"]),
+                        help="代码变更时自动重启（开发模式，只能单进程）")
+    args = parser.parse_args()
     host = mcp_config['host']
     port = mcp_config['port']
-    logger.info(f"FIN_QT_SERVER starting  on {host}:{port}")
-    uvicorn.run(f"{__name__}:app", host=host, port=port,reload=True,log_level="info")
+    logger.info(f"FIN_QT_SERVER starting  on {host}:{port}, workers={1 if args.reload else args.workers}, "
+                f"reload={args.reload}")
+    # 多进程和重载都需要以导入路径指定应用，直接运行本文件时 __name__ 为 __main__
+    uvicorn.run("fin_mcp_server.main:app", host=host, port=port, reload=args.reload,
+                workers=None if args.reload else args.workers, log_level="info")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,239 @@
+"""
+收盘后预热自选股：同步最新K线、更新增量指标检查点并预先渲染K线图，使第二天的交互请求直接命中缓存
+
+可以随 MCP 服务在后台线程中运行（配置 prewarm.enabled），也可以作为独立进程运行：
+
+    YML=config.yml python -m fin_mcp_server.prewarm          # 按交易所收盘时间循环预热
+    YML=config.yml python -m fin_mcp_server.prewarm --once   # 立即预热一次后退出，适合 cron
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import argparse
+import logging
+import os
+import threading
+
+from .utils.fileio import try_file_lock
+from .utils.metrics import record_spans, span
+from .utils.symbols import normalize_symbols
+
+logger = logging.getLogger("fin_mcp_server")
+
+DEFAULT_PREWARM_CONFIG = {
+    "enabled": False,         # 是否在 MCP 服务进程中运行预热调度
+    "symbols": [],            # 自选股列表
+    "watchlist_file": None,   # 自选股文件，每行一个代码，# 开头为注释
+    "windows": [50],          # 预渲染的K线窗口大小
+    "delay_minutes": 30,      # 收盘后等待数据更新的分钟数
+    "concurrency": 4,         # 同时预热的股票数
+    "run_on_start": False,    # 启动时立即预热一次
+    "default_timezone": "America/New_York",  # 获取不到交易所时区时使用
+    "close_times": {},        # 按时区覆盖收盘时间，如 {"Asia/Tokyo": "15:30"}
+}
+# 常见交易所的收盘时间（当地时间），未列出的时区按 16:00 处理
+EXCHANGE_CLOSE_TIMES = {
+    "America/New_York": "16:00",
+    "America/Chicago": "15:00",
+    "America/Toronto": "16:00",
+    "Europe/London": "16:30",
+    "Europe/Berlin": "17:30",
+    "Europe/Paris": "17:30",
+    "Europe/Zurich": "17:30",
+    "Asia/Shanghai": "15:00",
+    "Asia/Hong_Kong": "16:10",
+    "Asia/Tokyo": "15:30",
+    "Asia/Seoul": "15:30",
+    "Asia/Taipei": "13:30",
+    "Asia/Singapore": "17:00",
+    "Asia/Kolkata": "15:30",
+    "Australia/Sydney": "16:10",
+}
+
+
+def load_watchlist(config: dict) -> list:
+    """合并配置中的 symbols 与 watchlist_file，去重并保持顺序"""
+    symbols = list(config.get("symbols") or [])
+    path = config.get("watchlist_file")
+    if path:
+        with open(path, "r", encoding="utf-8") as file:
+            symbols.extend(line.split("#", 1)[0].strip() for line in file)
+    return normalize_symbols(symbols)
+
+
+def next_run_time(tz_name: str, close_time: str, delay_minutes: float, now: datetime = None) -> datetime:
+    """
+    返回下一个交易日（周一至周五）收盘 delay_minutes 分钟后的时间（UTC）
+
+    按交易所当地时间计算，夏令时切换由 zoneinfo 处理；节假日不做特殊处理，当天同步不到新K线时预热开销很小。
+    """
+    tz = ZoneInfo(tz_name)
+    local_now = (now or datetime.now(timezone.utc)).astimezone(tz)
+    hour, minute = (int(part) for part in close_time.split(":"))
+    day = local_now.date()
+    while True:
+        close = datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz)
+        run_at = close + timedelta(minutes=delay_minutes)
+        if close.weekday() < 5 and run_at > local_now:
+            return run_at.astimezone(timezone.utc)
+        day += timedelta(days=1)
+
+
+class PrewarmScheduler:
+    """
+    在后台线程中按各交易所收盘时间预热自选股
+
+    自选股按 exchangeTimezoneName 分组，每个时区在收盘后单独预热；K线图渲染提交到共享的渲染进程池。
+    """
+
+    def __init__(self, config: dict, stock_config: dict, render_pool=None):
+        self.config = {**DEFAULT_PREWARM_CONFIG, **(config or {})}
+        self.stock_config = stock_config
+        self.render_pool = render_pool
+        self.symbols = load_watchlist(self.config)
+        self.windows = [int(w) for w in self.config["windows"]]
+        self.stats = {"runs": 0, "symbols": 0, "errors": 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def timezone_of(self, symbol: str) -> str:
+        """交易所时区来自公司信息（有缓存），无效时使用默认时区"""
+        from .stock import Stock
+        stock = Stock(symbol=symbol, stock_config=self.stock_config, config={})
+        tz_name = (stock.get_company_info(symbol) or {}).get("exchangeTimezoneName")
+        try:
+            ZoneInfo(tz_name)
+            return tz_name
+        except Exception:
+            return self.config["default_timezone"]
+
+    def close_time(self, tz_name: str) -> str:
+        return (self.config["close_times"] or {}).get(tz_name) or EXCHANGE_CLOSE_TIMES.get(tz_name, "16:00")
+
+    def group_by_timezone(self, symbols: list) -> dict:
+        groups = {}
+        for symbol in symbols:
+            groups.setdefault(self.timezone_of(symbol), []).append(symbol)
+        return groups
+
+    def warm_symbol(self, symbol: str):
+        """同步K线、更新指标检查点，并渲染每个窗口的K线图（已缓存的跳过）"""
+        # 调度器随服务启动创建，行情与绘图依赖在首次预热时才导入
+        from .stock import Stock
+        from .stock.stock import render_tech_chart, render_tech_chart_timed
+        stock = Stock(symbol=symbol, stock_config=self.stock_config, config={})
+        stock.load_data()
+        stock.update_indicator_state()
+        for windows in self.windows:
+            history = stock.load_plot_data(windows)
+            render_options = stock.render_options()
+            image_name = stock.chart_image_name(history, windows, render_options)
+            if stock.render_cache.lookup(image_name) is not None:
+                continue
+            args = (history, windows, stock.config, stock.temp_dir, symbol, image_name)
+            if self.render_pool is not None:
+                _, spans = self.render_pool.submit(render_tech_chart_timed, *args, **render_options).result()
+                record_spans(spans)
+            else:
+                render_tech_chart(*args, **render_options)
+        stock.render_cache.evict()
+
+    def warm(self, symbols: list):
+        # 服务进程与独立的预热进程共享 data_dir 时，同一组股票同时只由一个进程预热
+        lock_dir = os.path.join(self.stock_config["data_dir"], ".locks")
+        with try_file_lock("prewarm:" + ",".join(symbols), lock_dir) as acquired:
+            if not acquired:
+                logger.info(f"其他进程正在预热这 {len(symbols)} 只股票，跳过")
+                return
+            self._warm(symbols)
+
+    def _warm(self, symbols: list):
+        logger.info(f"开始预热 {len(symbols)} 只股票")
+        self.stats["runs"] += 1
+
+        def run(symbol) -> bool:
+            try:
+                self.warm_symbol(symbol)
+                return True
+            except Exception as e:
+                logger.warning(f"预热 {symbol} 失败: {e}")
+                return False
+
+        with span("prewarm"), ThreadPoolExecutor(max_workers=max(1, int(self.config["concurrency"])),
+                                                 thread_name_prefix="fin-prewarm") as pool:
+            results = list(pool.map(run, symbols))
+        # 在调用线程中汇总结果，工作线程不直接修改 stats
+        succeeded = sum(results)
+        self.stats["symbols"] += succeeded
+        self.stats["errors"] += len(results) - succeeded
+        logger.info(f"预热完成: {self.stats}")
+
+    def run_forever(self):
+        if self.config["run_on_start"]:
+            self.warm(self.symbols)
+        # 每个时区的下一次预热时间，只在该时区预热后才推到下一个交易日：
+        # 收盘时间相同的时区一起到期，预热期间到期的时区在下一轮立即预热
+        schedule = {}
+        while not self._stop.is_set():
+            groups = self.group_by_timezone(self.symbols)
+            if not groups:
+                logger.warning("自选股列表为空，预热调度退出")
+                return
+            schedule = {tz: schedule.get(tz) or next_run_time(tz, self.close_time(tz), self.config["delay_minutes"])
+                        for tz in groups}
+            run_at = min(schedule.values())
+            upcoming = [tz for tz, at in schedule.items() if at <= run_at]
+            logger.info(f"下一次预热: {', '.join(upcoming)} {sum(len(groups[tz]) for tz in upcoming)} 只股票，"
+                        f"{run_at.isoformat()}")
+            if self._stop.wait(max(0.0, (run_at - datetime.now(timezone.utc)).total_seconds())):
+                return
+            now = datetime.now(timezone.utc)
+            for tz_name in [tz for tz, at in schedule.items() if at <= now]:
+                if self._stop.is_set():
+                    return
+                self.warm(groups[tz_name])
+                schedule[tz_name] = next_run_time(tz_name, self.close_time(tz_name), self.config["delay_minutes"],
+                                                  now=schedule[tz_name])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name="fin-prewarm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def create_prewarm_scheduler(config: dict, stock_config: dict, render_pool=None):
+    """prewarm.enabled 开启且自选股不为空时启动后台调度，否则返回 None"""
+    config = {**DEFAULT_PREWARM_CONFIG, **(config or {})}
+    if not config["enabled"]:
+        return None
+    scheduler = PrewarmScheduler(config, stock_config, render_pool)
+    if not scheduler.symbols:
+        logger.warning("prewarm 已开启但自选股列表为空")
+        return None
+    logger.info(f"预热调度已启动，自选股 {len(scheduler.symbols)} 只")
+    return scheduler.start()
+
+
+def main():
+    from .utils.env import load_config
+    from .utils.http import configure_yahoo_client
+
+    parser = argparse.ArgumentParser(description="收盘后预热自选股的K线、指标与K线图")
+    parser.add_argument("--once", action="store_true", help="立即预热一次后退出")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s')
+    global_config = load_config()
+    configure_yahoo_client(getattr(global_config, "yahoo", None))
+    scheduler = PrewarmScheduler(getattr(global_config, "prewarm", None), global_config.stock)
+    if args.once:
+        scheduler.warm(scheduler.symbols)
+    else:
+        scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    main()
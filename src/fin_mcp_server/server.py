@@ -1,12 +1,27 @@
 from mcp.server import  FastMCP
+from mcp.server.fastmcp import Context
 from mcp.types import TextContent
-from .stock import Stock
 from .utils.llm import create_llm_client
-from .utils.image import encode_image_to_base64
+from .utils.cache import SingleFlight, TTLCache, cache_key
 from .utils.env import load_config
+from .utils.executor import create_executors
+from .utils.http import configure_yahoo_client
+from .utils.metrics import IMAGE_BYTES, REGISTRY, REPORT_SECONDS, record_llm_usage, record_spans, span, \
+    start_memory_tracing
+from .utils.progress import ProgressBroadcaster
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from typing import TYPE_CHECKING
+import asyncio
 import json
 import logging
 import os
+import sys
+import time
+
+# pandas、talib、matplotlib、openai 等依赖在首次使用时才导入，stdio 客户端每次启动服务都不必等待
+if TYPE_CHECKING:
+    from .stock import Stock
 
 
 
@@ -23,31 +38,124 @@ stock_config = global_config.stock
 mcp = FastMCP("fin_mcp_server", **mcp_config)
 llm_config = global_config.llm
 llm_client = create_llm_client(llm_config)
+# fast 模式只发送文本摘要，可以配置更快、更便宜的文本模型，未配置时使用同一个模型
+text_llm_client = create_llm_client({**llm_config, "model": llm_config["text_model"]}) \
+    if llm_config.get("text_model") else llm_client
+# 所有工具共享一个 Yahoo 会话、限流器和重试策略
+yahoo_client = configure_yahoo_client(getattr(global_config, "yahoo", None))
+# 价格与指标在内存中以 float32 保存，同一只股票的K线在进程内共享；trace 开启时各阶段同时记录峰值内存
+memory_trace = bool((stock_config.get("memory") or {}).get("trace", False))
+if memory_trace:
+    start_memory_tracing()
+# 阻塞的网络/磁盘操作放入线程池，指标计算与绘图放入进程池，避免阻塞事件循环
+io_executor, cpu_executor = create_executors(getattr(global_config, "executor", None),
+                                             start_memory_tracing if memory_trace else None)
+DEFAULT_SERVER_CONFIG = {
+    "workers": 1,     # streamable-http 传输下的服务进程数，共享同一个 data_dir
+    "reload": False,  # 代码变更时自动重启，仅用于开发（main.py 的 HTTP 服务）
+}
+# 报告缓存与并发请求合并：同一交易日相同参数的报告只调用一次模型
+report_cache_config = getattr(global_config, "report_cache", None) or {}
+report_cache = TTLCache(report_cache_config.get("ttl_seconds", 6 * 3600),
+                        os.path.join(stock_config['data_dir'], "reports"),
+                        max_items=report_cache_config.get("max_items", 1000))
+report_flight = SingleFlight()
+# 报告阶段：获取数据 → 计算指标并绘图 → 编码图片 → 模型生成
+report_progress = ProgressBroadcaster(total=4)
+
+
+
+def loaded_module(name: str):
+    """
+    返回已导入的子模块，尚未导入时返回 None
+
+    采集指标不应触发重依赖的导入；模块未导入时对应的计数必然为 0。
+    """
+    return sys.modules.get(f"{__package__}.{name}")
+
+
+# 各组件已有的命中/请求计数通过 /metrics 导出
+REGISTRY.register_stats("fin_cache_events_total", "Cache lookups by cache and result", {"cache": "report"},
+                        lambda: report_cache.stats)
+REGISTRY.register_stats("fin_cache_events_total", "Cache lookups by cache and result", {"cache": "render"},
+                        lambda: module.RenderCache.stats if (module := loaded_module("utils.render_cache")) else {})
+REGISTRY.register_stats("fin_cache_events_total", "Cache lookups by cache and result", {"cache": "fundamentals"},
+                        lambda: module.fundamentals_cache_stats() if (module := loaded_module("stock.stock")) else {})
+REGISTRY.register_stats("fin_cache_events_total", "Cache lookups by cache and result", {"cache": "resample"},
+                        lambda: module.get_resample_cache().stats if (module := loaded_module("stock.timeframe")) else {})
+REGISTRY.register_stats("fin_cache_events_total", "Cache lookups by cache and result", {"cache": "frames"},
+                        lambda: module.get_frame_registry().stats if (module := loaded_module("stock.frames")) else {})
+REGISTRY.gauge("fin_frame_registry_bytes", "Memory held by shared in-process bar frames",
+               lambda: module.get_frame_registry().bytes if (module := loaded_module("stock.frames")) else 0)
+REGISTRY.register_stats("fin_report_flight_total", "Report requests that started or joined a generation", {},
+                        lambda: report_flight.stats)
+REGISTRY.register_stats("fin_yahoo_requests_total", "Yahoo requests and retries", {}, lambda: yahoo_client.stats)
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request):
+    """Prometheus 文本格式的指标，仅在 sse / streamable-http 传输下可访问"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 
 @mcp.tool(name="get_compony_info", description="获取公司信息")
 async def get_compony_info(symbol: str):
     try:
+        from .stock import Stock
         logger.info(f"Getting data for {symbol}")
         stock = Stock(symbol=symbol, stock_config=stock_config, config = {})
-        data = stock.get_company_info(symbol)
+        with span("get_compony_info"):
+            data = await io_executor.run(stock.get_company_info, stock.symbol)
         return [TextContent(type='text', text=json.dumps(data))]
     except Exception as e:
         logger.error(f"Error fetching data: {e}")
         return [TextContent(type='text', text=json.dumps({"error": str(e)}))]
 
-@mcp.tool(name="get_data", description="获取股票数据,周期默认为 30d, 也可以取值 1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max")
-async def get_data(symbol: str, period: str = "30d"):
+@mcp.tool(name="get_data", description="获取股票数据,周期默认为 30d, 也可以取值 1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max；"
+                                        "K线周期 timeframe 默认为 1d，支持 1m, 5m, 15m, 30m, 1h, 4h, 1d, 1wk, 1mo, 3mo；"
+                                        "可选择列、只取最后 tail 行、限制行数，输出格式支持 markdown、csv、json、arrow")
+async def get_data(symbol: str, period: str = "30d", columns: list[str] = None, tail: int = None,
+                   limit: int = None, output_format: str = "markdown", timeframe: str = "1d"):
     """Fetch the data from yfinance through a company name
 
     Args:
         symbol: The symbol name to fetch the stock data
         period: The period to fetch the data for. Defaults to "30d". Can be one of "1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max" of rows to return
+        columns: Columns to return, e.g. ["Close", "Volume"]. Defaults to all columns
+        tail: Only return the last N rows, N >= 0
+        limit: Return at most N rows, N >= 0
+        output_format: "markdown" (default), "csv", "json" (column-oriented arrays) or "arrow" (base64 Arrow IPC stream)
+        timeframe: Bar size, resampled locally from stored bars. Defaults to "1d"
     """
     try:
+        from .stock import Stock
+        from .utils.frame_format import format_frame, select_frame
         logger.info(f"Getting data for {symbol}")
-        stock = Stock(symbol=symbol, stock_config=stock_config, config = {})
-        data = stock.get_history_data(period)
-        return [TextContent(type='text', text=data.to_markdown())]
+        stock = Stock(symbol=symbol, stock_config=stock_config, config = {}, timeframe=timeframe)
+        with span("get_data"):
+            data = await io_executor.run(stock.get_history_data, period)
+        with span("serialize"):
+            text = format_frame(select_frame(data, columns, tail, limit), output_format)
+        return [TextContent(type='text', text=text)]
+    except Exception as e:
+        logger.error(f"Error fetching data: {e}")
+        return [TextContent(type='text', text=json.dumps({"error": str(e)}))]
+
+@mcp.tool(name="get_data_batch", description="批量获取多只股票数据，一次请求返回全部结果，周期取值同 get_data")
+async def get_data_batch(symbols: list[str], period: str = "30d"):
+    """Fetch the data of several symbols with one grouped request
+
+    Args:
+        symbols: The symbol names to fetch the stock data
+        period: The period to fetch the data for. Defaults to "30d".
+    """
+    try:
+        from .stock.batch import batch_to_compact, fetch_history_batch
+        logger.info(f"Getting data for {len(symbols)} symbols")
+        with span("get_data_batch"):
+            results, errors = await io_executor.run(fetch_history_batch, symbols, period, stock_config)
+        data = batch_to_compact(results, errors, period)
+        return [TextContent(type='text', text=json.dumps(data, ensure_ascii=False, separators=(',', ':')))]
     except Exception as e:
         logger.error(f"Error fetching data: {e}")
         return [TextContent(type='text', text=json.dumps({"error": str(e)}))]
@@ -60,112 +168,424 @@ async def get_quarterly_balance_sheet(symbol: str):
         symbol: The symbol name to fetch the stock data
     """
     try:
+        from .stock import Stock
         logger.info(f"Getting data for {symbol}")
         stock = Stock(symbol=symbol, stock_config=stock_config, config = {})
-        data = stock.get_quarterly_balance_sheet()
+        with span("get_quarterly_balance_sheet"):
+            data = await io_executor.run(stock.get_quarterly_balance_sheet)
         return [TextContent(type='text', text=data.to_markdown())]
     except Exception as e:
         logger.error(f"Error fetching data: {e}")
         return [TextContent(type='text', text=json.dumps({"error": str(e)}))]
 
-@mcp.tool(name="generate_fin_report", description="根据股票数据和k线图生成专业的金融分析报告")
-async def generate_fin_report(symbol: str, windows:int=50):
+async def resolve_symbols(universe, timeframe: str = "1d") -> list:
+    """代码列表、逗号分隔的字符串、"local"（本地仓库中的全部股票）或 "watchlist"（预热自选股）转换为代码列表"""
+    from .stock.scan import resolve_universe
+    if isinstance(universe, str) and universe.strip().lower() == "watchlist":
+        from .prewarm import load_watchlist
+        universe = load_watchlist(getattr(global_config, "prewarm", None) or {})
+    return await io_executor.run(resolve_universe, universe, stock_config, timeframe)
+
+
+def split_symbols(symbols: list) -> list:
+    """按 stock.scan.chunk_size 分块，每块作为一个进程池任务，块数不超过执行池的并发与排队上限"""
+    from .stock.scan import DEFAULT_SCAN_CONFIG, split_chunks
+    chunk_size = {**DEFAULT_SCAN_CONFIG, **(stock_config.get("scan") or {})}["chunk_size"]
+    return split_chunks(symbols, chunk_size,
+                        cpu_executor.max_concurrency + cpu_executor.max_queue - cpu_executor.pending)
+
+
+@mcp.tool(name="scan_signals", description="在本地已保存的K线上按条件筛选多只股票，返回按得分或指定列排序的匹配结果；"
+                                           "条件如 \"RSI < 30\"、\"MACD cross_above MACD_SIGNAL\"、\"Close > EMA50\"，"
+                                           "交叉条件可加 within N 表示最近 N 根K线内发生；universe 为代码列表，"
+                                           "或 \"local\"（本地仓库中的全部股票）、\"watchlist\"（预热自选股）")
+async def scan_signals(universe: list[str] | str, conditions: list[str | dict], timeframe: str = "1d",
+                       rank_by: str = None, ascending: bool = False, limit: int = None, ctx: Context = None):
+    """Screen a universe of symbols with declarative indicator conditions over locally stored bars
+
+    Args:
+        universe: Symbols to scan, "local" for every symbol in the local store, or "watchlist" for the pre-warm watchlist
+        conditions: All must hold on the latest bar, e.g. ["RSI < 30", "MACD cross_above MACD_SIGNAL within 3"]
+            or [{"left": "RSI", "op": "<", "right": 30}]. Operators: <, <=, >, >=, ==, !=, cross_above, cross_below
+        timeframe: Bar size, resampled locally from stored bars. Defaults to "1d"
+        rank_by: Column to rank matches by (descending unless ascending is true). Defaults to the match score
+        limit: Return at most N matches. Defaults to stock.scan.max_results
+    """
+    try:
+        from .stock.scan import DEFAULT_SCAN_CONFIG, format_condition, parse_conditions, rank_matches, scan_chunk
+        scan_config = {**DEFAULT_SCAN_CONFIG, **(stock_config.get("scan") or {})}
+        parsed = parse_conditions(conditions, {}, rank_by)
+        symbols = await resolve_symbols(universe, timeframe)
+        logger.info(f"Scanning {len(symbols)} symbols with {len(parsed)} conditions")
+        chunks = split_symbols(symbols)
+        matches, errors, done = [], {}, 0
+        with span("scan"):
+            tasks = [cpu_executor.run(scan_chunk, chunk, parsed, stock_config, {}, timeframe, rank_by)
+                     for chunk in chunks]
+            for task in asyncio.as_completed(tasks):
+                chunk_matches, chunk_errors = await task
+                matches.extend(chunk_matches)
+                errors.update(chunk_errors)
+                done += 1
+                if ctx is not None:
+                    await ctx.report_progress(done, len(chunks), f"已筛选 {done}/{len(chunks)} 组")
+        results = rank_matches(matches, rank_by, ascending, limit or scan_config["max_results"])
+        data = {"timeframe": timeframe, "conditions": [format_condition(c) for c in parsed], "scanned": len(symbols),
+                "matched": len(matches), "results": results, "errors": errors}
+        return [TextContent(type='text', text=json.dumps(data, ensure_ascii=False, separators=(',', ':')))]
+    except Exception as e:
+        logger.error(f"Error scanning signals: {e}")
+        return [TextContent(type='text', text=json.dumps({"error": str(e)}, ensure_ascii=False))]
+
+async def search_similar(stock: "Stock", length: int, top_k: int, horizons: list, universe=None) -> dict:
+    """
+    以 stock 最近 length 根K线为查询，在其自身历史（universe 为空时）或 universe 的本地K线中检索相似形态
+
+    检索在进程池中按块执行，每块返回块内最近的 top_k 段，最后合并为全局的 top_k。
+    """
+    from .stock.similar import merge_matches, search_chunk, similar_result
+    length, top_k = int(length), int(top_k)
+    horizons = sorted({int(h) for h in horizons or []})
+    if length < 5 or top_k < 1 or not horizons or horizons[0] < 1:
+        raise ValueError("length must be at least 5, top_k and horizons must be positive")
+    history = await io_executor.run(stock.load_data)
+    if len(history) < length:
+        raise ValueError(f"没有足够的K线检索相似形态: {stock.symbol}")
+    query = history.tail(length)
+    symbols = await resolve_symbols(universe, stock.timeframe) if universe else [stock.symbol]
+    tasks = [cpu_executor.run(search_chunk, chunk, query["Close"].tolist(), top_k, horizons, stock_config,
+                              stock.timeframe, stock.symbol, query["Date"].iloc[0])
+             for chunk in split_symbols(symbols)]
+    matches, errors = [], {}
+    for chunk_matches, chunk_errors in await asyncio.gather(*tasks):
+        matches.extend(chunk_matches)
+        errors.update(chunk_errors)
+    return similar_result(stock.symbol, stock.timeframe, query, len(symbols), merge_matches(matches, top_k), errors,
+                          horizons)
+
+
+@mcp.tool(name="find_similar_patterns", description="以股票最近 length 根K线的收盘价走势为查询，在其自身历史或 universe 的本地K线中"
+                                                     "检索 z 标准化后最相似的 top_k 段历史走势，返回每段之后第 N 根K线的涨跌幅及统计")
+async def find_similar_patterns(symbol: str, length: int = None, top_k: int = None, horizons: list[int] = None,
+                                universe: list[str] | str = None, timeframe: str = "1d"):
+    """Find the historical windows most similar to the latest bars of a symbol and how they played out
+
+    Args:
+        symbol: The symbol whose latest bars are the query
+        length: Number of latest bars to match. Defaults to stock.similar.length
+        top_k: Number of matches to return. Defaults to stock.similar.top_k
+        horizons: Report the return N bars after each match, e.g. [5, 10, 20]. Defaults to stock.similar.horizons
+        universe: Search these symbols' stored history ("local" for the whole local store, "watchlist" for the
+            pre-warm watchlist). Defaults to the symbol's own history
+        timeframe: Bar size, resampled locally from stored bars. Defaults to "1d"
+    """
+    try:
+        from .stock import Stock
+        from .stock.similar import DEFAULT_SIMILAR_CONFIG
+        similar_config = {**DEFAULT_SIMILAR_CONFIG, **(stock_config.get("similar") or {})}
+        logger.info(f"Searching similar patterns for {symbol}")
+        stock = Stock(symbol=symbol, stock_config=stock_config, config = {}, timeframe=timeframe)
+        with span("similar"):
+            result = await search_similar(stock, length or similar_config["length"], top_k or similar_config["top_k"],
+                                          horizons or similar_config["horizons"], universe or similar_config["universe"])
+        return [TextContent(type='text', text=json.dumps(result, ensure_ascii=False, separators=(',', ':')))]
+    except Exception as e:
+        logger.error(f"Error searching similar patterns: {e}")
+        return [TextContent(type='text', text=json.dumps({"error": str(e)}, ensure_ascii=False))]
+
+# 修改 SYSTEM_PROMPT 或报告输入时递增，使已缓存的报告失效
+PROMPT_VERSION = 3
+SYSTEM_PROMPT = (
+    "你是一位专业的金融分析师，擅长技术分析和股票市场解读。\n"
+    "请根据提供的K线图和技术指标进行详细分析，包括："
+    "1. 价格趋势分析（短期、中期、长期趋势）\n"
+    "2. 关键技术指标解读（MACD、RSI、KDJ、布林带、ATR等3个以上指标协同验证）\n"
+    "3. 量价时空分析（结合波动周期与成交量分布）\n"
+    "4. 动态支撑压力位计算（斐波那契+波动率ATR）\n"
+    "5. 风险预警信号（黑天鹅事件概率模型）\n"
+    "6. 风险收益比计算（基于ATR计算潜在盈亏比）\n"
+    "7. 交易策略建议（包含止盈止损位，明确入场/离场条件)\n"
+    "请提供专业、详细的分析报告。"
+    "附加要求："
+    "- 使用机构级术语（如\"轧空\"、\"多空转换点\"、\"背离\"）"
+    "- 标注置信度等级（A/B/C级）"
+    "- 区分日内/趋势策略适用性"
+    "- 引用历史相似形态表现（只使用提供的历史相似形态数据，未提供时注明无数据，不要编造）"
+    "- 提供具体的价格目标位和止损位"
+    "- 评估当前市场环境对策略的影响"
+    "输出报告格式，以markdown格式输出，要求输出报告内容参考如下："
+    "# [股票代码] [公司名称] - 金融分析报告\n"
+    "*报告日期: [YYYY-MM-DD]*\n\n"
+    "## 1. 核心指标概览\n"
+    "| 指标 | 当前值 | 变化率 | 说明 |\n"
+    "|------|--------|--------|------|\n"
+    "| 当前股价 | $XX.XX | +X.XX% | 相比前一日收盘价 |\n"
+    "| 开盘价 | $XX.XX | +X.XX% | 今日开盘价格 |\n"
+    "| 最高价 | $XX.XX | +X.XX% | 今日最高价格 |\n"
+    "| 最低价 | $XX.XX | +X.XX% | 今日最低价格 |\n"
+    "| 成交量 | XXX万 | +X.XX% | 相比昨日成交量 |\n"
+    "| 换手率 | XX.XX% | +X.XX% | 昨日换手率 |\n"
+    
+    "## K线图"
+    "[图片地址]"
+    "## 2. 基本面分析\n"
+    "## 3. 风险提示\n"
+    "## 4. 市场情绪分析\n"
+    "## 5. 投资建议\n"
+)
+# 修改 DIGEST_SYSTEM_PROMPT 或指标摘要格式时递增
+DIGEST_PROMPT_VERSION = 2
+DIGEST_SYSTEM_PROMPT = (
+    "你是一位专业的金融分析师，擅长技术分析和股票市场解读。\n"
+    "请根据提供的技术指标摘要进行详细分析。摘要由行情数据计算得到，包含最新值及其变化、"
+    "最近的交叉信号、价格与指标的背离，以及由ATR、布林带、均线和区间高低点得到的支撑压力位。\n"
+    "分析内容包括：价格趋势（短期、中期、长期）、至少3个指标的协同验证、量价关系、支撑压力位、"
+    "风险预警信号、基于ATR的风险收益比，以及包含入场/离场条件、止盈止损位的交易策略。\n"
+    "要求：只使用摘要中给出的数值，不要编造摘要以外的价格或指标；标注置信度等级（A/B/C级）；区分日内/趋势策略适用性。\n"
+    "如果提供了历史相似形态，引用其后续涨跌幅统计作为参考，不要编造未提供的历史案例。\n"
+    "以markdown格式输出，参考如下结构：\n"
+    "# [股票代码] - 金融分析报告\n"
+    "*报告日期: [YYYY-MM-DD]*\n\n"
+    "## 1. 核心指标概览\n"
+    "| 指标 | 当前值 | 变化率 | 说明 |\n"
+    "|------|--------|--------|------|\n"
+    "## 2. 技术面分析\n"
+    "## 3. 风险提示\n"
+    "## 4. 投资建议\n"
+)
+# 报告模式 -> 需要预热的指标组合
+REPORT_MODES = {"vision": "chart", "fast": "digest"}
+
+
+def bars_description(windows: int, timeframe: str) -> str:
+    return f"{windows} 个交易日" if timeframe == "1d" else f"{windows} 根 {timeframe} K线"
+
+
+async def _build_report(stock: "Stock", history, windows: int, image_name: str, render_options: dict, key: str,
+                        similar_text: str = "") -> str:
+    """渲染K线图、编码图片并调用多模态模型生成报告，各阶段进度通过 report_progress 转发"""
+    from .stock.stock import render_tech_chart_timed
+    from .utils.image import encode_image_for_llm
+    symbol = stock.symbol
+    await report_progress.stage(key, 1, "计算技术指标并绘制K线图")
+    cached = stock.render_cache.lookup(image_name)
+    if cached is not None:
+        chart_path, image_name = cached
+    else:
+        with span("render"):
+            result, spans = await cpu_executor.run(render_tech_chart_timed, history, windows, stock.config,
+                                                   stock.temp_dir, stock.chart_label, image_name, **render_options)
+        # 指标计算与绘图在工作进程中执行，耗时随结果带回
+        record_spans(spans)
+        chart_path, image_name = result or (None, image_name)
+        await io_executor.run(stock.render_cache.evict)
+    if not chart_path or not os.path.exists(chart_path):
+        raise ValueError(f"图表生成失败: {chart_path}")
+    # 将图片转换为base64编码
+    await report_progress.stage(key, 2, "编码K线图")
+    with span("encode"):
+        encoded_image, image_stats = await io_executor.run(encode_image_for_llm, chart_path, llm_config.get("image"))
+    if not encoded_image:
+        raise ValueError("图片编码失败")
+    IMAGE_BYTES.observe(image_stats["original_bytes"], kind="original")
+    IMAGE_BYTES.observe(image_stats["base64_bytes"], kind="base64")
+    logger.debug(f"Chart image for {symbol}: {image_stats}")
+    messages = [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT,
+        },
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": encoded_image
+                    }
+                },
+                {
+                    "type": "text",
+                    "text": f"请分析 {symbol} 的k线技术图表[图片地址：{stock_config.get('public_base_url')}/static/{image_name}]，提供详细的技术分析报告。图表显示了最近 {bars_description(windows, stock.timeframe)}的数据。"
+                            + (f"\n{similar_text}" if similar_text else "")
+                },
+            ],
+        }
+    ]
+    analysis_result = await _complete(llm_client, messages, key, "vision")
+    logger.info(f"Successfully generated analysis report for {symbol}")
+    return analysis_result
+
+
+async def _complete(client, messages, key: str, mode: str) -> str:
+    """调用模型生成报告，流式输出的增量文本通过 report_progress 转发"""
+    await report_progress.stage(key, 3, "模型生成报告")
+    with span("llm"):
+        if llm_config.get("stream", True):
+            # 流式输出：增量文本随进度通知发送，客户端无需等待完整报告
+            async def on_delta(text):
+                await report_progress.text(key, text)
+
+            analysis_result, usage = await client.chat_completions_stream(
+                messages,
+                on_delta=on_delta,
+                temperature=llm_config.get("temperature", 0.7),
+                max_tokens=llm_config.get("max_tokens", 4096),
+            )
+            await report_progress.flush(key)
+        else:
+            llm_response, usage = await client.chat_completions(
+                messages,
+                temperature=llm_config.get("temperature", 0.7),
+                max_tokens=llm_config.get("max_tokens", 4096),
+            )
+            # 处理LLM响应
+            if hasattr(llm_response, 'content'):
+                analysis_result = llm_response.content
+            else:
+                analysis_result = str(llm_response)
+    record_llm_usage(client.model, usage, mode)
+    return analysis_result
+
+
+async def _build_text_report(stock: "Stock", windows: int, digest_text: str, key: str, similar_text: str = "") -> str:
+    """只把指标摘要发送给文本模型生成报告，跳过K线图渲染与图片编码"""
+    messages = [
+        {
+            "role": "system",
+            "content": DIGEST_SYSTEM_PROMPT,
+        },
+        {
+            "role": "user",
+            "content": f"以下是 {stock.symbol} 最近 {bars_description(windows, stock.timeframe)}的技术指标摘要，"
+                       f"请据此提供详细的技术分析报告。\n{digest_text}" + (f"\n{similar_text}" if similar_text else ""),
+        }
+    ]
+    analysis_result = await _complete(text_llm_client, messages, key, "fast")
+    logger.info(f"Successfully generated fast analysis report for {stock.symbol}")
+    return analysis_result
+
+
+@mcp.tool(name="generate_fin_report", description="根据股票数据和k线图生成专业的金融分析报告；"
+                                                   "mode 为 vision 时由多模态模型分析K线图，fast 时只把技术指标摘要发送给文本模型，速度更快；"
+                                                   "similar 为 true 时附上历史相似形态的后续表现")
+async def generate_fin_report(symbol: str, windows:int=50, timeframe: str = "1d", mode: str = None,
+                              similar: bool = None, ctx: Context = None):
     """ Generate financial analysis report based on specified company stock information
     Args:
         symbol: The symbol name to fetch the stock data
         windows: 图表显示的K线窗口大小
+        timeframe: K线周期，默认 1d，支持 1m, 5m, 15m, 30m, 1h, 4h, 1d, 1wk, 1mo, 3mo
+        mode: 报告模式，vision（K线图 + 多模态模型）或 fast（指标摘要 + 文本模型），默认使用 llm.report_mode
+        similar: 是否检索历史相似形态并把其后续涨跌幅加入提示词，默认使用 stock.similar.in_report
     """
     try:
-        logger.info(f"Generating financial report for {symbol} with {windows} windows")
-        stock = Stock(symbol=symbol, stock_config=stock_config, config = {})
-        chart_path,image_name = stock.plot_with_tech_indicators(windows=windows)
-        if not chart_path or not os.path.exists(chart_path):
-            error_msg = f"图表生成失败: {chart_path}"
-            logger.error(error_msg)
-            return [TextContent(type='text', text=json.dumps({"error": error_msg}))]
-        # 将图片转换为base64编码
-        encoded_image = encode_image_to_base64(chart_path)
-        if not encoded_image:
-            error_msg = "图片编码失败"
-            logger.error(error_msg)
-            return [TextContent(type='text', text=json.dumps({"error": error_msg}))]
-        
-        system_message = (
-                "你是一位专业的金融分析师，擅长技术分析和股票市场解读。\n"
-                "请根据提供的K线图和技术指标进行详细分析，包括："
-                "1. 价格趋势分析（短期、中期、长期趋势）\n"
-                "2. 关键技术指标解读（MACD、RSI、KDJ、布林带、ATR等3个以上指标协同验证）\n"
-                "3. 量价时空分析（结合波动周期与成交量分布）\n"
-                "4. 动态支撑压力位计算（斐波那契+波动率ATR）\n"
-                "5. 风险预警信号（黑天鹅事件概率模型）\n"
-                "6. 风险收益比计算（基于ATR计算潜在盈亏比）\n"
-                "7. 交易策略建议（包含止盈止损位，明确入场/离场条件)\n"
-                "请提供专业、详细的分析报告。"
-                "附加要求："
-                "- 使用机构级术语（如\"轧空\"、\"多空转换点\"、\"背离\"）"
-                "- 标注置信度等级（A/B/C级）"
-                "- 区分日内/趋势策略适用性"
-                "- 引用历史相似形态表现（如可提供）"
-                "- 提供具体的价格目标位和止损位",
-                "- 评估当前市场环境对策略的影响"
-                "输出报告格式，以markdown格式输出，要求输出报告内容参考如下："
-                "# [股票代码] [公司名称] - 金融分析报告\n"
-                "*报告日期: [YYYY-MM-DD]*\n\n"
-                "## 1. 核心指标概览\n"
-                "| 指标 | 当前值 | 变化率 | 说明 |\n"
-                "|------|--------|--------|------|\n"
-                "| 当前股价 | $XX.XX | +X.XX% | 相比前一日收盘价 |\n"
-                "| 开盘价 | $XX.XX | +X.XX% | 今日开盘价格 |\n"
-                "| 最高价 | $XX.XX | +X.XX% | 今日最高价格 |\n"
-                "| 最低价 | $XX.XX | +X.XX% | 今日最低价格 |\n"
-                "| 成交量 | XXX万 | +X.XX% | 相比昨日成交量 |\n"
-                "| 换手率 | XX.XX% | +X.XX% | 昨日换手率 |\n"
-                
-                "## K线图"
-                "[图片地址]"
-                "## 2. 基本面分析\n"
-                "## 3. 风险提示\n"
-                "## 4. 市场情绪分析\n"
-                "## 5. 投资建议\n"
-        )
-        messages = [
-            {
-                "role": "system",
-                "content": system_message,
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": encoded_image
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": f"请分析 {symbol} 的k线技术图表[图片地址：{stock_config.get("public_base_url")}/static/{image_name}]，提供详细的技术分析报告。图表显示了最近 {windows} 个交易日的数据。"
-                    },
-                ],
-            }
-        ]
-        llm_response, _ = await llm_client.chat_completions(
-            messages,
-            temperature=llm_config.get("temperature", 0.7),
-            max_tokens=llm_config.get("max_tokens", 4096),
-        )
-        # 处理LLM响应
-        if hasattr(llm_response, 'content'):
-            analysis_result = llm_response.content
+        from .stock import Stock
+        from .stock.digest import build_digest, format_digest
+        from .stock.similar import DEFAULT_SIMILAR_CONFIG, format_similar
+        mode = mode or llm_config.get("report_mode", "vision")
+        if mode not in REPORT_MODES:
+            raise ValueError(f"Unsupported report mode: {mode}, expected one of {list(REPORT_MODES)}")
+        logger.info(f"Generating {mode} financial report for {symbol} with {windows} windows")
+        if ctx is not None:
+            await ctx.report_progress(0, report_progress.total, "获取行情数据")
+        stock = Stock(symbol=symbol, stock_config=stock_config, config = {}, timeframe=timeframe)
+        symbol = stock.symbol
+        with span("fetch"):
+            history = await io_executor.run(stock.load_plot_data, windows, REPORT_MODES[mode])
+        similar_config = {**DEFAULT_SIMILAR_CONFIG, **(stock_config.get("similar") or {})}
+        similar_text = ""
+        if similar if similar is not None else similar_config["in_report"]:
+            # 相似形态只是补充信息，检索失败时照常生成报告
+            try:
+                with span("similar"):
+                    similar_text = format_similar(await search_similar(
+                        stock, similar_config["length"], similar_config["top_k"], similar_config["horizons"],
+                        similar_config["universe"]))
+            except Exception as e:
+                logger.warning(f"检索 {symbol} 的历史相似形态失败: {e}")
+        if mode == "fast":
+            # 最新一根K线的指标取自增量指标检查点，只处理检查点之后的新K线；失败时使用尾部数据计算的值
+            try:
+                latest = await io_executor.run(stock.update_indicator_state)
+            except Exception as e:
+                logger.warning(f"更新 {symbol} 的增量指标失败: {e}")
+                latest = None
+            with span("digest"):
+                digest = await cpu_executor.run(build_digest, history, stock.config, windows, stock.chart_label,
+                                                latest=latest)
+            if digest is None:
+                raise ValueError(f"没有足够的数据生成指标摘要: {symbol}")
+            digest_text = format_digest(digest, stock.timeframe)
+            # 摘要由K线确定性地生成，相同摘要命中同一份报告
+            key = cache_key(symbol, mode, digest_text, similar_text, text_llm_client.model, DIGEST_PROMPT_VERSION,
+                            llm_config.get("temperature", 0.7), llm_config.get("max_tokens", 4096))
+            generate = lambda: _build_text_report(stock, windows, digest_text, key, similar_text)
         else:
-            analysis_result = str(llm_response)
-        logger.info(f"Successfully generated analysis report for {symbol}")
-        return [TextContent(type='text', text=analysis_result)]
+            render_options = stock.render_options()
+            image_name = stock.chart_image_name(history, windows, render_options)
+            # 图片名已包含最后一根K线、窗口与渲染参数，同一交易日的相同请求命中同一份报告
+            key = cache_key(symbol, image_name, windows, similar_text, llm_config.get("model"), PROMPT_VERSION,
+                            llm_config.get("temperature", 0.7), llm_config.get("max_tokens", 4096))
+            generate = lambda: _build_report(stock, history, windows, image_name, render_options, key, similar_text)
+        report = await io_executor.run(report_cache.get, key)
+        if report is not None:
+            logger.info(f"Report cache hit for {symbol}")
+            return [TextContent(type='text', text=report)]
+
+        async def build():
+            start = time.perf_counter()
+            result = await generate()
+            REPORT_SECONDS.observe(time.perf_counter() - start, mode=mode)
+            await io_executor.run(report_cache.set, key, result)
+            return result
+
+        # 并发的相同请求共享同一次生成，也都能收到进度通知
+        report_progress.subscribe(key, ctx)
+        try:
+            with span("report"):
+                report = await report_flight.do(key, build)
+        finally:
+            report_progress.unsubscribe(key, ctx)
+        if ctx is not None:
+            await ctx.report_progress(report_progress.total, report_progress.total, "报告生成完成")
+        return [TextContent(type='text', text=report)]
     except Exception as e:
         error_msg = f"生成报告时出错: {str(e)}"
         logger.error(error_msg, exc_info=True)
         return [TextContent(type='text', text=json.dumps({"error": error_msg}))]
 
 
+def create_http_app():
+    """
+    多进程部署时每个 worker 进程的 ASGI 应用
+
+    使用无状态的 streamable-http，每个请求独立处理，可以落在任意 worker 上；
+    K线仓库、K线图和报告缓存通过共享的 data_dir 与文件锁在进程间复用。
+    """
+    mcp.settings.stateless_http = True
+    return mcp.streamable_http_app()
+
+
 def main():
-    mcp.run(transport=global_config.transport)
+    from .prewarm import create_prewarm_scheduler
+    # 收盘后预热自选股，渲染任务与工具共用 CPU 执行池；多进程部署时只在主进程中运行
+    scheduler = create_prewarm_scheduler(getattr(global_config, "prewarm", None), stock_config, cpu_executor.executor)
+    if scheduler is not None:
+        REGISTRY.register_stats("fin_prewarm_total", "Watchlist pre-warm runs, warmed symbols and errors", {},
+                                lambda: scheduler.stats)
+    server_config = {**DEFAULT_SERVER_CONFIG, **(getattr(global_config, "server", None) or {})}
+    workers = int(server_config["workers"])
+    try:
+        if workers > 1 and global_config.transport == "streamable-http":
+            import uvicorn
+            logger.info(f"Starting {workers} streamable-http workers on {mcp.settings.host}:{mcp.settings.port}")
+            uvicorn.run("fin_mcp_server.server:create_http_app", factory=True, host=mcp.settings.host,
+                        port=mcp.settings.port, workers=workers, log_level=mcp.settings.log_level.lower())
+        else:
+            if workers > 1:
+                logger.warning(f"{global_config.transport} 的会话保存在进程内，只能单进程运行；多进程部署请使用 streamable-http")
+            mcp.run(transport=global_config.transport)
+    finally:
+        if scheduler is not None:
+            scheduler.stop()
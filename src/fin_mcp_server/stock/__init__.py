@@ -1 +1,9 @@
-from .stock import Stock
\ No newline at end of file
+def __getattr__(name):
+    # Stock 依赖 pandas、talib、matplotlib，首次使用时才导入，服务启动时不加载
+    if name == "Stock":
+        from .stock import Stock
+        return Stock
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["Stock"]
@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import pandas as pd
+
+from .store import LocalStore, OHLCV_COLUMNS, slice_period
+from ..utils.frame_format import widen_float32
+from ..utils.http import get_yahoo_client
+from ..utils.symbols import normalize_symbols
+
+logger = logging.getLogger("fin_stock")
+
+
+def _download_grouped(symbols: list, period: str) -> dict:
+    """一次 yf.download 请求获取全部股票，返回成功解析的 {symbol: DataFrame}"""
+    data = get_yahoo_client().download(symbols, period=period, group_by="ticker", auto_adjust=True, threads=True,
+                                       timeout=30)
+    results = {}
+    if data is None or data.empty:
+        return results
+    if not isinstance(data.columns, pd.MultiIndex):
+        # 只有一只股票时 yfinance 可能返回单层列
+        return {symbols[0]: data.dropna(how="all")} if len(symbols) == 1 else results
+    tickers = set(data.columns.get_level_values(0))
+    for symbol in symbols:
+        if symbol not in tickers:
+            continue
+        frame = data[symbol].dropna(how="all")
+        if not frame.empty:
+            results[symbol] = frame
+    return results
+
+
+def _download_single(symbol: str, period: str) -> pd.DataFrame:
+    return get_yahoo_client().ticker_attr(symbol, "history", period=period, auto_adjust=True)
+
+
+def fetch_history_batch(symbols: list, period: str = "30d", stock_config: dict = None, max_workers: int = 8) -> dict:
+    """
+    批量获取多只股票的日线数据
+
+    yahoo 数据源先用一次分组的 yf.download 请求获取全部股票，失败的股票再并发单独获取；
+    local 数据源直接读取本地仓库。
+
+    Returns:
+        ({symbol: DataFrame}, {symbol: 错误信息})
+    """
+    symbols = normalize_symbols(symbols)
+    errors = {}
+    if stock_config and stock_config.get("source") == "local":
+        store = LocalStore(stock_config["data_dir"], stock_config.get("store_format", "parquet"),
+                           memory=stock_config.get("memory"))
+        results = {}
+        for symbol in symbols:
+            data = store.load(symbol)
+            if data is None or data.empty:
+                errors[symbol] = "No local data found"
+            else:
+                results[symbol] = slice_period(data, period).set_index("Date")
+        return results, errors
+
+    try:
+        results = _download_grouped(symbols, period)
+    except Exception as e:
+        logger.warning(f"批量下载失败，改为逐个获取：{e}")
+        results = {}
+    missing = [s for s in symbols if s not in results]
+    if missing:
+        logger.info(f"批量下载缺失 {len(missing)} 只股票，并发单独获取")
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+            futures = {symbol: pool.submit(_download_single, symbol, period) for symbol in missing}
+            for symbol, future in futures.items():
+                try:
+                    frame = future.result()
+                    if frame is None or frame.empty:
+                        errors[symbol] = "No data found"
+                    else:
+                        results[symbol] = frame
+                except Exception as e:
+                    errors[symbol] = str(e)
+    return results, errors
+
+
+def batch_to_compact(results: dict, errors: dict, period: str, decimals: int = 4) -> dict:
+    """将批量结果转换为紧凑 JSON：所有股票共用一个表头，每只股票只保留行数组"""
+    columns = OHLCV_COLUMNS
+    data = {}
+    for symbol, frame in results.items():
+        frame = frame.reset_index()
+        frame = frame.rename(columns={frame.columns[0]: "Date"})
+        frame["Date"] = pd.to_datetime(frame["Date"]).dt.strftime("%Y-%m-%d")
+        frame = widen_float32(frame.reindex(columns=columns)).round(decimals)
+        data[symbol] = frame.astype(object).where(frame.notna(), None).values.tolist()
+    return {"period": period, "columns": columns, "data": data, "errors": errors}
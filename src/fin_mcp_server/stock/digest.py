@@ -0,0 +1,214 @@
+"""
+技术指标摘要：由指标数据生成紧凑、确定的数值摘要（最新值、变化量、交叉、背离、ATR 支撑压力位），
+供文本模型在不渲染K线图的情况下生成报告。相同的K线总是生成相同的摘要，可直接作为报告缓存键的一部分。
+"""
+import math
+import pandas as pd
+
+from .stock_feature import create_tech_indiction_features
+
+# 摘要中列出的指标列（最新值 | 1根变化 | 5根变化）
+DIGEST_COLUMNS = ["EMA5", "EMA20", "EMA50", "UpperBB", "MiddleBB", "LowerBB", "MACD", "MACD_SIGNAL", "MACD_HIST",
+                  "K", "D", "J", "RSI", "CCI", "MOM", "ATR", "OBV-OBV_SMA"]
+# 由两列之差得到的摘要列。OBV 的绝对值取决于数据从哪一天开始累积，没有意义，只列出它与均线的差
+DIFFERENCE_COLUMNS = {"OBV-OBV_SMA": ("OBV", "OBV_SMA")}
+# (快线, 慢线) 交叉：快线由下向上穿越慢线为上穿
+CROSS_PAIRS = [("Close", "EMA20"), ("EMA5", "EMA20"), ("EMA20", "EMA50"), ("MACD", "MACD_SIGNAL"), ("K", "D"),
+               ("Close", "UpperBB"), ("Close", "LowerBB"), ("OBV", "OBV_SMA")]
+# (指标, 阈值) 穿越
+CROSS_LEVELS = [("RSI", 70), ("RSI", 30), ("CCI", 100), ("CCI", -100), ("MACD", 0)]
+# 与价格比较背离的指标
+DIVERGENCE_COLUMNS = ["RSI", "MACD", "OBV"]
+# 累积指标的背离只列出两点之间的变化（前一点记为 0），不列出绝对值
+CUMULATIVE_COLUMNS = {"OBV"}
+# 支撑压力位使用的 ATR 倍数
+ATR_MULTIPLES = (1, 2)
+
+
+def _num(value):
+    """统一的取整规则，保证摘要文本确定且简短"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    value = float(value)
+    if abs(value) >= 1e5:
+        return int(round(value))
+    return round(value, 2) if abs(value) >= 1 else round(value, 4)
+
+
+def _pct(new, old):
+    if old is None or not old or pd.isna(old) or pd.isna(new):
+        return None
+    return round((float(new) / float(old) - 1) * 100, 2)
+
+
+def _date(value) -> str:
+    value = pd.Timestamp(value)
+    return str(value.date()) if value == value.normalize() else str(value)
+
+
+def _crossovers(data: pd.DataFrame, bars: int) -> list:
+    """最近 bars 根K线内发生的交叉，每组只保留最近一次，按距今K线数排序"""
+    events = []
+    recent = data.tail(bars + 1)
+
+    def last_cross(diff: pd.Series):
+        # 相等的K线沿用之前的方向，避免触碰后折返被算作两次交叉
+        sign = (diff.gt(0).astype(float) - diff.lt(0).astype(float)).replace(0, math.nan).ffill()
+        changed = sign.ne(sign.shift(1)) & sign.shift(1).notna()
+        positions = [i for i, flag in enumerate(changed.to_numpy()) if flag]
+        if not positions:
+            return None
+        position = positions[-1]
+        return ("上穿" if sign.iloc[position] > 0 else "下穿"), len(recent) - 1 - position
+
+    for fast, slow in CROSS_PAIRS:
+        if fast in recent and slow in recent:
+            cross = last_cross(recent[fast] - recent[slow])
+            if cross:
+                events.append({"signal": f"{fast} {cross[0]} {slow}", "bars_ago": cross[1]})
+    for column, level in CROSS_LEVELS:
+        if column in recent:
+            cross = last_cross(recent[column] - level)
+            if cross:
+                events.append({"signal": f"{column} {cross[0]} {level}", "bars_ago": cross[1]})
+    return sorted(events, key=lambda event: event["bars_ago"])
+
+
+def _divergences(data: pd.DataFrame) -> list:
+    """
+    把窗口分成前后两半，比较两段的价格极值与对应位置的指标值：
+    价格创新高而指标未创新高为顶背离，价格创新低而指标未创新低为底背离
+    """
+    if len(data) < 10:
+        return []
+    half = len(data) // 2
+    prior, recent = data.iloc[:half], data.iloc[half:]
+
+    def values(column, before, after):
+        first, second = data.at[before, column], data.at[after, column]
+        if column in CUMULATIVE_COLUMNS:
+            first, second = 0.0, second - first
+        return [_num(first), _num(second)]
+
+    result = []
+    for column in DIVERGENCE_COLUMNS:
+        if column not in data:
+            continue
+        prior_high, recent_high = prior["High"].idxmax(), recent["High"].idxmax()
+        if data.at[recent_high, "High"] > data.at[prior_high, "High"] \
+                and data.at[recent_high, column] < data.at[prior_high, column]:
+            result.append({"type": f"{column} 顶背离",
+                           "price": [_num(data.at[prior_high, "High"]), _num(data.at[recent_high, "High"])],
+                           "indicator": values(column, prior_high, recent_high)})
+        prior_low, recent_low = prior["Low"].idxmin(), recent["Low"].idxmin()
+        if data.at[recent_low, "Low"] < data.at[prior_low, "Low"] \
+                and data.at[recent_low, column] > data.at[prior_low, column]:
+            result.append({"type": f"{column} 底背离",
+                           "price": [_num(data.at[prior_low, "Low"]), _num(data.at[recent_low, "Low"])],
+                           "indicator": values(column, prior_low, recent_low)})
+    return result
+
+
+def _levels(window: pd.DataFrame, last: pd.Series) -> dict:
+    """以 ATR 倍数、布林带、均线和窗口高低点作为候选，按与收盘价的距离分为支撑与压力"""
+    close, atr = float(last["Close"]), float(last["ATR"])
+    candidates = {"窗口最高": window["High"].max(), "窗口最低": window["Low"].min()}
+    for column in ("UpperBB", "MiddleBB", "LowerBB", "EMA20", "EMA50"):
+        candidates[column] = last[column]
+    for multiple in ATR_MULTIPLES:
+        candidates[f"+{multiple}ATR"] = close + multiple * atr
+        candidates[f"-{multiple}ATR"] = close - multiple * atr
+    levels = [(name, float(value)) for name, value in candidates.items() if not pd.isna(value)]
+    support = sorted((item for item in levels if item[1] < close), key=lambda item: -item[1])
+    resistance = sorted((item for item in levels if item[1] > close), key=lambda item: item[1])
+    return {
+        "support": [{"price": _num(price), "source": name} for name, price in support],
+        "resistance": [{"price": _num(price), "source": name} for name, price in resistance],
+        "atr_pct": _pct(close + atr, close),
+    }
+
+
+def build_digest(history: pd.DataFrame, config: dict, windows: int = 50, symbol: str = "", cross_bars: int = 10,
+                 latest: dict = None) -> dict:
+    """
+    计算 digest 指标组合并生成摘要，为模块级函数以便在进程池中执行
+
+    Args:
+        history: K线数据，需包含 windows 根K线及 digest 指标的预热K线
+        windows: 统计区间、背离与窗口高低点使用的K线数
+        cross_bars: 只列出最近 cross_bars 根K线内的交叉
+        latest: 增量指标引擎在全部历史上算出的最后一根K线指标值（Stock.update_indicator_state），
+            日期与最后一根K线一致时代替尾部数据计算的值
+
+    Returns:
+        只包含基础类型的摘要字典，没有可用数据时返回 None
+    """
+    data = create_tech_indiction_features(history, config, windows=windows, indicators="digest")
+    if data.empty:
+        return None
+    data = data.reset_index(drop=True)
+    if latest and "Date" in data and pd.Timestamp(latest["Date"]) == pd.Timestamp(data["Date"].iloc[-1]):
+        for column in data.columns.intersection(list(latest)).drop("Date", errors="ignore"):
+            data.loc[data.index[-1], column] = latest[column]
+    for column, (left, right) in DIFFERENCE_COLUMNS.items():
+        data[column] = data[left] - data[right]
+    window = data.tail(int(windows)).reset_index(drop=True)
+    last, prev = data.iloc[-1], data.iloc[-2] if len(data) > 1 else data.iloc[-1]
+    before = data.iloc[-6] if len(data) > 5 else data.iloc[0]
+    returns = window["Close"].pct_change().dropna()
+    average_volume = window["Volume"].tail(20).mean()
+    return {
+        "symbol": symbol,
+        "date": _date(last["Date"]) if "Date" in data else None,
+        "bars": len(window),
+        "cross_bars": cross_bars,
+        "quote": {
+            "close": _num(last["Close"]), "change_pct": _pct(last["Close"], prev["Close"]),
+            "open": _num(last["Open"]), "high": _num(last["High"]), "low": _num(last["Low"]),
+            "volume": _num(last["Volume"]), "volume_change_pct": _pct(last["Volume"], prev["Volume"]),
+            "volume_vs_avg20": _num(last["Volume"] / average_volume) if average_volume else None,
+        },
+        "range": {
+            "return_pct": _pct(window["Close"].iloc[-1], window["Close"].iloc[0]),
+            "high": _num(window["High"].max()), "low": _num(window["Low"].min()),
+            "volatility_pct": _num(returns.std() * 100) if len(returns) > 1 else None,
+            "close_vs_ema20_pct": _pct(last["Close"], last["EMA20"]),
+            "bb_percent": _num((last["Close"] - last["LowerBB"]) / (last["UpperBB"] - last["LowerBB"]))
+            if last["UpperBB"] != last["LowerBB"] else None,
+        },
+        "indicators": {column: [_num(last[column]), _num(last[column] - prev[column]),
+                                _num(last[column] - before[column])] for column in DIGEST_COLUMNS},
+        "crossovers": _crossovers(data.tail(int(windows)), cross_bars),
+        "divergences": _divergences(window),
+        "levels": _levels(window, last),
+    }
+
+
+def _signed(value, suffix: str = "") -> str:
+    return "-" if value is None else f"{value:+}{suffix}"
+
+
+def format_digest(digest: dict, timeframe: str = "1d") -> str:
+    """把摘要转换为发送给文本模型的紧凑文本"""
+    quote, stats, levels = digest["quote"], digest["range"], digest["levels"]
+    lines = [
+        f"标的: {digest['symbol']} 周期: {timeframe} 最新K线: {digest['date']}",
+        f"行情: 收盘 {quote['close']} ({_signed(quote['change_pct'], '%')}) 开 {quote['open']} 高 {quote['high']} "
+        f"低 {quote['low']} 成交量 {quote['volume']} ({_signed(quote['volume_change_pct'], '%')}, "
+        f"{quote['volume_vs_avg20']} 倍20根均量)",
+        f"区间({digest['bars']}根): 涨跌 {_signed(stats['return_pct'], '%')} 最高 {stats['high']} 最低 {stats['low']} "
+        f"单根波动率 {stats['volatility_pct']}% 收盘偏离EMA20 {_signed(stats['close_vs_ema20_pct'], '%')} "
+        f"布林%B {stats['bb_percent']}",
+        "指标(最新 | 1根变化 | 5根变化):",
+    ]
+    lines.extend(f"{column} {value} | {_signed(delta1)} | {_signed(delta5)}"
+                 for column, (value, delta1, delta5) in digest["indicators"].items())
+    crossovers = "; ".join(f"{event['signal']} ({event['bars_ago']}根前)" for event in digest["crossovers"])
+    lines.append(f"交叉(最近{digest['cross_bars']}根): {crossovers or '无'}")
+    divergences = "; ".join(f"{item['type']} (价格 {item['price'][0]} -> {item['price'][1]}, "
+                            f"指标 {item['indicator'][0]} -> {item['indicator'][1]})" for item in digest["divergences"])
+    lines.append(f"背离: {divergences or '无'}")
+    lines.append("支撑: " + ", ".join(f"{level['price']} ({level['source']})" for level in levels["support"]))
+    lines.append("压力: " + ", ".join(f"{level['price']} ({level['source']})" for level in levels["resistance"]))
+    lines.append(f"ATR 占收盘价: {levels['atr_pct']}%")
+    return "\n".join(lines)
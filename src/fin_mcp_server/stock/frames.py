@@ -0,0 +1,87 @@
+from collections import OrderedDict
+import threading
+import numpy as np
+import pandas as pd
+
+DEFAULT_MEMORY_CONFIG = {
+    "float_dtype": "float32",   # 内存中价格列的精度，float32 或 float64；本地仓库始终保存完整精度
+    "frame_budget_mb": 256,     # 进程内共享K线数据的内存预算，超出时淘汰最久未使用的股票
+    "trace": False,             # 用 tracemalloc 记录各阶段的峰值内存，有额外开销
+}
+# 以 float_dtype 保存的价格列；成交量保持整数，避免大成交量在 float32 下丢失精度
+PRICE_COLUMNS = ("Open", "High", "Low", "Close")
+
+
+def compact_frame(data: pd.DataFrame, float_dtype: str = "float32") -> pd.DataFrame:
+    """
+    把价格列转换为 float_dtype，已是目标类型时不复制
+
+    float32 有约 7 位有效数字，高于行情数据本身的精度，内存和序列化体积减半。
+    """
+    dtype = np.dtype(float_dtype)
+    columns = {col: data[col].astype(dtype) for col in PRICE_COLUMNS
+               if col in data.columns and data[col].dtype != dtype and pd.api.types.is_float_dtype(data[col])}
+    return data.assign(**columns) if columns else data
+
+
+def frame_bytes(data: pd.DataFrame) -> int:
+    return int(data.memory_usage(index=True, deep=False).sum())
+
+
+class FrameRegistry:
+    """
+    进程内按股票共享的只读K线数据
+
+    同一只股票的并发请求共享同一份数据，每次返回浅拷贝，调用方新增或替换列不会影响共享数据；
+    version 变化（如本地文件被更新）时重新加载，总大小超过 max_bytes 时淘汰最久未使用的股票。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, loader) -> pd.DataFrame:
+        """返回 key 对应版本的数据，未缓存或版本不一致时调用 loader() 加载"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] == version:
+                self._items.move_to_end(key)
+                self.stats["hits"] += 1
+                return item[1].copy(deep=False)
+            self.stats["misses"] += 1
+        return self.put(key, version, loader())
+
+    def put(self, key, version, data: pd.DataFrame) -> pd.DataFrame:
+        size = frame_bytes(data)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            # 单只股票超过预算时不缓存
+            if size <= self.max_bytes:
+                self._items[key] = (version, data, size)
+                self.bytes += size
+            while self.bytes > self.max_bytes and self._items:
+                _, (_, _, evicted) = self._items.popitem(last=False)
+                self.bytes -= evicted
+                self.stats["evictions"] += 1
+        return data.copy(deep=False)
+
+    def discard(self, key):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+
+
+_frame_registry = FrameRegistry(DEFAULT_MEMORY_CONFIG["frame_budget_mb"] * 1024 * 1024)
+
+
+def get_frame_registry(budget_mb: float = None) -> FrameRegistry:
+    """进程内共享的K线数据注册表，传入 budget_mb 时更新内存预算"""
+    if budget_mb is not None:
+        _frame_registry.max_bytes = int(float(budget_mb) * 1024 * 1024)
+    return _frame_registry
@@ -0,0 +1,370 @@
+from collections import deque
+import copy
+import json
+import math
+import os
+import pandas as pd
+
+from .stock_feature import DEFAULT_FEATURE_CONFIG
+from ..utils.fileio import atomic_open
+
+NAN = float("nan")
+STATE_VERSION = 1
+
+
+class _Indicator:
+    """增量指标基类：每来一根K线 O(1) 更新，状态可序列化为 JSON"""
+
+    def to_dict(self) -> dict:
+        return {k: list(v) if isinstance(v, deque) else v for k, v in vars(self).items()}
+
+    def load(self, state: dict):
+        for k, v in state.items():
+            current = getattr(self, k, None)
+            setattr(self, k, deque(v, maxlen=current.maxlen) if isinstance(current, deque) else v)
+        return self
+
+
+class SMA(_Indicator):
+    def __init__(self, period: int):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+
+    def update(self, value: float) -> float:
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(value)
+        self.total += value
+        return self.total / self.period if len(self.window) == self.period else NAN
+
+
+class EMA(_Indicator):
+    """与 TA-Lib 一致：以前 period 个值的 SMA 作为初始值，k = 2 / (period + 1)"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.count = 0
+        self.seed = 0.0
+        self.value = None
+
+    def update(self, value: float) -> float:
+        if self.value is None:
+            self.count += 1
+            self.seed += value
+            if self.count < self.period:
+                return NAN
+            self.value = self.seed / self.period
+        else:
+            self.value = (value - self.value) * self.k + self.value
+        return self.value
+
+
+class RSI(_Indicator):
+    """Wilder 平滑的 RSI"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def update(self, close: float) -> float:
+        if self.prev_close is None:
+            self.prev_close = close
+            return NAN
+        change = close - self.prev_close
+        self.prev_close = close
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        if self.count < self.period:
+            self.count += 1
+            self.avg_gain += gain
+            self.avg_loss += loss
+            if self.count < self.period:
+                return NAN
+            self.avg_gain /= self.period
+            self.avg_loss /= self.period
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        total = self.avg_gain + self.avg_loss
+        return 100.0 * self.avg_gain / total if total != 0 else 0.0
+
+
+class MACD(_Indicator):
+    """与 TA-Lib 一致：快线 EMA 的初始值取慢线预热期最后 fast 根K线，三条线在信号线就绪后同时输出"""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.skip = slow - fast
+        self.count = 0
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    def to_dict(self) -> dict:
+        return {"skip": self.skip, "count": self.count, "fast": self.fast.to_dict(),
+                "slow": self.slow.to_dict(), "signal": self.signal.to_dict()}
+
+    def load(self, state: dict):
+        self.skip, self.count = state["skip"], state["count"]
+        self.fast.load(state["fast"])
+        self.slow.load(state["slow"])
+        self.signal.load(state["signal"])
+        return self
+
+    def update(self, close: float):
+        self.count += 1
+        slow = self.slow.update(close)
+        if self.count <= self.skip:
+            return NAN, NAN, NAN
+        macd = self.fast.update(close) - slow
+        if math.isnan(macd):
+            return NAN, NAN, NAN
+        signal = self.signal.update(macd)
+        if math.isnan(signal):
+            return NAN, NAN, NAN
+        return macd, signal, macd - signal
+
+
+class BBANDS(_Indicator):
+    def __init__(self, period: int = 20, nbdev: float = 2.0):
+        self.period = period
+        self.nbdev = nbdev
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def update(self, close: float):
+        if len(self.window) == self.period:
+            old = self.window[0]
+            self.total -= old
+            self.total_sq -= old * old
+        self.window.append(close)
+        self.total += close
+        self.total_sq += close * close
+        if len(self.window) < self.period:
+            return NAN, NAN, NAN
+        mean = self.total / self.period
+        variance = self.total_sq / self.period - mean * mean
+        std = math.sqrt(variance) if variance > 0 else 0.0
+        return mean + self.nbdev * std, mean, mean - self.nbdev * std
+
+
+class OBV(_Indicator):
+    def __init__(self):
+        self.prev_close = None
+        self.value = 0.0
+
+    def update(self, close: float, volume: float) -> float:
+        if self.prev_close is None:
+            self.value = volume
+        elif close > self.prev_close:
+            self.value += volume
+        elif close < self.prev_close:
+            self.value -= volume
+        self.prev_close = close
+        return self.value
+
+
+class ATR(_Indicator):
+    """Wilder 平滑的 ATR，初始值为前 period 个真实波幅的均值"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0
+        self.value = 0.0
+
+    def update(self, high: float, low: float, close: float) -> float:
+        if self.prev_close is None:
+            self.prev_close = close
+            return NAN
+        true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        if self.count < self.period:
+            self.count += 1
+            self.value += true_range
+            if self.count < self.period:
+                return NAN
+            self.value /= self.period
+        else:
+            self.value = (self.value * (self.period - 1) + true_range) / self.period
+        return self.value
+
+
+class MOM(_Indicator):
+    def __init__(self, period: int = 10):
+        self.window = deque(maxlen=period + 1)
+
+    def update(self, close: float) -> float:
+        self.window.append(close)
+        return close - self.window[0] if len(self.window) == self.window.maxlen else NAN
+
+
+class CCI(_Indicator):
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.window = deque(maxlen=period)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        typical = (high + low + close) / 3
+        self.window.append(typical)
+        if len(self.window) < self.period:
+            return NAN
+        # 平均绝对偏差需要遍历窗口，窗口长度固定，每根K线仍为常数开销
+        mean = sum(self.window) / self.period
+        deviation = sum(abs(x - mean) for x in self.window) / self.period
+        diff = typical - mean
+        return diff / (0.015 * deviation) if diff != 0 and deviation != 0 else 0.0
+
+
+class PSY(_Indicator):
+    """心理线：最近 period 根K线中上涨次数占比"""
+
+    def __init__(self, period: int = 12):
+        self.period = period
+        self.prev_close = None
+        self.seen = 0
+        self.ups = deque(maxlen=period - 1)
+
+    def update(self, close: float) -> float:
+        if self.prev_close is not None:
+            self.ups.append(1 if close > self.prev_close else 0)
+        self.prev_close = close
+        self.seen += 1
+        return sum(self.ups) / self.period * 100 if self.seen >= self.period else NAN
+
+
+class STOCH(_Indicator):
+    def __init__(self, fastk: int = 9, slowk: int = 3, slowd: int = 3):
+        self.highs = deque(maxlen=fastk)
+        self.lows = deque(maxlen=fastk)
+        self.slowk = SMA(slowk)
+        self.slowd = SMA(slowd)
+
+    def to_dict(self) -> dict:
+        return {"highs": list(self.highs), "lows": list(self.lows),
+                "slowk": self.slowk.to_dict(), "slowd": self.slowd.to_dict()}
+
+    def load(self, state: dict):
+        self.highs = deque(state["highs"], maxlen=self.highs.maxlen)
+        self.lows = deque(state["lows"], maxlen=self.lows.maxlen)
+        self.slowk.load(state["slowk"])
+        self.slowd.load(state["slowd"])
+        return self
+
+    def update(self, high: float, low: float, close: float):
+        self.highs.append(high)
+        self.lows.append(low)
+        if len(self.highs) < self.highs.maxlen:
+            return NAN, NAN
+        highest, lowest = max(self.highs), min(self.lows)
+        fast_k = (close - lowest) / (highest - lowest) * 100 if highest != lowest else 0.0
+        k = self.slowk.update(fast_k)
+        if math.isnan(k):
+            return NAN, NAN
+        d = self.slowd.update(k)
+        # 与 TA-Lib 一致，K、D 在 D 就绪后同时输出
+        return (NAN, NAN) if math.isnan(d) else (k, d)
+
+
+class IndicatorEngine:
+    """
+    增量技术指标引擎，输出列与 create_tech_indiction_features 一致
+
+    每根新K线对每个指标做常数时间更新；状态可以保存为 JSON 检查点并在下次启动时恢复。
+    """
+
+    def __init__(self, config: dict = None):
+        self.config = dict(DEFAULT_FEATURE_CONFIG)
+        if config is not None:
+            self.config.update(config)
+        self.last_date = None
+        self.last_close = None
+        self.bars = 0
+        self.indicators = {f"EMA{p}": EMA(p) for p in self.config["ema_period"]}
+        self.indicators.update({f"SMA{p}": SMA(p) for p in self.config["sma_period"]})
+        self.indicators.update({
+            "RSI": RSI(14),
+            "MACD": MACD(12, 26, 9),
+            "BBANDS": BBANDS(20),
+            "OBV": OBV(),
+            "OBV_SMA": SMA(20),
+            "ATR": ATR(14),
+            "MOM": MOM(10),
+            "CCI": CCI(14),
+            "PSY": PSY(12),
+            "STOCH": STOCH(9, 3, 3),
+        })
+
+    def update(self, bar) -> dict:
+        """输入一根K线（含 Date/Open/High/Low/Close/Volume），返回该K线上的全部指标值"""
+        high, low, close = float(bar["High"]), float(bar["Low"]), float(bar["Close"])
+        ind = self.indicators
+        values = {}
+        for name in self.config["ema_period"]:
+            values[f"EMA{name}"] = ind[f"EMA{name}"].update(close)
+        for name in self.config["sma_period"]:
+            values[f"SMA{name}"] = ind[f"SMA{name}"].update(close)
+        values["RSI"] = ind["RSI"].update(close)
+        values["MACD"], values["MACD_SIGNAL"], values["MACD_HIST"] = ind["MACD"].update(close)
+        values["UpperBB"], values["MiddleBB"], values["LowerBB"] = ind["BBANDS"].update(close)
+        values["OBV"] = ind["OBV"].update(close, float(bar["Volume"]))
+        values["OBV_SMA"] = ind["OBV_SMA"].update(values["OBV"])
+        values["ATR"] = ind["ATR"].update(high, low, close)
+        values["MOM"] = ind["MOM"].update(close)
+        values["CCI"] = ind["CCI"].update(high, low, close)
+        values["PSY"] = ind["PSY"].update(close)
+        values["K"], values["D"] = ind["STOCH"].update(high, low, close)
+        values["J"] = 3 * values["K"] - 2 * values["D"]
+        self.last_date = pd.Timestamp(bar["Date"]).isoformat()
+        self.last_close = close
+        self.bars += 1
+        return values
+
+    def peek(self, bar) -> dict:
+        """计算某根K线（如盘中未收盘K线）的指标值，但不改变引擎状态"""
+        return copy.deepcopy(self).update(bar)
+
+    def run(self, df: pd.DataFrame) -> pd.DataFrame:
+        """依次输入多根K线，返回与输入行对齐的指标 DataFrame"""
+        rows = [self.update(bar) for bar in df.to_dict("records")]
+        return pd.DataFrame(rows, index=df.index)
+
+    def to_dict(self) -> dict:
+        return {
+            "version": STATE_VERSION,
+            "config": self.config,
+            "last_date": self.last_date,
+            "last_close": self.last_close,
+            "bars": self.bars,
+            "indicators": {name: indicator.to_dict() for name, indicator in self.indicators.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict):
+        engine = cls(state["config"])
+        engine.last_date = state["last_date"]
+        engine.last_close = state["last_close"]
+        engine.bars = state["bars"]
+        for name, indicator_state in state["indicators"].items():
+            engine.indicators[name].load(indicator_state)
+        return engine
+
+    def save(self, path: str):
+        with atomic_open(path) as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def restore(cls, path: str, config: dict = None):
+        """读取检查点，不存在、版本或指标配置不一致时返回 None"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as file:
+            state = json.load(file)
+        expected = cls(config).config
+        if state.get("version") != STATE_VERSION or state.get("config") != expected:
+            return None
+        return cls.from_dict(state)
@@ -0,0 +1,244 @@
+import re
+import numpy as np
+import pandas as pd
+import talib as ta
+
+DEFAULT_FEATURE_CONFIG = {
+    "ema_period": [5, 10, 20, 50, 100],
+    "sma_period": [20, 100],
+    "macd_slope": [3, 5, 10],
+    "Volumeatility_window": [30]
+}
+# EMA、Wilder 平滑（RSI/ATR）等递归指标的预热倍数。Wilder 平滑每根K线衰减 (n-1)/n，k 倍周期后初始值权重约为 e^-k，
+# 7 倍周期约 0.1%（3 倍周期仍有约 5%）；EMA 每根衰减 (n-1)/(n+1)，同样长度下初始值权重约为 e^-2k
+RECURSIVE_WARMUP_FACTOR = 7
+BASE_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+# 各使用方需要的指标组合，可以是组合名、指标名或输出列名
+INDICATOR_SETS = {
+    # K线图实际绘制的指标
+    "chart": ["EMA5", "EMA20", "BBANDS", "MACD", "STOCH", "KDJ", "RSI", "OBV", "OBV_SMA", "CCI"],
+    # 文本报告的指标摘要
+    "digest": ["EMA5", "EMA20", "EMA50", "BBANDS", "MACD", "STOCH", "KDJ", "RSI", "CCI", "MOM", "ATR", "OBV", "OBV_SMA"],
+}
+
+
+class IndicatorError(ValueError):
+    """指标未注册、输入列缺失或存在循环依赖"""
+
+
+def psy(close: pd.Series, period: int = 12) -> pd.Series:
+    """心理线 PSY：窗口内 period 根K线中上涨次数占比（向量化实现）"""
+    up = close.diff().gt(0).astype(float)
+    # 与逐窗口计算一致：任一收盘价缺失的比较视为无效，窗口内需要 period 个有效收盘价
+    up = up.where(close.notna() & close.shift(1).notna())
+    return up.rolling(period - 1).sum() / period * 100
+
+
+class Indicator:
+    """
+    指标声明：由 inputs 列计算出 outputs 列
+
+    Args:
+        name: 指标名
+        outputs: 输出列名
+        inputs: 输入列，可以是基础K线列或其他指标的输出列，依赖关系由此推导
+        lookback: 得到首个有效值之前需要的K线数
+        compute: compute(columns) -> 与 outputs 一一对应的序列，columns 为 {列名: Series}
+        recursive: EMA、Wilder 平滑等递归指标，预热长度按 RECURSIVE_WARMUP_FACTOR 放大
+        cumulative: OBV 等从首根K线开始累积的指标，值依赖全部历史，预热K线无法恢复；
+            截取尾部数据计算时先在全量历史上计算（见 stock_feature.tail_frame），只能使用基础K线列作为输入
+    """
+
+    def __init__(self, name: str, outputs, inputs, lookback: int, compute, recursive: bool = False,
+                 cumulative: bool = False):
+        self.name = name
+        self.outputs = tuple(outputs)
+        self.inputs = tuple(inputs)
+        self.lookback = int(lookback)
+        self.compute = compute
+        self.recursive = recursive
+        self.cumulative = cumulative
+
+    @property
+    def own_warmup(self) -> int:
+        return self.lookback * (RECURSIVE_WARMUP_FACTOR if self.recursive else 1)
+
+
+def _ema(period: int) -> Indicator:
+    return Indicator(f"EMA{period}", [f"EMA{period}"], ["Close"], period,
+                     lambda c: [ta.EMA(c["Close"], timeperiod=period)], recursive=True)
+
+
+def _sma(period: int) -> Indicator:
+    return Indicator(f"SMA{period}", [f"SMA{period}"], ["Close"], period,
+                     lambda c: [ta.SMA(c["Close"], timeperiod=period)])
+
+
+# 按周期参数化的指标族：请求 EMA7、SMA60 等未在配置中出现的列时按需注册
+_FAMILIES = [(re.compile(r"EMA(\d+)"), _ema), (re.compile(r"SMA(\d+)"), _sma)]
+
+
+def _stoch(c):
+    return ta.STOCH(c["High"], c["Low"], c["Close"], fastk_period=9, slowk_period=3, slowk_matype=ta.MA_Type.SMA,
+                    slowd_period=3, slowd_matype=ta.MA_Type.SMA)
+
+
+def _standard_indicators() -> list:
+    return [
+        Indicator("RSI", ["RSI"], ["Close"], 14, lambda c: [ta.RSI(c["Close"], timeperiod=14)], recursive=True),
+        Indicator("MACD", ["MACD", "MACD_SIGNAL", "MACD_HIST"], ["Close"], 26 + 9,
+                  lambda c: ta.MACD(c["Close"], fastperiod=12, slowperiod=26, signalperiod=9), recursive=True),
+        Indicator("BBANDS", ["UpperBB", "MiddleBB", "LowerBB"], ["Close"], 20,
+                  lambda c: ta.BBANDS(c["Close"], timeperiod=20)),
+        Indicator("OBV", ["OBV"], ["Close", "Volume"], 0, lambda c: [ta.OBV(c["Close"], c["Volume"])],
+                  cumulative=True),
+        Indicator("OBV_SMA", ["OBV_SMA"], ["OBV"], 20, lambda c: [ta.SMA(c["OBV"], timeperiod=20)]),
+        Indicator("ATR", ["ATR"], ["High", "Low", "Close"], 14,
+                  lambda c: [ta.ATR(c["High"], c["Low"], c["Close"], timeperiod=14)], recursive=True),
+        Indicator("MOM", ["MOM"], ["Close"], 10, lambda c: [ta.MOM(c["Close"], timeperiod=10)]),
+        Indicator("CCI", ["CCI"], ["High", "Low", "Close"], 14,
+                  lambda c: [ta.CCI(c["High"], c["Low"], c["Close"], timeperiod=14)]),
+        Indicator("PSY", ["PSY"], ["Close"], 12, lambda c: [psy(c["Close"], 12)]),
+        Indicator("STOCH", ["K", "D"], ["High", "Low", "Close"], 9 + 3 + 3, _stoch),
+        Indicator("KDJ", ["J"], ["K", "D"], 0, lambda c: [3 * c["K"] - 2 * c["D"]]),
+    ]
+
+
+class IndicatorRegistry:
+    """
+    指标注册表：根据请求的列解析依赖闭包，按拓扑顺序只计算需要的指标，并推导所需的预热K线数
+    """
+
+    def __init__(self):
+        self.indicators = {}
+        self.producers = {}
+
+    def register(self, indicator: Indicator):
+        if indicator.name in self.indicators:
+            raise IndicatorError(f"Indicator already registered: {indicator.name}")
+        for column in indicator.outputs:
+            if column in self.producers or column in BASE_COLUMNS:
+                raise IndicatorError(f"Column {column} of {indicator.name} is already produced")
+        if indicator.cumulative and not set(indicator.inputs) <= set(BASE_COLUMNS):
+            raise IndicatorError(f"Cumulative indicator {indicator.name} can only use base columns as inputs")
+        self.indicators[indicator.name] = indicator
+        for column in indicator.outputs:
+            self.producers[column] = indicator
+        return indicator
+
+    def producer(self, column: str) -> Indicator:
+        """返回产出 column 的指标，基础K线列返回 None"""
+        if column in BASE_COLUMNS:
+            return None
+        if column not in self.producers:
+            for pattern, factory in _FAMILIES:
+                match = pattern.fullmatch(column)
+                if match:
+                    return self.register(factory(int(match.group(1))))
+            raise IndicatorError(f"Unknown indicator column: {column}")
+        return self.producers[column]
+
+    def expand(self, names) -> list:
+        """
+        把组合名（如 chart、all）、指标名（如 MACD）或输出列名展开为输出列列表，保持请求顺序
+
+        Args:
+            names: 字符串或字符串列表，为空时表示 all
+        """
+        if not names:
+            names = ["all"]
+        elif isinstance(names, str):
+            names = [names]
+        columns = []
+        for name in names:
+            if name == "all":
+                columns.extend(self.producers)
+            elif name in INDICATOR_SETS:
+                columns.extend(self.expand(INDICATOR_SETS[name]))
+            elif name in self.indicators:
+                columns.extend(self.indicators[name].outputs)
+            else:
+                self.producer(name)
+                columns.append(name)
+        return list(dict.fromkeys(columns))
+
+    def resolve(self, columns) -> list:
+        """返回计算 columns 所需的全部指标（含依赖），依赖在前"""
+        order, visiting, done = [], set(), set()
+
+        def visit(indicator: Indicator):
+            if indicator.name in done:
+                return
+            if indicator.name in visiting:
+                raise IndicatorError(f"Circular indicator dependency at {indicator.name}")
+            visiting.add(indicator.name)
+            for column in indicator.inputs:
+                dependency = self.producer(column)
+                if dependency is not None:
+                    visit(dependency)
+            visiting.discard(indicator.name)
+            done.add(indicator.name)
+            order.append(indicator)
+
+        for column in columns:
+            indicator = self.producer(column)
+            if indicator is not None:
+                visit(indicator)
+        return order
+
+    def warmup(self, columns) -> int:
+        """
+        计算 columns 时，窗口之前需要的预热K线数：依赖链上各指标的预热长度之和的最大值
+
+        累积指标（OBV）的预热长度为 0，它们依赖全部历史，由 stock_feature.tail_frame 在截取前单独计算。
+        """
+        chain = {}
+        for indicator in self.resolve(columns):
+            upstream = [chain[dep.name] for dep in map(self.producer, indicator.inputs) if dep is not None]
+            chain[indicator.name] = indicator.own_warmup + max(upstream, default=0)
+        return max(chain.values(), default=0)
+
+    def compute(self, data: pd.DataFrame, columns) -> pd.DataFrame:
+        """
+        在 data 上追加 columns 及其依赖的指标列，输入列缺失或计算出错时直接抛出异常
+
+        指标在 float64 下计算，写入 data 时与 Close 列的精度一致（紧凑的 float32 数据得到 float32 指标列），
+        无穷值替换为 NaN。data 中已有的累积指标列是截取尾部之前在全量历史上算出的，直接使用。
+        """
+        indicators = self.resolve(columns)
+        missing = sorted({c for i in indicators for c in i.inputs if c in BASE_COLUMNS and c not in data.columns})
+        if missing:
+            raise IndicatorError(f"Missing input columns: {missing}")
+        # TA-Lib 只接受 float64，成交量、float32 价格等列在这里转换，不修改原数据
+        values = {c: data[c].astype("float64") for c in BASE_COLUMNS if c in data.columns}
+        dtype = "float32" if "Close" in data.columns and data["Close"].dtype == np.float32 else "float64"
+        for indicator in indicators:
+            if indicator.cumulative and all(column in data.columns for column in indicator.outputs):
+                for column in indicator.outputs:
+                    values[column] = data[column].astype("float64")
+                    data[column] = data[column].astype(dtype, copy=False)
+                continue
+            outputs = indicator.compute(values)
+            if len(outputs) != len(indicator.outputs):
+                raise IndicatorError(f"{indicator.name} returned {len(outputs)} columns, "
+                                     f"expected {len(indicator.outputs)}")
+            for column, output in zip(indicator.outputs, outputs):
+                output = np.asarray(output, dtype="float64")
+                values[column] = pd.Series(np.where(np.isinf(output), np.nan, output), index=data.index)
+                data[column] = values[column].astype(dtype, copy=False)
+        return data
+
+
+def build_registry(config: dict = None) -> IndicatorRegistry:
+    """按指标配置（ema_period、sma_period）创建注册表"""
+    feature_config = dict(DEFAULT_FEATURE_CONFIG)
+    if config is not None:
+        feature_config.update(config)
+    registry = IndicatorRegistry()
+    for period in feature_config["ema_period"]:
+        registry.register(_ema(int(period)))
+    for period in feature_config["sma_period"]:
+        registry.register(_sma(int(period)))
+    for indicator in _standard_indicators():
+        registry.register(indicator)
+    return registry
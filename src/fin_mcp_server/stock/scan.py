@@ -0,0 +1,218 @@
+"""
+多股票信号筛选：在本地仓库的K线上按声明式条件（如 RSI < 30、MACD cross_above MACD_SIGNAL）筛选股票，
+只计算条件中用到的指标及其依赖，股票列表按块分发到进程池并行执行，结果按得分排序
+"""
+import math
+import operator
+import re
+import numpy as np
+import pandas as pd
+
+from .indicators import IndicatorError, build_registry
+from .stock_feature import create_tech_indiction_features
+from .store import LocalStore
+from .timeframe import get_resample_cache, parse_timeframe
+from ..utils.symbols import normalize_symbols
+
+DEFAULT_SCAN_CONFIG = {
+    "chunk_size": 50,    # 每个进程池任务处理的股票数
+    "max_results": 50,   # 默认最多返回的匹配数
+}
+COMPARISONS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+               "==": operator.eq, "!=": operator.ne}
+CROSSES = ("cross_above", "cross_below")
+# 字符串条件：左列 运算符 右列或数值 [within N]
+CONDITION_PATTERN = re.compile(r"\s*(\w+)\s*(<=|>=|==|!=|<|>|cross_above|cross_below)\s*([\w.+-]+)"
+                               r"(?:\s+within\s+(\d+))?\s*")
+
+
+def _operand(value):
+    """右侧为数值时返回 float，否则视为列名"""
+    try:
+        return float(value)
+    except ValueError:
+        return str(value)
+
+
+def parse_conditions(conditions, config: dict = None, rank_by: str = None) -> list:
+    """
+    把条件解析为 {"left", "op", "right", "within"} 字典，并检查列名是否已注册
+
+    Args:
+        conditions: 字符串（如 "RSI < 30"、"MACD cross_above MACD_SIGNAL within 3"）
+            或字典（{"left": "RSI", "op": "<", "right": 30}）组成的列表；
+            within 为交叉条件回看的K线数，默认 1 即只看最新一根K线
+        rank_by: 排序使用的列，与条件中的列一起检查
+
+    Raises:
+        ValueError: 条件格式错误；IndicatorError: 使用了未注册的指标列
+    """
+    if isinstance(conditions, (str, dict)):
+        conditions = [conditions]
+    if not conditions:
+        raise ValueError("At least one condition is required")
+    parsed = []
+    for condition in conditions:
+        if isinstance(condition, str):
+            match = CONDITION_PATTERN.fullmatch(condition)
+            if not match:
+                raise ValueError(f"Invalid condition: {condition!r}, expected e.g. 'RSI < 30' "
+                                 f"or 'MACD cross_above MACD_SIGNAL within 3'")
+            left, op, right, within = match.groups()
+        elif isinstance(condition, dict):
+            left, op, right, within = (condition.get("left"), condition.get("op"), condition.get("right"),
+                                       condition.get("within"))
+        else:
+            raise ValueError(f"Invalid condition: {condition!r}")
+        if op not in COMPARISONS and op not in CROSSES:
+            raise ValueError(f"Unsupported operator: {op}, expected one of {list(COMPARISONS) + list(CROSSES)}")
+        if not left or right is None:
+            raise ValueError(f"Invalid condition: {condition!r}")
+        within = int(within or 1)
+        if within < 1:
+            raise ValueError(f"within must be at least 1: {condition!r}")
+        parsed.append({"left": str(left), "op": op, "right": _operand(right), "within": within})
+    # 未注册的列在分发到进程池之前报错
+    registry = build_registry(config)
+    registry.resolve(condition_columns(parsed, rank_by))
+    return parsed
+
+
+def condition_columns(conditions: list, rank_by: str = None) -> list:
+    """条件和排序中引用的全部列，保持出现顺序"""
+    columns = []
+    for condition in conditions:
+        columns.append(condition["left"])
+        if isinstance(condition["right"], str):
+            columns.append(condition["right"])
+    if rank_by:
+        columns.append(rank_by)
+    return list(dict.fromkeys(columns))
+
+
+def format_condition(condition: dict) -> str:
+    right = condition["right"]
+    right = f"{right:g}" if isinstance(right, float) else right
+    text = f"{condition['left']} {condition['op']} {right}"
+    return text + (f" within {condition['within']}" if condition["within"] > 1 else "")
+
+
+def _round(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return round(float(value), 4)
+
+
+def _date(value) -> str:
+    value = pd.Timestamp(value)
+    return str(value.date()) if value == value.normalize() else str(value)
+
+
+def _evaluate(data: pd.DataFrame, condition: dict):
+    """
+    在最后一根K线上判断条件，不满足时返回 None
+
+    Returns:
+        (强度, 交叉信号描述)：比较条件的强度为两侧的相对差距，交叉条件的强度随交叉距今的K线数递减，均在 0~1 之间
+    """
+    left = data[condition["left"]].to_numpy(dtype="float64")
+    right = condition["right"]
+    right = data[right].to_numpy(dtype="float64") if isinstance(right, str) else np.full(len(data), right)
+    if condition["op"] in COMPARISONS:
+        value, threshold = left[-1], right[-1]
+        if math.isnan(value) or math.isnan(threshold) or not COMPARISONS[condition["op"]](value, threshold):
+            return None
+        scale = max(abs(value), abs(threshold))
+        return (min(1.0, abs(value - threshold) / scale) if scale else 0.0), None
+    # 相等的K线沿用之前的方向，触碰后折返不算交叉
+    within = condition["within"]
+    sign = pd.Series(left - right).tail(within + 1)
+    sign = (sign.gt(0).astype(float) - sign.lt(0).astype(float)).replace(0, math.nan).ffill().to_numpy()
+    wanted = 1.0 if condition["op"] == "cross_above" else -1.0
+    for bars_ago in range(min(within, len(sign) - 1)):
+        current, previous = sign[-1 - bars_ago], sign[-2 - bars_ago]
+        if current == wanted and previous == -wanted:
+            return (within - bars_ago) / within, f"{format_condition({**condition, 'within': 1})} ({bars_ago}根前)"
+    return None
+
+
+def scan_chunk(symbols: list, conditions: list, stock_config: dict, config: dict = None, timeframe: str = "1d",
+               rank_by: str = None):
+    """
+    在一组股票上判断条件，为模块级函数以便在进程池中执行
+
+    只读取本地仓库（不访问网络），每只股票只加载条件所需指标的预热K线和交叉条件的回看K线。
+
+    Returns:
+        (匹配列表, {symbol: 错误信息})
+    """
+    base_interval, rule = parse_timeframe(timeframe)
+    store = LocalStore(stock_config["data_dir"], stock_config.get("store_format", "parquet"), interval=base_interval,
+                       memory=stock_config.get("memory"))
+    columns = condition_columns(conditions, rank_by)
+    # 交叉条件需要回看 within 根K线及其前一根
+    bars = max(condition["within"] for condition in conditions) + 1
+    matches, errors = [], {}
+    for symbol in symbols:
+        try:
+            data = store.load(symbol)
+            if data is None or data.empty:
+                errors[symbol] = "No local data found"
+                continue
+            if rule is not None:
+                data = get_resample_cache().get((store.path(symbol), timeframe), data, rule)
+            data = create_tech_indiction_features(data, config, windows=bars, indicators=columns)
+            if data.empty:
+                errors[symbol] = "Not enough bars"
+                continue
+            results = [_evaluate(data, condition) for condition in conditions]
+            if any(result is None for result in results):
+                continue
+            last = data.iloc[-1]
+            matches.append({
+                "symbol": symbol,
+                "date": _date(last["Date"]) if "Date" in data else None,
+                "score": round(sum(strength for strength, _ in results) / len(results), 4),
+                "values": {column: _round(last[column]) for column in columns},
+                "signals": [signal for _, signal in results if signal],
+            })
+        except IndicatorError:
+            raise
+        except Exception as e:
+            errors[symbol] = str(e)
+    return matches, errors
+
+
+def rank_matches(matches: list, rank_by: str = None, ascending: bool = False, limit: int = None) -> list:
+    """按 rank_by 列的最新值排序，未指定时按得分从高到低排序；缺失值排在最后"""
+    if rank_by:
+        present = [m for m in matches if m["values"].get(rank_by) is not None]
+        missing = [m for m in matches if m["values"].get(rank_by) is None]
+        ranked = sorted(present, key=lambda m: (m["values"][rank_by], m["symbol"]), reverse=not ascending) + missing
+    else:
+        ranked = sorted(matches, key=lambda m: (-m["score"], m["symbol"]))
+    return ranked[:limit] if limit else ranked
+
+
+def resolve_universe(universe, stock_config: dict, timeframe: str = "1d") -> list:
+    """
+    股票列表：代码列表、逗号分隔的字符串，或 "local" 表示本地仓库中的全部股票
+
+    Returns:
+        规范化（见 normalize_symbol）并去重的代码列表，保持顺序
+    """
+    if isinstance(universe, str):
+        if universe.strip().lower() == "local":
+            store = LocalStore(stock_config["data_dir"], stock_config.get("store_format", "parquet"),
+                               interval=parse_timeframe(timeframe)[0], memory=stock_config.get("memory"))
+            return store.symbols()
+        universe = universe.split(",")
+    return normalize_symbols(universe)
+
+
+def split_chunks(symbols: list, chunk_size: int, max_chunks: int = None) -> list:
+    """按 chunk_size 切分股票列表；超过 max_chunks 块时加大每块的股票数，避免超出执行池的排队上限"""
+    chunk_size = max(1, int(chunk_size))
+    if max_chunks:
+        chunk_size = max(chunk_size, math.ceil(len(symbols) / max_chunks))
+    return [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
@@ -0,0 +1,181 @@
+"""
+历史相似形态检索：把最近 length 根K线的收盘价 z 标准化后，在本地仓库的历史K线上以滑动窗口计算欧氏距离，
+返回距离最近的 top_k 段历史走势及其之后的涨跌幅，供模型引用“历史相似形态表现”时使用真实数据
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .store import LocalStore
+from .timeframe import get_resample_cache, parse_timeframe
+
+DEFAULT_SIMILAR_CONFIG = {
+    "length": 30,              # 用于匹配的最近K线数
+    "top_k": 5,                # 返回的相似形态数
+    "horizons": [5, 10, 20],   # 统计匹配之后第 N 根K线的涨跌幅
+    "universe": None,          # 检索范围，为空时只检索该股票自身的历史；也可以是代码列表或 "local"
+    "in_report": False,        # generate_fin_report 默认是否把相似形态统计加入提示词
+}
+# 标准差低于该值的窗口（价格几乎不变）无法 z 标准化，不参与匹配
+MIN_STD = 1e-8
+
+
+def znormalize(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype="float64")
+    std = values.std()
+    if not std > MIN_STD:
+        raise ValueError("Query window is flat and cannot be z-normalized")
+    return (values - values.mean()) / std
+
+
+def znorm_distances(series: np.ndarray, query: np.ndarray) -> tuple:
+    """
+    query 与 series 中每个长度相同的滑动窗口在 z 标准化后的欧氏距离
+
+    z 标准化后 dist² = 2m(1 - ρ)，ρ 为两段的皮尔逊相关系数；窗口矩阵是 series 的视图，与 query 相乘不复制窗口数据。
+    各窗口的标准差由 x 与 x² 的累积和 O(n) 得到，不生成 n×m 的中间数组；累积前先减去整体均值以减小相消误差，
+    平坦窗口按窗口内最大值与最小值之差判断，不受该误差影响。
+
+    Returns:
+        (距离, 相关系数)，第 i 个值对应从 series[i] 开始的窗口；平坦窗口的距离为 inf
+    """
+    query = znormalize(query)
+    length = len(query)
+    series = np.asarray(series, dtype="float64")
+    windows = sliding_window_view(series, length)
+    centered = series - series.mean()
+    sums = np.concatenate(([0.0], np.cumsum(centered)))
+    squares = np.concatenate(([0.0], np.cumsum(centered * centered)))
+    mean = (sums[length:] - sums[:-length]) / length
+    std = np.sqrt(np.maximum((squares[length:] - squares[:-length]) / length - mean * mean, 0.0))
+    flat = windows.max(axis=1) - windows.min(axis=1) <= MIN_STD
+    # query 已中心化，窗口均值项的贡献为 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlation = np.clip(windows @ query / (length * std), -1.0, 1.0)
+    correlation[flat | ~(std > MIN_STD)] = np.nan
+    distances = np.sqrt(2 * length * (1 - correlation))
+    return np.where(np.isnan(distances), np.inf, distances), correlation
+
+
+def _date(value) -> str:
+    value = pd.Timestamp(value)
+    return str(value.date()) if value == value.normalize() else str(value)
+
+
+def search_series(symbol: str, data: pd.DataFrame, query: np.ndarray, top_k: int, horizons: list,
+                  before=None) -> list:
+    """
+    在一只股票的K线中检索与 query 最相似的 top_k 段，每段之后需要有最长 horizon 根K线用于计算涨跌幅
+
+    相邻的窗口几乎相同，选中一段后排除与它重叠超过一半的窗口，避免返回同一段走势的多个平移。
+
+    Args:
+        before: 只使用在该时间之前结束的窗口，检索股票自身历史时传入 query 的起始时间，排除 query 本身
+    """
+    length, horizon = len(query), max(horizons)
+    close = data["Close"].to_numpy(dtype="float64")
+    if before is not None:
+        # 窗口可以在 before 之前结束，但之后用于计算涨跌幅的K线可以与 query 重叠
+        limit = int(np.searchsorted(pd.DatetimeIndex(data["Date"]), pd.Timestamp(before)))
+    else:
+        limit = len(close)
+    count = min(limit, len(close) - horizon) - length + 1
+    if count <= 0:
+        return []
+    distances, correlation = znorm_distances(close[:count + length - 1], query)
+    matches, taken = [], []
+    for start in np.argsort(distances, kind="stable"):
+        if not np.isfinite(distances[start]) or len(matches) >= top_k:
+            break
+        if any(abs(int(start) - other) < length / 2 for other in taken):
+            continue
+        taken.append(int(start))
+        end = int(start) + length - 1
+        matches.append({
+            "symbol": symbol,
+            "start": _date(data["Date"].iloc[start]),
+            "end": _date(data["Date"].iloc[end]),
+            "distance": round(float(distances[start]), 4),
+            "correlation": round(float(correlation[start]), 4),
+            "forward_returns": {str(h): round((close[end + h] / close[end] - 1) * 100, 2) for h in horizons},
+        })
+    return matches
+
+
+def search_chunk(symbols: list, query: list, top_k: int, horizons: list, stock_config: dict, timeframe: str = "1d",
+                 query_symbol: str = None, query_start=None):
+    """
+    在一组股票的本地K线中检索相似形态，为模块级函数以便在进程池中执行
+
+    Returns:
+        (该组内距离最近的 top_k 个匹配, {symbol: 错误信息})
+    """
+    base_interval, rule = parse_timeframe(timeframe)
+    store = LocalStore(stock_config["data_dir"], stock_config.get("store_format", "parquet"), interval=base_interval,
+                       memory=stock_config.get("memory"))
+    query = np.asarray(query, dtype="float64")
+    matches, errors = [], {}
+    for symbol in symbols:
+        try:
+            data = store.load(symbol)
+            if data is None or data.empty:
+                errors[symbol] = "No local data found"
+                continue
+            if rule is not None:
+                data = get_resample_cache().get((store.path(symbol), timeframe), data, rule)
+            before = query_start if symbol == query_symbol else None
+            matches.extend(search_series(symbol, data, query, top_k, horizons, before))
+        except Exception as e:
+            errors[symbol] = str(e)
+    return merge_matches(matches, top_k), errors
+
+
+def merge_matches(matches: list, top_k: int) -> list:
+    return sorted(matches, key=lambda m: (m["distance"], m["symbol"], m["start"]))[:top_k]
+
+
+def summarize_forward_returns(matches: list, horizons: list) -> dict:
+    """各 horizon 的平均、中位数涨跌幅与上涨占比"""
+    summary = {}
+    for horizon in horizons:
+        returns = [m["forward_returns"][str(horizon)] for m in matches]
+        if not returns:
+            continue
+        summary[str(horizon)] = {
+            "mean": round(float(np.mean(returns)), 2),
+            "median": round(float(np.median(returns)), 2),
+            "win_rate": round(sum(r > 0 for r in returns) / len(returns), 2),
+            "count": len(returns),
+        }
+    return summary
+
+
+def format_similar(result: dict) -> str:
+    """把检索结果转换为提示词中的紧凑文本"""
+    if not result["matches"]:
+        return "历史相似形态: 无足够历史数据"
+    lines = [f"历史相似形态（最近 {result['length']} 根K线收盘价 z 标准化后距离最近的 {len(result['matches'])} 段，"
+             f"后续涨跌幅为匹配结束后第 N 根K线相对结束时收盘价）:"]
+    for index, match in enumerate(result["matches"], 1):
+        returns = " ".join(f"{h}根 {r:+}%" for h, r in match["forward_returns"].items())
+        lines.append(f"{index}. {match['symbol']} {match['start']} ~ {match['end']} 距离 {match['distance']} "
+                     f"相关系数 {match['correlation']} 后续 {returns}")
+    stats = "; ".join(f"{h}根 平均 {s['mean']:+}% 中位数 {s['median']:+}% 上涨占比 {s['win_rate']:.0%}"
+                      for h, s in result["summary"].items())
+    lines.append(f"统计: {stats}")
+    return "\n".join(lines)
+
+
+def similar_result(symbol: str, timeframe: str, query: pd.DataFrame, searched: int, matches: list, errors: dict,
+                   horizons: list) -> dict:
+    """find_similar_patterns 工具返回、也用于生成提示词文本的检索结果"""
+    return {
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "length": len(query),
+        "query": {"start": _date(query["Date"].iloc[0]), "end": _date(query["Date"].iloc[-1])},
+        "searched": searched,
+        "matches": matches,
+        "summary": summarize_forward_returns(matches, horizons),
+        "errors": errors,
+    }
@@ -1,51 +1,121 @@
-from .stock_feature import create_tech_indiction_features
+from .indicator_state import IndicatorEngine
+from .stock_feature import DEFAULT_FEATURE_CONFIG, create_tech_indiction_features, tail_frame
+from .store import LocalStore, fetch_yahoo_bars, slice_period
+from .timeframe import get_resample_cache, parse_timeframe
+from ..utils.cache import TieredCache
+from ..utils.fileio import file_lock
+from ..utils.http import get_yahoo_client
+from ..utils.metrics import collect_spans, span
 from ..utils.plot import plot_kline
+from ..utils.render_cache import RenderCache
+from ..utils.symbols import normalize_symbol
 import logging
 import os
+import time
 import pandas as pd
-import yfinance as yf
+
+DEFAULT_FUNDAMENTALS_CACHE_CONFIG = {
+    "profile_ttl_days": 7,        # 公司信息的有效期
+    "balance_sheet_max_days": 100,  # 资产负债表最长有效期，通常在下一次财报日前过期
+    "earnings_lag_days": 3,       # 财报日之后等待数据更新的天数
+    "max_items": 256,             # 内存中最多缓存的条目数
+}
+_fundamentals_caches = {}
+
+
+def get_fundamentals_cache(data_dir: str, max_items: int) -> TieredCache:
+    """公司信息、资产负债表的进程内共享缓存，每个 data_dir 一个"""
+    if data_dir not in _fundamentals_caches:
+        _fundamentals_caches[data_dir] = TieredCache(os.path.join(data_dir, "cache", "fundamentals"), max_items)
+    return _fundamentals_caches[data_dir]
+
+
+def fundamentals_cache_stats() -> dict:
+    """所有基本面缓存的命中统计之和"""
+    stats = {}
+    for cache in list(_fundamentals_caches.values()):
+        for event, count in cache.stats.items():
+            stats[event] = stats.get(event, 0) + count
+    return stats
+
 
 class Stock:
-    def __init__(self, symbol, stock_config:dict, config:dict):
+    def __init__(self, symbol, stock_config:dict, config:dict, timeframe: str = "1d"):
         self.logger = logging.getLogger("fin_stock")
-        self.symbol = symbol
+        self.symbol = normalize_symbol(symbol)
         self.config = config
         self.source = stock_config['source']
         self.temp_dir = stock_config['data_dir']
-        self._data = self.get_yahoo_data(symbol)
+        # 周线、月线、15m 等周期由本地保存的基础周期K线重采样得到，不单独下载
+        self.timeframe = timeframe
+        self.base_interval, self.resample_rule = parse_timeframe(timeframe)
+        self.store = LocalStore(self.temp_dir, stock_config.get('store_format', 'parquet'), interval=self.base_interval,
+                                memory=stock_config.get('memory'))
+        self.render_cache = RenderCache(self.temp_dir, stock_config.get('render_cache'))
+        # 渲染配置：preset 为 llm 或 human，fast 使用可复用的图表模板
+        self.render_config = {"preset": "llm", "fast": True, **(stock_config.get('render') or {})}
+        # 历史数据按需加载，公司信息、资产负债表等操作不会触发下载
+        self._data = None
+        self.fundamentals_config = {**DEFAULT_FUNDAMENTALS_CACHE_CONFIG, **(stock_config.get('fundamentals_cache') or {})}
+        self.fundamentals_cache = get_fundamentals_cache(self.temp_dir, self.fundamentals_config["max_items"])
+
+    def _fetch_company_info(self, symbol):
+        info = get_yahoo_client().ticker_attr(symbol, "info")
+        return {
+            'name': info.get('shortName', ''),
+            "long_name": info.get('longName', ''),
+            'industry': info.get('industry', ''),
+            'sector': info.get('sector', ''),
+            'country': info.get('country', ''),
+            'market': info.get('market', ''),
+            "market_cap": info.get('marketCap', ''),
+            'currency': info.get('currency', ''),
+            'exchange': info.get('exchange', ''),
+            'exchangeTimezoneName': info.get('exchangeTimezoneName', ''),
+        }
 
     def get_company_info(self, symbol):
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-            return {
-                'name': info.get('shortName', ''),
-                "long_name": info.get('longName', ''),
-                'industry': info.get('industry', ''),
-                'sector': info.get('sector', ''),
-                'country': info.get('country', ''),
-                'market': info.get('market', ''),
-                "market_cap": info.get('marketCap', ''),
-                'currency': info.get('currency', ''),
-                'exchange': info.get('exchange', ''),
-                'exchangeTimezoneName': info.get('exchangeTimezoneName', ''),
-            }
+            symbol = normalize_symbol(symbol)
+            ttl = self.fundamentals_config["profile_ttl_days"] * 86400
+            return self.fundamentals_cache.get_or_load(f"info:{symbol}", lambda: self._fetch_company_info(symbol),
+                                                       lambda _: time.time() + ttl)
         except Exception as e:
             self.logger.error(f"获取公司信息失败：{e}")
             return None
 
+    def _balance_sheet_expiry(self, _) -> float:
+        """资产负债表在下一次财报日（加上数据延迟）后过期，获取不到财报日时使用最长有效期"""
+        now = pd.Timestamp.now()
+        max_expiry = now + pd.Timedelta(days=self.fundamentals_config["balance_sheet_max_days"])
+        lag = pd.Timedelta(days=self.fundamentals_config["earnings_lag_days"])
+        try:
+            calendar = get_yahoo_client().ticker_attr(self.symbol, "calendar") or {}
+            dates = [pd.Timestamp(d) for d in calendar.get("Earnings Date", []) or []]
+        except Exception as e:
+            self.logger.warning(f"获取财报日期失败：{e}")
+            return max_expiry.timestamp()
+        upcoming = [d + lag for d in dates if d + lag > now]
+        if upcoming:
+            return min(min(upcoming), max_expiry).timestamp()
+        # 财报日已过但新一期数据可能尚未发布，次日再检查
+        return (now + pd.Timedelta(days=1)).timestamp() if dates else max_expiry.timestamp()
+
     def get_quarterly_balance_sheet(self):
         try:
-            ticker = yf.Ticker(self.symbol)
-            return ticker.quarterly_balance_sheet
+            return self.fundamentals_cache.get_or_load(
+                f"balance_sheet:{self.symbol}",
+                lambda: get_yahoo_client().ticker_attr(self.symbol, "quarterly_balance_sheet"),
+                self._balance_sheet_expiry)
         except Exception as e:
             self.logger.error(f"获取公司信息失败：{e}")
             return None
 
     def get_history_data(self, period: str = "30d"):
         try:
-            ticker = yf.Ticker(self.symbol)
-            return ticker.history(period=period, auto_adjust=True)
+            if self.source == "local" or self.timeframe != "1d":
+                return slice_period(self.data, period, self.timeframe).set_index("Date")
+            return get_yahoo_client().ticker_attr(self.symbol, "history", period=period, auto_adjust=True)
         except Exception as e:
             self.logger.error(f"获取公司信息失败：{e}")
             return None
@@ -54,40 +124,163 @@ class Stock:
         """
         get data from Yahoo Finance
         """
-        data = yf.download(symbol, period="max", auto_adjust=True, timeout=30)
+        data = fetch_yahoo_bars(symbol)
         if data.empty:
             raise ValueError(f"No data found for symbol: {symbol}")
-        if isinstance(data.columns, pd.MultiIndex):
-            data.columns = data.columns.get_level_values(0)  # 删除第一层（如 'Price'）
-            data = data.dropna(axis=1, how='all')     # 删除全空列（如 'index'）
-        data.reset_index(inplace=True)
         return data
 
+    def load_data(self, bars: int = None):
+        """
+        按数据源加载 timeframe 周期的K线：yahoo 增量同步本地仓库后返回，local 只读取本地仓库
 
-    def plot_with_tech_indicators(self, windows:int = 30):
-        data = create_tech_indiction_features(self._data, self.config)
-        if data.empty:
-            self.logger.warning("警告：没有数据可用于绘图")
-            return None
-        actual_windows = min(int(windows), len(data))
-        if actual_windows <= 0:
-            self.logger.warning("警告：没有足够的数据进行绘图")
-            return None
-        # 获取最后一行数据作为当前点
-        if len(data) > 0:
-            current_data = data.iloc[-1]  # 使用iloc[-1]获取Series而不是DataFrame
+        Args:
+            bars: 只返回最近的 bars 根K线，为空时返回全部历史
+        """
+        data = self._load_bars()
+        return data if bars is None else data.tail(bars).reset_index(drop=True)
+
+    def _load_bars(self):
+        """同一个 Stock 只同步、读取一次，之后的绘图、摘要和增量指标共享同一份数据"""
+        if self._data is not None:
+            return self._data
+        if self.source == "local":
+            with span("load_bars"):
+                data = self.store.load(self.symbol)
+            if data is None or data.empty:
+                raise ValueError(f"No local data found for symbol: {self.symbol}")
         else:
-            current_data = data.iloc[0] if len(data) > 0 else None
-            
-        if current_data is None:
-            self.logger.warning("警告：无法获取当前数据点")
-            return None
-        plot_path = self.temp_dir
-        chart_path, image_name = plot_kline(data[-windows:], current_data, plot_path, self.symbol)
-        return chart_path,image_name
+            with span("sync_bars"):
+                data = self.store.sync(self.symbol)
+        if self.resample_rule is not None:
+            # 重采样结果按基础K线的版本缓存，新K线到达后重新计算
+            with span("resample"):
+                data = get_resample_cache().get((self.store.path(self.symbol), self.timeframe), data,
+                                                self.resample_rule)
+        self._data = data
+        return data
+
+    def update_indicator_state(self) -> dict:
+        """
+        用增量指标引擎计算最新一根K线的指标值，只处理检查点之后的新K线
+
+        最后一根K线可能是盘中数据，只参与计算不写入检查点；若检查点对应K线的复权价已变化则从头重建。
+        """
+        data = self.data
+        path = self.store.state_path(self.symbol, self.timeframe)
+        engine = IndicatorEngine.restore(path, self.config)
+        if engine is not None:
+            consumed = data[data["Date"] == pd.Timestamp(engine.last_date)]
+            tolerance = 1e-9 * max(abs(engine.last_close), 1.0)
+            if consumed.empty or abs(float(consumed["Close"].iloc[0]) - engine.last_close) > tolerance:
+                self.logger.info(f"{self.symbol} 指标检查点与K线数据不一致，重新计算")
+                engine = None
+        if engine is None:
+            engine = IndicatorEngine(self.config)
+            pending = data.iloc[:-1]
+        else:
+            pending = data.iloc[:-1][data["Date"].iloc[:-1] > pd.Timestamp(engine.last_date)]
+        with span("indicator_state"):
+            for bar in pending.to_dict("records"):
+                engine.update(bar)
+            if len(pending) > 0:
+                engine.save(path)
+        return {"Date": data["Date"].iloc[-1], **engine.peek(data.iloc[-1])}
+
+    def load_plot_data(self, windows: int = 30, indicators: str = "chart"):
+        """只加载窗口和 indicators 指标预热所需的K线，累积指标已在全量历史上算好并作为列附加"""
+        return tail_frame(self._load_bars(), self.config, windows, indicators).reset_index(drop=True)
+
+    def render_options(self, preset: str = None) -> dict:
+        """单次渲染的参数，preset 为空时使用配置中的默认值"""
+        options = dict(self.render_config)
+        if preset:
+            options["preset"] = preset
+        return options
+
+    def chart_image_name(self, history, windows: int, render_options: dict = None) -> str:
+        """渲染缓存使用的图片文件名"""
+        extra = dict(render_options or self.render_options())
+        if self.timeframe != "1d":
+            extra["timeframe"] = self.timeframe
+        return self.render_cache.image_name(self.symbol, history, windows, {**DEFAULT_FEATURE_CONFIG, **self.config},
+                                            **extra)
+
+    @property
+    def chart_label(self) -> str:
+        """图表标题中的股票代码，非日线时附带周期"""
+        return self.symbol if self.timeframe == "1d" else f"{self.symbol} {self.timeframe}"
+
+    def plot_with_tech_indicators(self, windows:int = 30, preset: str = None):
+        history = self.load_plot_data(windows)
+        render_options = self.render_options(preset)
+        image_name = self.chart_image_name(history, windows, render_options)
+        cached = self.render_cache.lookup(image_name)
+        if cached is not None:
+            return cached
+        result = render_tech_chart(history, windows, self.config, self.temp_dir, self.chart_label, image_name,
+                                   **render_options)
+        with span("render_cache_evict"):
+            self.render_cache.evict()
+        return result
 
 
     @property
     def data(self):
+        if self._data is None:
+            self.load_data()
         return self._data
-    
\ No newline at end of file
+    
+
+def render_tech_chart(history, windows: int, config: dict, plot_path: str, symbol: str, image_name: str = None,
+                      preset: str = "llm", fast: bool = True):
+    """
+    计算技术指标并绘制K线图，为模块级函数以便在进程池中执行
+
+    Args:
+        preset: 渲染预设，llm（小尺寸、低 DPI）或 human（大尺寸、300 DPI）
+        fast: 使用进程内复用的图表模板渲染
+
+    Returns:
+        (chart_path, image_name)，没有可绘制的数据时返回 None
+    """
+    logger = logging.getLogger("fin_stock")
+    if image_name is None:
+        return _render_tech_chart(history, windows, config, plot_path, symbol, image_name, preset, fast)
+    # 多个进程渲染同一张图时只有一个进程绘制，其余进程等待后直接使用已写入的图片
+    with file_lock(image_name, os.path.join(plot_path, ".locks")):
+        save_path = os.path.join(plot_path, image_name)
+        if os.path.exists(save_path):
+            logger.info(f"K线图已由其他进程生成: {image_name}")
+            return save_path, image_name
+        return _render_tech_chart(history, windows, config, plot_path, symbol, image_name, preset, fast)
+
+
+def _render_tech_chart(history, windows: int, config: dict, plot_path: str, symbol: str, image_name: str,
+                       preset: str, fast: bool):
+    logger = logging.getLogger("fin_stock")
+    with span("features"):
+        data = create_tech_indiction_features(history, config, windows=windows, indicators="chart")
+    if data.empty:
+        logger.warning("警告：没有数据可用于绘图")
+        return None
+    actual_windows = min(int(windows), len(data))
+    if actual_windows <= 0:
+        logger.warning("警告：没有足够的数据进行绘图")
+        return None
+    # 获取最后一行数据作为当前点
+    current_data = data.iloc[-1]  # 使用iloc[-1]获取Series而不是DataFrame
+    with span("plot"):
+        return plot_kline(data[-actual_windows:], current_data, plot_path, symbol, image_name, preset=preset,
+                          fast=fast)
+
+
+def render_tech_chart_timed(*args, **kwargs):
+    """
+    在进程池中执行 render_tech_chart，并把各阶段耗时一并返回，由主进程记录到指标中
+
+    Returns:
+        (render_tech_chart 的结果, [(stage, seconds, peak_bytes), ...])
+    """
+    with collect_spans() as spans:
+        result = render_tech_chart(*args, **kwargs)
+    return result, spans
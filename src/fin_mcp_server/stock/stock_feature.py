@@ -1,67 +1,88 @@
-import pandas as pd
-import talib as ta
 import numpy as np
+import pandas as pd
+
+from .indicators import DEFAULT_FEATURE_CONFIG, RECURSIVE_WARMUP_FACTOR, build_registry, psy
+
+
+def feature_lookback(config: dict = None, indicators=None) -> int:
+    """
+    计算指标在窗口之前需要的预热K线数量，使截取尾部数据计算的指标与全量历史一致；
+    OBV 等累积指标不能靠预热恢复，需要通过 tail_frame 截取
+
+    Args:
+        indicators: 需要的指标组合、指标名或列名，为空时为全部指标
+    """
+    registry = build_registry(config)
+    return registry.warmup(registry.expand(indicators))
+
+
+def tail_frame(df: pd.DataFrame, config: dict, windows: int, indicators=None) -> pd.DataFrame:
+    """
+    截取计算最后 windows 根K线的指标所需的数据：窗口加上预热K线
+
+    OBV 等累积指标的值依赖全部历史，无法靠预热K线恢复，在截取之前用全量数据计算并作为列附加到结果中，
+    create_tech_indiction_features 直接使用这些列；df 中已有的累积指标列保持不变。
+
+    Args:
+        indicators: 需要的指标组合、指标名或列名，为空时为全部指标
+    """
+    registry = build_registry(config)
+    columns = registry.expand(indicators)
+    tail = df.tail(int(windows) + registry.warmup(columns))
+    cumulative = [indicator for indicator in registry.resolve(columns) if indicator.cumulative
+                  and not all(column in df.columns for column in indicator.outputs)]
+    if not cumulative or len(tail) == len(df):
+        return tail
+    tail = tail.copy(deep=False)
+    for indicator in cumulative:
+        values = {col: pd.to_numeric(df[col], errors="coerce").astype("float64") for col in indicator.inputs}
+        for column, output in zip(indicator.outputs, indicator.compute(values)):
+            tail[column] = np.asarray(output, dtype="float64")[-len(tail):]
+    return tail
+
 
 # Date,Close,High,Low,Open,Volume
-def create_tech_indiction_features(df: pd.DataFrame, config: dict):
-    default_config = {
-        "ema_period": [5, 10, 20, 50, 100],
-        "sma_period": [20, 100],
-        "macd_slope": [3, 5, 10],
-        "Volumeatility_window": [30]
-    }
-    if config is not None:
-        default_config.update(config)
-    data = df.copy()
-    # 安全地处理数据类型转换，避免处理日期列
-    date_columns = [col for col in data.columns if 'date' in col.lower() or 'time' in col.lower()]
-    
-    # 只转换非日期列的object类型列
-    object_columns = data.select_dtypes(include=['object']).columns.tolist()
-    columns_to_convert = [col for col in object_columns if col not in date_columns]
-    try:
-        # 确保日期列是datetime类型
-        for date_col in date_columns:
-            if date_col in data.columns:
-                try:
-                    data[date_col] = pd.to_datetime(data[date_col], errors='coerce')
-                except Exception as e:
-                    print(f"转换日期列 {date_col} 时出错: {e}")
-        
-        # 安全地转换数据类型
-        for col in columns_to_convert:
-            try:
-                data[col] = pd.to_numeric(data[col], errors='coerce')
-            except Exception:
-                print(f"警告：无法转换列 {col} 的数据类型")
-                pass  # 如果转换失败，则保持原样
-        for period in default_config['ema_period']:
-            data[f'EMA{period}'] = ta.EMA(data['Close'], timeperiod=period)
+def create_tech_indiction_features(df: pd.DataFrame, config: dict, windows: int = None, indicators=None):
+    """
+    计算技术指标
+
+    Args:
+        df: 日线数据
+        config: 指标配置
+        windows: 只需要最后 windows 根K线的指标时传入，仅对最后 windows + 预热长度的数据计算（见 tail_frame）
+        indicators: 需要的指标组合（如 chart）、指标名或列名，只计算这些指标及其依赖，为空时计算全部指标
 
-        for period in default_config['sma_period']:
-            data[f'SMA{period}'] = ta.SMA(data['Close'], timeperiod=period)
+    Raises:
+        IndicatorError: 请求了未注册的指标或缺少输入列
+    """
+    registry = build_registry(config)
+    columns = registry.expand(indicators)
+    if windows is not None:
+        df = tail_frame(df, config, windows, columns)
+    # 浅拷贝：只新增或替换列，不复制也不修改调用方（可能是共享的只读数据）的列
+    data = df.copy(deep=False)
+    # 确保日期列是datetime类型，其余 object 列转换为数值
+    date_columns = [col for col in data.columns if 'date' in col.lower() or 'time' in col.lower()]
+    for date_col in date_columns:
+        if not pd.api.types.is_datetime64_any_dtype(data[date_col]):
+            data[date_col] = pd.to_datetime(data[date_col], errors='coerce')
+    for col in data.select_dtypes(include=['object']).columns:
+        if col not in date_columns:
+            data[col] = pd.to_numeric(data[col], errors='coerce')
+    data = registry.compute(data, columns)
+    return _drop_warmup(data)
 
-        data['RSI'] = ta.RSI(data['Close'], timeperiod=14)
 
-        data['MACD'], data['MACD_SIGNAL'], data['MACD_HIST'] = ta.MACD(data['Close'],
-                                                                    fastperiod=12,
-                                                                    slowperiod=26,
-                                                                    signalperiod=9)
-        data['UpperBB'], data['MiddleBB'], data['LowerBB'] = ta.BBANDS(data['Close'], timeperiod=20)
-        data['OBV'] = ta.OBV(data['Close'], data['Volume'])
-        data['OBV_SMA'] = ta.SMA(data['OBV'], timeperiod=20)
-        data['ATR'] = ta.ATR(data['High'], data['Low'], data['Close'], timeperiod=14)
-        data['MOM'] = ta.MOM(data['Close'], timeperiod=10)
-        data['CCI'] = ta.CCI(data['High'], data['Low'], data['Close'], timeperiod=14)
-        data['PSY'] = data['Close'].rolling(12).apply(lambda x: sum(x > x.shift(1)) / 12 * 100)
-        data['K'], data['D'] = ta.STOCH(data['High'].values, data['Low'].values, data['Close'].values, fastk_period=9,
-                                        slowk_period=3,
-                                        slowk_matype=ta.MA_Type.SMA, slowd_period=3, slowd_matype=ta.MA_Type.SMA)
-        data['J'] = 3 * data['K'] - 2 * data['D']
-    except Exception as e:
-        print(f"计算技术指标时出错: {e}")
-        import traceback
-        traceback.print_exc()
-        return data
+def _drop_warmup(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    去掉预热阶段的K线并向前填充中间的缺失值，结果与 ffill().dropna() 相同
 
-    return data.replace([np.inf, -np.inf], np.nan).ffill().dropna()
\ No newline at end of file
+    ffill 之后仍有缺失值的行正好是某一列出现首个有效值之前的行，先截取再填充，只复制保留下来的部分。
+    """
+    valid = data.notna().to_numpy()
+    if len(data) == 0 or not valid.any(axis=0).all():
+        return data.iloc[0:0]
+    data = data.iloc[int(valid.argmax(axis=0).max()):]
+    if not valid[-len(data):].all():
+        data = data.ffill()
+    return data
@@ -0,0 +1,226 @@
+import logging
+import os
+import re
+import pandas as pd
+
+from .frames import DEFAULT_MEMORY_CONFIG, compact_frame, get_frame_registry
+from .timeframe import BASE_INTERVALS, is_intraday
+from ..utils.fileio import atomic_path, file_lock
+from ..utils.http import get_yahoo_client
+
+logger = logging.getLogger("fin_stock")
+
+# 日线 K 线的标准列
+OHLCV_COLUMNS = ["Date", "Open", "High", "Low", "Close", "Volume"]
+# 复权价变化（分红/拆股）的判定阈值
+ADJUST_TOLERANCE = 1e-4
+
+
+def fetch_yahoo_bars(symbol: str, start=None, period: str = "max", timeout: int = 30,
+                     interval: str = "1d") -> pd.DataFrame:
+    """
+    从 Yahoo Finance 下载K线数据，返回带 Date 列的扁平 DataFrame
+
+    Args:
+        symbol: 股票代码
+        start: 起始日期（含），为空时按 period 下载
+        period: start 为空时使用的周期，默认全量历史
+        interval: K线周期，日内周期的 Date 为带时区的时间戳
+    """
+    yahoo = get_yahoo_client()
+    if start is not None:
+        data = yahoo.download(symbol, start=pd.Timestamp(start).strftime("%Y-%m-%d"), auto_adjust=True,
+                              timeout=timeout, interval=interval)
+    else:
+        data = yahoo.download(symbol, period=period, auto_adjust=True, timeout=timeout, interval=interval)
+    if data is None or data.empty:
+        return pd.DataFrame(columns=OHLCV_COLUMNS)
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)  # 删除第一层（如 'Price'）
+        data = data.dropna(axis=1, how='all')     # 删除全空列（如 'index'）
+    data.index.name = "Date"
+    data = data.reset_index()
+    return data[[col for col in OHLCV_COLUMNS if col in data.columns]]
+
+
+def slice_period(data: pd.DataFrame, period: str, interval: str = "1d") -> pd.DataFrame:
+    """
+    按 yfinance 的 period 语义（如 5d、1mo、1y、ytd、max）截取最近一段数据
+
+    Args:
+        interval: data 的K线周期；Nd 对日线取最后 N 根，对日内K线取最后 N 个交易日，对周线、月线按自然日截取
+    """
+    if data.empty or period == "max":
+        return data
+    last = pd.Timestamp(data["Date"].iloc[-1])
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if period == "ytd":
+        start = last.normalize().replace(month=1, day=1)
+    elif match:
+        n, unit = int(match.group(1)), match.group(2)
+        if unit == "d" and interval == "1d":
+            # 与 Yahoo 一致，按交易日计数
+            return data.tail(n)
+        if unit == "d" and is_intraday(interval):
+            sessions = pd.DatetimeIndex(data["Date"]).normalize()
+            return data[sessions >= sessions.unique()[-n:][0]]
+        offsets = {"d": pd.DateOffset(days=n), "wk": pd.DateOffset(weeks=n), "mo": pd.DateOffset(months=n),
+                   "y": pd.DateOffset(years=n)}
+        start = last - offsets[unit]
+    else:
+        raise ValueError(f"Invalid period: {period}")
+    return data[data["Date"] > start]
+
+
+class LocalStore:
+    """
+    按股票代码分文件保存的列式 K 线仓库（Parquet/Feather）
+
+    首次访问下载全量历史，之后每次只拉取最后一个已存日期之后的增量数据并追加。
+    日内周期（interval 为 1m、5m、60m）单独保存，Yahoo 只提供最近一段日内数据，本地仓库会随同步逐渐积累更长的历史。
+    文件保存下载时的完整精度，读取到内存时价格列转换为 memory.float_dtype，按文件版本缓存在进程内共享的 FrameRegistry 中。
+    """
+    FORMATS = {"parquet": ".parquet", "feather": ".feather"}
+
+    def __init__(self, data_dir: str, fmt: str = "parquet", fetcher=fetch_yahoo_bars, interval: str = "1d",
+                 memory: dict = None):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unsupported store format: {fmt}")
+        if interval not in BASE_INTERVALS:
+            raise ValueError(f"Unsupported store interval: {interval}, expected one of {list(BASE_INTERVALS)}")
+        self.root = os.path.join(data_dir, "bars")
+        self.fmt = fmt
+        self.fetcher = fetcher
+        self.interval = interval
+        memory = {**DEFAULT_MEMORY_CONFIG, **(memory or {})}
+        self.float_dtype = memory["float_dtype"]
+        self.frames = get_frame_registry(memory["frame_budget_mb"])
+
+    def path(self, symbol: str) -> str:
+        name = re.sub(r"[^A-Za-z0-9._^=-]", "_", symbol)
+        suffix = "" if self.interval == "1d" else f".{self.interval}"
+        return os.path.join(self.root, f"{name}{suffix}{self.FORMATS[self.fmt]}")
+
+    def state_path(self, symbol: str, timeframe: str = None) -> str:
+        """增量指标状态检查点，与K线文件放在一起；重采样周期的检查点按 timeframe 区分"""
+        suffix = "" if timeframe in (None, self.interval) else f".{timeframe}"
+        return os.path.splitext(self.path(symbol))[0] + f"{suffix}.indicators.json"
+
+    def _fetch(self, symbol: str, **kwargs) -> pd.DataFrame:
+        # 日线沿用原有的 fetcher 签名，只有日内周期才传入 interval
+        if self.interval != "1d":
+            kwargs["interval"] = self.interval
+        return self.fetcher(symbol, **kwargs)
+
+    def exists(self, symbol: str) -> bool:
+        return os.path.exists(self.path(symbol))
+
+    def symbols(self) -> list:
+        """本地已保存 interval 周期K线的股票代码，按代码排序"""
+        suffix = ("" if self.interval == "1d" else f".{self.interval}") + self.FORMATS[self.fmt]
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        # 日线文件名不带周期后缀，排除 AAPL.5m.parquet 等日内文件
+        intraday = tuple(f".{interval}{self.FORMATS[self.fmt]}" for interval in BASE_INTERVALS if interval != "1d")
+        return sorted(name[:-len(suffix)] for name in names
+                      if name.endswith(suffix) and not name.startswith(".")
+                      and (self.interval != "1d" or not name.endswith(intraday)))
+
+    @staticmethod
+    def _version(path: str):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_file(self, path: str) -> pd.DataFrame:
+        return pd.read_parquet(path) if self.fmt == "parquet" else pd.read_feather(path)
+
+    def _read(self, path: str) -> pd.DataFrame:
+        return compact_frame(self._read_file(path), self.float_dtype)
+
+    def load(self, symbol: str):
+        """读取本地数据，不存在时返回 None；文件未变化时直接返回共享的内存数据"""
+        path = self.path(symbol)
+        try:
+            version = self._version(path)
+        except FileNotFoundError:
+            return None
+        return self.frames.get(path, version, lambda: self._read(path))
+
+    def save(self, symbol: str, data: pd.DataFrame) -> pd.DataFrame:
+        """以完整精度保存，登记到共享数据中并返回转换为 float_dtype 的数据"""
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(symbol)
+        data = data.reset_index(drop=True)
+        # 先写临时文件再原子替换，其他进程读取时不会看到写了一半的文件
+        with atomic_path(path) as tmp_path:
+            if self.fmt == "parquet":
+                data.to_parquet(tmp_path, index=False)
+            else:
+                data.to_feather(tmp_path)
+        return self.frames.put(path, self._version(path), compact_frame(data, self.float_dtype))
+
+    def sync(self, symbol: str) -> pd.DataFrame:
+        """
+        增量同步：从倒数第二个已存日期起重新拉取并追加新数据，最后一根 K 线可能是盘中数据会被覆盖。
+        若重叠的已收盘 K 线复权价发生变化（分红/拆股），则重新下载全量历史。
+
+        共享 data_dir 的多个进程同步同一只股票时按文件加锁，后进入的进程读取前一个进程写入的结果，只拉取剩余的增量。
+        """
+        with file_lock(self.path(symbol), os.path.join(self.root, ".locks")):
+            return self._sync(symbol)
+
+    def _sync(self, symbol: str) -> pd.DataFrame:
+        # 从文件读取完整精度的数据再合并，共享的内存数据已转换为 float_dtype，写回会永久丢失精度
+        try:
+            stored = self._read_file(self.path(symbol))
+        except FileNotFoundError:
+            stored = None
+        if stored is None or stored.empty:
+            return self._full_download(symbol)
+
+        anchor = stored.iloc[-2] if len(stored) > 1 else stored.iloc[-1]
+        if self.interval != "1d":
+            anchor_time = pd.Timestamp(anchor["Date"])
+            anchor_time = anchor_time.tz_convert("UTC") if anchor_time.tzinfo else anchor_time.tz_localize("UTC")
+            window = pd.Timedelta(BASE_INTERVALS[self.interval]) - pd.Timedelta(days=1)
+            if pd.Timestamp.now(tz="UTC") - anchor_time > window:
+                # 超出 Yahoo 日内数据的可查询范围，拉取可用的全部数据并与本地历史合并
+                delta = self._fetch(symbol, period=BASE_INTERVALS[self.interval])
+                return self._merge(symbol, stored, delta, len(stored))
+        delta = self._fetch(symbol, start=anchor["Date"])
+        if delta.empty:
+            return self.load(symbol)
+
+        matched = delta[delta["Date"] == anchor["Date"]]
+        if not matched.empty:
+            old_close = float(anchor["Close"])
+            new_close = float(matched["Close"].iloc[0])
+            if abs(new_close - old_close) > ADJUST_TOLERANCE * max(abs(old_close), 1.0):
+                if self.interval == "1d":
+                    logger.info(f"{symbol} 复权价发生变化，重新下载全量历史")
+                    return self._full_download(symbol)
+                # 日内数据无法重新下载完整历史，只覆盖 Yahoo 仍能提供的部分
+                logger.warning(f"{symbol} {self.interval} 复权价发生变化，只更新最近的日内数据")
+                delta = self._fetch(symbol, period=BASE_INTERVALS[self.interval])
+                return self._merge(symbol, stored, delta, len(stored))
+
+        return self._merge(symbol, stored[stored["Date"] < anchor["Date"]], delta, len(stored))
+
+    def _merge(self, symbol: str, stored: pd.DataFrame, delta: pd.DataFrame, stored_bars: int) -> pd.DataFrame:
+        """合并本地数据与新拉取的数据，日期重复时以新数据为准"""
+        data = pd.concat([stored, delta], ignore_index=True)
+        data = data.drop_duplicates(subset="Date", keep="last").sort_values("Date", ignore_index=True)
+        data = self.save(symbol, data)
+        logger.info(f"{symbol} 增量同步 {len(data) - stored_bars} 根新K线，共 {len(data)} 根")
+        return data
+
+    def _full_download(self, symbol: str) -> pd.DataFrame:
+        if self.interval == "1d":
+            data = self._fetch(symbol)
+        else:
+            data = self._fetch(symbol, period=BASE_INTERVALS[self.interval])
+        if data.empty:
+            raise ValueError(f"No data found for symbol: {symbol}")
+        return self.save(symbol, data)
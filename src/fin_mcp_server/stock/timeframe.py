@@ -0,0 +1,99 @@
+from collections import OrderedDict
+import threading
+import pandas as pd
+
+# 本地保存的基础周期，以及每个基础周期首次下载时 Yahoo 允许的最长历史
+BASE_INTERVALS = {"1d": "max", "1m": "7d", "5m": "60d", "60m": "730d"}
+# 对外的时间周期 -> (基础周期, pandas 重采样规则)，规则为空表示直接使用基础周期
+TIMEFRAMES = {
+    "1m": ("1m", None),
+    "5m": ("5m", None),
+    "15m": ("5m", "15min"),
+    "30m": ("5m", "30min"),
+    "60m": ("60m", None),
+    "1h": ("60m", None),
+    "4h": ("60m", "4h"),
+    "1d": ("1d", None),
+    "1wk": ("1d", "W-FRI"),
+    "1mo": ("1d", "MS"),
+    "3mo": ("1d", "QS"),
+}
+OHLCV_AGG = {"Date": "first", "Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+
+def parse_timeframe(timeframe: str):
+    """返回 (基础周期, 重采样规则)"""
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Unsupported timeframe: {timeframe}, expected one of {list(TIMEFRAMES)}")
+    return TIMEFRAMES[timeframe]
+
+
+def is_intraday(interval: str) -> bool:
+    return interval != "1d" and not interval.endswith(("wk", "mo"))
+
+
+def resample_bars(data: pd.DataFrame, rule: str) -> pd.DataFrame:
+    """
+    把基础K线聚合为更长周期：开盘取首个、最高取最大、最低取最小、收盘取最后、成交量求和
+
+    每根聚合K线的 Date 为该周期内第一根基础K线的时间（与 Yahoo 的周线、月线一致）；
+    日内周期的分桶从首根K线的时刻起对齐，使 1h、4h 等K线从开盘时间开始。
+    """
+    if data.empty:
+        return data
+    dates = pd.DatetimeIndex(data["Date"])
+    kwargs = {}
+    if isinstance(pd.tseries.frequencies.to_offset(rule), pd.offsets.Tick):
+        # 固定时长的日内周期，分桶起点对齐到首根K线的时刻
+        kwargs["offset"] = dates[0] - dates[0].floor(rule)
+    aggregations = {col: agg for col, agg in OHLCV_AGG.items() if col in data.columns}
+    result = data.set_index(dates).resample(rule, **kwargs).agg(aggregations)
+    # 周末、节假日等没有基础K线的分桶
+    return result.dropna(subset=["Date"]).reset_index(drop=True)
+
+
+class ResampleCache:
+    """
+    重采样结果的进程内 LRU 缓存
+
+    以基础K线的行数、首根K线收盘价和最后一根K线的 (Date, OHLCV) 作为版本，
+    新K线到达、盘中K线更新或复权后重新下载历史都会使缓存失效。
+    """
+
+    def __init__(self, max_items: int = 256):
+        self.max_items = max_items
+        self.stats = {"hits": 0, "misses": 0}
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def version(base: pd.DataFrame) -> tuple:
+        if base.empty:
+            return (0,)
+        last = base.iloc[-1]
+        return (len(base), float(base["Close"].iloc[0]), str(last["Date"]),
+                *(float(last[c]) for c in OHLCV_AGG if c != "Date" and c in base))
+
+    def get(self, key, base: pd.DataFrame, rule: str) -> pd.DataFrame:
+        version = self.version(base)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] == version:
+                self._items.move_to_end(key)
+                self.stats["hits"] += 1
+                return item[1]
+            self.stats["misses"] += 1
+        frame = resample_bars(base, rule)
+        with self._lock:
+            self._items[key] = (version, frame)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return frame
+
+
+_resample_cache = ResampleCache()
+
+
+def get_resample_cache() -> ResampleCache:
+    return _resample_cache
@@ -0,0 +1,226 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+
+from .fileio import atomic_open
+
+logger = logging.getLogger("fin_mcp_server")
+
+
+def cache_key(*parts) -> str:
+    """把任意可 JSON 序列化的参数组合成稳定的缓存键"""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """
+    带过期时间的缓存：内存中保存一份，指定 cache_dir 时同时落盘为 JSON，进程重启后仍可命中
+
+    内存中最多保留 max_items 个条目，超出时淘汰最久未使用的；创建时和每次写入时清理过期的缓存文件，
+    并只保留最新写入的 max_items 个文件。
+    """
+
+    def __init__(self, ttl: float, cache_dir: str = None, max_items: int = 1000):
+        self.ttl = float(ttl)
+        self.cache_dir = cache_dir
+        self.max_items = max(1, int(max_items))
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.prune()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str):
+        """返回未过期的值，不存在或已过期时返回 None"""
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+        if item is None and self.cache_dir and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as file:
+                    item = json.load(file)
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取缓存 {key} 失败: {e}")
+                item = None
+        if item is None or now - item["created"] > self.ttl:
+            with self._lock:
+                self._items.pop(key, None)
+                self.stats["misses"] += 1
+            return None
+        self._remember(key, item)
+        with self._lock:
+            self.stats["hits"] += 1
+        return item["value"]
+
+    def _remember(self, key: str, item: dict):
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def set(self, key: str, value):
+        item = {"created": time.time(), "value": value}
+        self._remember(key, item)
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with atomic_open(self._path(key)) as file:
+                json.dump(item, file, ensure_ascii=False)
+            self.prune()
+
+    def prune(self):
+        """删除内存中过期的条目，以及过期或超出 max_items 个的最旧缓存文件"""
+        now = time.time()
+        with self._lock:
+            for key in [key for key, item in self._items.items() if now - item["created"] > self.ttl]:
+                del self._items[key]
+        if not self.cache_dir:
+            return
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return
+        files = []
+        for name in names:
+            if name.startswith(".") or not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                files.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                continue
+        files.sort(reverse=True)
+        for index, (mtime, path) in enumerate(files):
+            if index < self.max_items and now - mtime <= self.ttl:
+                continue
+            try:
+                os.remove(path)
+                self.stats["evictions"] += 1
+            except FileNotFoundError:
+                # 共享 data_dir 的其他进程已删除
+                pass
+
+
+class SingleFlight:
+    """
+    合并并发的相同请求：同一个 key 同时只执行一次，其余调用等待同一个结果
+
+    共享任务通过 asyncio.shield 保护，某个调用方被取消不会中断其他等待者。
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self.stats = {"leaders": 0, "followers": 0}
+
+    async def do(self, key: str, fn):
+        """fn 为无参数的协程函数"""
+        task = self._tasks.get(key)
+        if task is None:
+            self.stats["leaders"] += 1
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.stats["followers"] += 1
+        return await asyncio.shield(task)
+
+
+class TieredCache:
+    """
+    两级缓存：内存 LRU 在前，磁盘 pickle 在后，每个条目有自己的过期时间
+
+    条目过期后 get_or_load 立即返回旧值，同时在后台线程刷新（stale-while-revalidate），
+    同一个 key 同时只会有一个刷新任务；没有旧值时同步加载。
+    """
+
+    def __init__(self, cache_dir: str, max_items: int = 256, refresh_workers: int = 2):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "refresh_errors": 0}
+        self._items = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.pkl")
+
+    def _get_entry(self, key: str):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                self._items.move_to_end(key)
+                return entry
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as file:
+                entry = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"读取缓存 {key} 失败: {e}")
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: dict):
+        with self._lock:
+            self._items[key] = entry
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def set(self, key: str, value, expires_at: float):
+        entry = {"value": value, "expires_at": expires_at, "created": time.time()}
+        self._remember(key, entry)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with atomic_open(self._path(key), "wb") as file:
+            pickle.dump(entry, file)
+
+    def _load(self, key: str, loader, expires):
+        value = loader()
+        if value is not None:
+            self.set(key, value, expires(value))
+        return value
+
+    def _refresh(self, key: str, loader, expires):
+        try:
+            self._load(key, loader, expires)
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            logger.warning(f"后台刷新缓存 {key} 失败: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_load(self, key: str, loader, expires):
+        """
+        Args:
+            key: 缓存键
+            loader: 无参数函数，返回新值；返回 None 时不缓存
+            expires: 函数 expires(value) -> 过期时间戳
+        """
+        entry = self._get_entry(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return self._load(key, loader, expires)
+        if time.time() < entry["expires_at"]:
+            self.stats["hits"] += 1
+            return entry["value"]
+        self.stats["stale"] += 1
+        with self._lock:
+            schedule = key not in self._refreshing
+            self._refreshing.add(key)
+        if schedule:
+            self._refresher.submit(self._refresh, key, loader, expires)
+        return entry["value"]
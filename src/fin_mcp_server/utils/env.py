@@ -1,7 +1,6 @@
 from argparse import Namespace
 from dotenv import load_dotenv
 from typing import Any, Dict, Optional,Type, TypeVar, get_type_hints
-import copy
 import json
 import logging
 import os
@@ -41,10 +40,11 @@ def get_var_value(context: Dict[str, Any], var_name: str, default: Optional[str]
     if env_value is not None:
         return env_value
 
-    # 尝试从环境变量中获取（小写）
-    env_value_lower = os.getenv(var_name.lower())
-    if env_value_lower is not None:
-        return env_value_lower
+    # 尝试从环境变量中获取（小写、大写）
+    for name in (var_name.lower(), var_name.upper()):
+        env_value = os.getenv(name)
+        if env_value is not None:
+            return env_value
 
     # 返回默认值（如果提供）
     if default is not None:
@@ -95,12 +95,16 @@ def load_config(encoding: str = "utf-8"):
     config_path = os.getenv("YML", os.path.join(os.getcwd(), "config.yml"))
     try:
         with open(config_path, 'r',encoding = encoding) as file:
-            config = yaml.safe_load(file)
-            config.update({k.lower(): v for k, v in os.environ.items()})
-            # 创建一个临时上下文用于解析
-            temp_ctx = copy.deepcopy(config)
-            config = resolve_value(temp_ctx, temp_ctx)
-            return Namespace(**config)
+            # 有 libyaml 时使用 C 实现的解析器
+            config = yaml.load(file, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
+        # 环境变量只覆盖配置文件中已有的顶层标量（如 TRANSPORT），不再把整个环境合并进配置
+        for key, value in config.items():
+            if not isinstance(value, (dict, list)):
+                env_value = os.getenv(key.upper(), os.getenv(key))
+                if env_value is not None:
+                    config[key] = env_value
+        # resolve_value 返回新的字典和列表，只有包含 ${...} 的字符串才需要解析，原配置作为解析上下文即可
+        return Namespace(**resolve_value(config, config))
     except FileNotFoundError:
         logger.error(f"Configuration file {config_path} not found.")
         raise
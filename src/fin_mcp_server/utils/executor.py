@@ -0,0 +1,88 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import weakref
+
+logger = logging.getLogger("fin_mcp_server")
+
+DEFAULT_EXECUTOR_CONFIG = {
+    "io_workers": 16,    # 网络/磁盘 I/O 线程数
+    "io_queue": 64,      # I/O 任务最大排队数
+    "cpu_workers": min(4, os.cpu_count() or 1),  # 指标计算、绘图进程数，0 表示使用 I/O 线程池
+    "cpu_queue": 16,     # CPU 任务最大排队数
+}
+
+
+class ExecutorBusyError(RuntimeError):
+    """执行池排队已满，拒绝新任务"""
+
+
+class BoundedExecutor:
+    """
+    为阻塞任务提供并发上限和排队深度限制的执行池包装
+
+    最多 max_concurrency 个任务同时运行，超出的任务排队等待；排队数超过 max_queue 时
+    直接抛出 ExecutorBusyError，避免请求无限堆积。
+
+    asyncio.Semaphore 只能在创建它的事件循环中使用，这里为每个运行中的事件循环各建一个，
+    基准测试、预热或命令行在新的事件循环中调用工具时不会报错；事件循环关闭后对应的信号量随之释放。
+    """
+
+    def __init__(self, name: str, executor: Executor, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.executor = executor
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, fn, *args, **kwargs):
+        """在执行池中运行 fn(*args, **kwargs) 并等待结果"""
+        if self._pending >= self.max_concurrency + self.max_queue:
+            raise ExecutorBusyError(f"{self.name} executor is busy, {self._pending} tasks pending")
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        self._pending += 1
+        try:
+            async with semaphore:
+                return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._pending -= 1
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+
+def create_executors(config: dict = None, initializer=None):
+    """
+    按配置创建 (io, cpu) 两个执行池：I/O 使用线程池，CPU 密集的指标计算与绘图使用进程池
+
+    进程池使用 spawn 启动方式，避免在带线程的事件循环进程中 fork 导致 matplotlib 等状态不一致。
+
+    Args:
+        initializer: 进程池中每个工作进程启动时执行的函数
+    """
+    executor_config = dict(DEFAULT_EXECUTOR_CONFIG)
+    if config:
+        executor_config.update(config)
+    io_workers = int(executor_config["io_workers"])
+    io_executor = BoundedExecutor("io", ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="fin-io"),
+                                  io_workers, executor_config["io_queue"])
+    cpu_workers = int(executor_config["cpu_workers"])
+    if cpu_workers > 0:
+        pool = ProcessPoolExecutor(max_workers=cpu_workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=initializer)
+        cpu_executor = BoundedExecutor("cpu", pool, cpu_workers, executor_config["cpu_queue"])
+    else:
+        cpu_executor = BoundedExecutor("cpu", io_executor.executor, io_workers, executor_config["cpu_queue"])
+    logger.info(f"Executors ready: io_workers={io_workers}, cpu_workers={cpu_workers}")
+    return io_executor, cpu_executor
@@ -0,0 +1,92 @@
+"""
+多个服务进程共享 data_dir 时使用的文件工具：原子写入与跨进程文件锁
+"""
+from contextlib import contextmanager
+import hashlib
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows 等非 POSIX 平台
+    fcntl = None
+
+# 锁文件按 key 的哈希分片，数量固定，不需要清理
+LOCK_STRIPES = 256
+_thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+@contextmanager
+def atomic_path(path: str):
+    """
+    返回同目录下的临时文件路径，代码块正常结束后用 os.replace 原子地替换 path
+
+    读取方只会看到完整的旧文件或新文件；出错时删除临时文件，path 保持不变。
+    临时文件以 . 开头，不会被 kline-*.png 等通配符匹配到。
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = "w", encoding: str = None):
+    """以原子替换的方式写入文件，用法同 open"""
+    if "b" not in mode and encoding is None:
+        encoding = "utf-8"
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, mode, encoding=encoding) as file:
+            yield file
+
+
+@contextmanager
+def file_lock(key: str, lock_dir: str):
+    """
+    跨进程的互斥锁，同一个 key 同时只有一个进程（线程）进入
+
+    使用 flock，进程退出时由内核自动释放；非 POSIX 平台只在进程内互斥。
+    """
+    stripe = int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:8], 16) % LOCK_STRIPES
+    if fcntl is None:
+        with _thread_locks[stripe]:
+            yield
+        return
+    os.makedirs(lock_dir, exist_ok=True)
+    # 每次单独打开锁文件，flock 对同一进程内的不同线程同样互斥
+    with open(os.path.join(lock_dir, f"{stripe:03d}.lock"), "a+b") as file:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def try_file_lock(key: str, lock_dir: str):
+    """非阻塞地获取跨进程锁，yield 是否获取成功；用于只需要一个进程执行的任务"""
+    if fcntl is None:
+        yield True
+        return
+    os.makedirs(lock_dir, exist_ok=True)
+    name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    with open(os.path.join(lock_dir, f"{name}.lock"), "a+b") as file:
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,78 @@
+import base64
+import io
+import json
+import numpy as np
+import pandas as pd
+
+OUTPUT_FORMATS = ("markdown", "csv", "json", "arrow")
+
+
+def select_frame(data: pd.DataFrame, columns: list = None, tail: int = None, limit: int = None) -> pd.DataFrame:
+    """
+    在序列化之前裁剪数据：先按列筛选，再取最后 tail 行，最后最多保留 limit 行
+
+    Raises:
+        ValueError: 列不存在，或 tail、limit 为负数
+    """
+    for name, value in (("tail", tail), ("limit", limit)):
+        if value is not None and int(value) < 0:
+            raise ValueError(f"{name} must be non-negative, got {value}")
+    if columns:
+        missing = [col for col in columns if col not in data.columns]
+        if missing:
+            raise ValueError(f"Unknown columns: {missing}, available: {list(data.columns)}")
+        data = data[list(columns)]
+    if tail is not None:
+        data = data.tail(int(tail))
+    if limit is not None:
+        data = data.head(int(limit))
+    return data
+
+
+def widen_float32(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    文本输出前把 float32 列转换为 float64，取 float32 的最短十进制表示（如 86.37 而不是 86.37000274658203）
+    """
+    columns = {col: data[col].to_numpy().astype(str).astype("float64") for col in data.columns
+               if data[col].dtype == np.float32}
+    return data.assign(**columns) if columns else data
+
+
+def _index_labels(index: pd.Index) -> list:
+    if isinstance(index, pd.DatetimeIndex):
+        # 日线数据只保留日期部分
+        if (index.normalize() == index).all():
+            return index.strftime("%Y-%m-%d").tolist()
+        return [ts.isoformat() for ts in index]
+    return [str(label) for label in index]
+
+
+def format_frame(data: pd.DataFrame, output_format: str = "markdown", decimals: int = None) -> str:
+    """
+    将 DataFrame 序列化为指定格式的文本
+
+    Args:
+        output_format: markdown、csv、json（列式数组）或 arrow（Arrow IPC 流的 base64）
+        decimals: 浮点数保留的小数位数
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}, expected one of {OUTPUT_FORMATS}")
+    if output_format != "arrow":
+        # arrow 保留 float32 列，文本格式使用最短的十进制表示
+        data = widen_float32(data)
+    if decimals is not None:
+        data = data.round(int(decimals))
+    if output_format == "markdown":
+        return data.to_markdown()
+    if output_format == "csv":
+        return data.to_csv()
+    if output_format == "json":
+        columns = {str(col): data[col].astype(object).where(data[col].notna(), None).tolist() for col in data.columns}
+        payload = {"index": _index_labels(data.index), "columns": columns}
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+    import pyarrow as pa
+    table = pa.Table.from_pandas(data, preserve_index=True)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return base64.b64encode(sink.getvalue()).decode("ascii")
@@ -0,0 +1,212 @@
+import logging
+import random
+import re
+import threading
+import time
+
+from .metrics import FETCHED_BYTES
+
+logger = logging.getLogger("fin_mcp_server")
+
+DEFAULT_YAHOO_CONFIG = {
+    "rate": 2.0,          # 每秒允许的请求数（令牌补充速率）
+    "burst": 5,           # 令牌桶容量，允许的瞬时突发请求数
+    "max_retries": 4,     # 429/5xx 的最大重试次数
+    "backoff_base": 1.0,  # 指数退避的初始等待秒数
+    "backoff_max": 30.0,  # 单次退避的最大等待秒数
+    "impersonate": "chrome",  # curl_cffi 模拟的浏览器指纹
+}
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_STATUS_PATTERN = re.compile(r"\b(429|5\d\d)\b|Too Many Requests|Rate limit", re.IGNORECASE)
+
+
+class RetryableHTTPError(Exception):
+    """可重试的 HTTP 错误（429 或 5xx）"""
+
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message or f"HTTP {status}")
+        self.status = status
+
+
+class RateLimiter:
+    """线程安全的令牌桶限流器，所有工具共享同一个实例"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry_status(error: Exception):
+    """判断异常是否为可重试的 429/5xx，是则返回状态码，否则返回 None"""
+    if isinstance(error, RetryableHTTPError):
+        return error.status
+    if type(error).__name__ == "YFRateLimitError":
+        return 429
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status_code", None)
+    if status in RETRYABLE_STATUS:
+        return status
+    return None
+
+
+class YahooClient:
+    """
+    Yahoo Finance 访问入口：进程内共享一个连接池会话、一个令牌桶限流器，
+    并对 429/5xx 做带抖动的指数退避重试
+    """
+
+    def __init__(self, config: dict = None, session=None):
+        client_config = dict(DEFAULT_YAHOO_CONFIG)
+        if config:
+            client_config.update(config)
+        self.config = client_config
+        self.limiter = RateLimiter(client_config["rate"], client_config["burst"])
+        self.max_retries = int(client_config["max_retries"])
+        self._session = session
+        self._session_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0}
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                from curl_cffi import requests as curl_requests
+                self._session = curl_requests.Session(impersonate=self.config["impersonate"])
+            return self._session
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间：按指数增长，并在上限的一半到上限之间随机抖动"""
+        cap = min(self.config["backoff_max"], self.config["backoff_base"] * (2 ** attempt))
+        return random.uniform(cap / 2, cap)
+
+    def call(self, fn, *args, **kwargs):
+        """限流后调用 fn，遇到 429/5xx 时退避重试"""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            self.stats["requests"] += 1
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                status = retry_status(e)
+                if status is None or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                self.stats["retries"] += 1
+                logger.warning(f"Yahoo 请求返回 {status}，{delay:.1f}s 后第 {attempt + 1} 次重试")
+                time.sleep(delay)
+                continue
+            # 行情数据按 DataFrame 占用的内存计入获取字节数
+            if hasattr(result, "memory_usage"):
+                FETCHED_BYTES.inc(int(result.memory_usage(deep=True).sum()), kind="frame")
+            return result
+
+    def request(self, method: str, url: str, **kwargs):
+        """通过共享会话发送 HTTP 请求，429/5xx 响应按重试策略处理"""
+        def send():
+            response = self.session.request(method, url, **kwargs)
+            if response.status_code in RETRYABLE_STATUS:
+                raise RetryableHTTPError(response.status_code, f"HTTP {response.status_code} for {url}")
+            FETCHED_BYTES.inc(len(response.content or b""), kind="http")
+            return response
+        return self.call(send)
+
+    def ticker(self, symbol: str):
+        import yfinance as yf
+        return yf.Ticker(symbol, session=self.session)
+
+    def ticker_attr(self, symbol: str, attr: str, *args, **kwargs):
+        """读取 Ticker 的属性或调用其方法（如 info、quarterly_balance_sheet、history）"""
+        def fetch():
+            value = getattr(self.ticker(symbol), attr)
+            return value(*args, **kwargs) if callable(value) else value
+        return self.call(fetch)
+
+    def download(self, tickers, **kwargs):
+        """
+        yf.download 会吞掉单只股票的异常：旧版本记录在 yfinance.shared._ERRORS 中，1.x 只写入 yfinance 日志；
+        这里收集两处的错误信息，若全部失败且为 429/5xx 则抛出可重试错误。
+        两处都是进程内共享的，并发下载时只保留与本次股票代码相关的错误，网络请求期间不持有任何锁。
+        """
+        import yfinance as yf
+        import yfinance.shared as yf_shared
+
+        names = re.split(r"[\s,]+", tickers.strip()) if isinstance(tickers, str) else [str(t) for t in tickers]
+        wanted = {name.upper() for name in names}
+
+        def fetch():
+            collector = _LogCollector(names)
+            yf_logger = logging.getLogger("yfinance")
+            yf_logger.addHandler(collector)
+            try:
+                data = yf.download(tickers, session=self.session, progress=False, **kwargs)
+            finally:
+                yf_logger.removeHandler(collector)
+            shared_errors = dict(getattr(yf_shared, "_ERRORS", {}) or {})
+            errors = [str(v) for k, v in shared_errors.items() if str(k).upper() in wanted]
+            errors += collector.messages
+            if (data is None or data.empty) and errors:
+                match = _STATUS_PATTERN.search(" ".join(errors))
+                if match:
+                    status = int(match.group(1)) if match.group(1) else 429
+                    raise RetryableHTTPError(status, f"yf.download failed: {errors}")
+            return data
+        return self.call(fetch)
+
+
+class _LogCollector(logging.Handler):
+    """收集提到指定股票代码的 ERROR 级别日志消息，并发下载时各自只收集自己的错误"""
+
+    def __init__(self, names):
+        super().__init__(logging.ERROR)
+        self.names = list(names)
+        self.messages = []
+
+    def emit(self, record):
+        # 日志中的错误以 "['AAPL']: ..." 的形式列出代码
+        message = record.getMessage()
+        if any(name in message for name in self.names):
+            self.messages.append(message)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def configure_yahoo_client(config: dict = None, session=None) -> YahooClient:
+    """按配置创建进程内共享的 YahooClient"""
+    global _client
+    with _client_lock:
+        _client = YahooClient(config, session)
+        return _client
+
+
+def get_yahoo_client() -> YahooClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = YahooClient()
+        return _client
+
+
+def set_yahoo_client(client: YahooClient) -> YahooClient:
+    """替换进程内共享的 YahooClient，用于基准测试等离线场景"""
+    global _client
+    with _client_lock:
+        _client = client
+        return _client
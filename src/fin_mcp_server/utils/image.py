@@ -1,5 +1,25 @@
 import base64
+import hashlib
+import io
+import json
+import logging
+import math
 import os
+
+from .fileio import atomic_open
+
+logger = logging.getLogger("fin_mcp_server")
+
+# 多模态模型的图片预算：Qwen2.5-VL 默认按 28x28 像素切分视觉 token，约 100 万像素以上不会提升识别效果
+DEFAULT_IMAGE_BUDGET = {
+    "max_pixels": 1280 * 28 * 28,  # 最大像素数，超出时等比缩小
+    "max_bytes": 512 * 1024,       # 编码后最大字节数，超出时降低质量或继续缩小
+    "format": "webp",              # 输出格式：webp、jpeg 或 png
+    "quality": 85,                 # 有损格式的初始质量
+}
+MIN_QUALITY = 40
+
+
 def encode_image_to_base64(image_path):
     """
     将本地图片文件转换为base64编码
@@ -34,4 +54,85 @@ def encode_image_to_base64(image_path):
         return f"data:image/{image_format};base64,{encoded_image}"
     except Exception as e:
         print(f"图片编码错误: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def _encode(image, image_format: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if image_format == "png":
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        image.save(buffer, format=image_format.upper(), quality=quality)
+    return buffer.getvalue()
+
+
+def encode_image_for_llm(image_path: str, budget: dict = None):
+    """
+    按像素和字节预算压缩图片后编码为 base64 data URL，编码结果缓存在图片旁边
+
+    先按 max_pixels 等比缩小，再以 format/quality 编码；超过 max_bytes 时逐步降低质量，仍超出则继续缩小。
+
+    Args:
+        image_path (str): 图片文件路径
+        budget (dict): 图片预算，默认 DEFAULT_IMAGE_BUDGET
+
+    Returns:
+        (data_url, stats)：stats 包含压缩前后的字节数与尺寸；失败时返回 (None, None)
+    """
+    from PIL import Image
+
+    image_budget = dict(DEFAULT_IMAGE_BUDGET)
+    if budget:
+        image_budget.update(budget)
+    image_format = image_budget["format"].lower().replace("jpg", "jpeg")
+    try:
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"图片文件不存在: {image_path}")
+        digest = hashlib.sha1(json.dumps(image_budget, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+        cache_path = f"{image_path}.{digest}.b64"
+        stats_path = f"{cache_path}.json"
+        if os.path.exists(cache_path) and os.path.exists(stats_path) \
+                and os.path.getmtime(cache_path) >= os.path.getmtime(image_path):
+            with open(cache_path, "r", encoding="utf-8") as file:
+                data_url = file.read()
+            with open(stats_path, "r", encoding="utf-8") as file:
+                stats = json.load(file)
+            return data_url, {**stats, "cached": True}
+
+        with Image.open(image_path) as original:
+            original_size = original.size
+            image = original.convert("RGB")
+        scale = math.sqrt(image_budget["max_pixels"] / (image.width * image.height))
+        if scale < 1:
+            image = image.resize((int(image.width * scale), int(image.height * scale)), Image.LANCZOS)
+        quality = int(image_budget["quality"])
+        payload = _encode(image, image_format, quality)
+        while len(payload) > image_budget["max_bytes"]:
+            if image_format != "png" and quality > MIN_QUALITY:
+                quality = max(MIN_QUALITY, quality - 15)
+            else:
+                image = image.resize((int(image.width * 0.8), int(image.height * 0.8)), Image.LANCZOS)
+            payload = _encode(image, image_format, quality)
+
+        data_url = f"data:image/{image_format};base64,{base64.b64encode(payload).decode('utf-8')}"
+        stats = {
+            "original_bytes": os.path.getsize(image_path),
+            "original_size": list(original_size),
+            "encoded_bytes": len(payload),
+            "encoded_size": [image.width, image.height],
+            "base64_bytes": len(data_url),
+            "format": image_format,
+            "quality": quality,
+        }
+        # 先写 stats 再写编码结果，读取方以两者都存在作为命中条件
+        with atomic_open(stats_path) as file:
+            json.dump(stats, file)
+        with atomic_open(cache_path) as file:
+            file.write(data_url)
+        logger.info(f"图片编码 {os.path.basename(image_path)}: {stats['original_bytes'] // 1024}KB "
+                    f"{original_size[0]}x{original_size[1]} -> {len(payload) // 1024}KB "
+                    f"{image.width}x{image.height} {image_format}")
+        return data_url, {**stats, "cached": False}
+    except Exception as e:
+        logger.error(f"图片编码错误: {e}")
+        return None, None
@@ -1,5 +1,3 @@
-from openai import AsyncOpenAI
-
 class LLMClient:
     def __init__(self, model: str) -> None:
         self.model: str = model
@@ -11,7 +9,17 @@ class LLMClient:
 class OpenAIClient(LLMClient):
     def __init__(self, base_url:str, api_key: str, model:str) -> None:
         super().__init__(model)
-        self.client = AsyncOpenAI(base_url=base_url, api_key=api_key)
+        self.base_url = base_url
+        self.api_key = api_key
+        self._client = None
+
+    @property
+    def client(self):
+        # openai 导入较慢，首次调用模型时才创建客户端，不拖慢服务启动
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(base_url=self.base_url, api_key=self.api_key)
+        return self._client
 
     
     async def chat_completions(self, message, temperature: float = None, **kwargs):
@@ -27,6 +35,39 @@ class OpenAIClient(LLMClient):
         except Exception as e:
             print(f"OpenAI API 调用错误: {e}")
             raise
+
+    async def chat_completions_stream(self, message, on_delta=None, temperature: float = None, **kwargs):
+        """
+        流式调用模型，每收到一段文本就调用 await on_delta(text)
+
+        Returns:
+            (完整文本, usage)，服务端不返回 usage 时为 None
+        """
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                stream=True,
+                stream_options={"include_usage": True},
+                messages=message,
+                temperature=temperature,
+                **kwargs
+            )
+            parts = []
+            usage = None
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if text:
+                    parts.append(text)
+                    if on_delta is not None:
+                        await on_delta(text)
+            return "".join(parts), usage
+        except Exception as e:
+            print(f"OpenAI API 调用错误: {e}")
+            raise
 def create_llm_client(config:dict):
     return OpenAIClient(config.get("base_url"),config.get("api_key"), config.get("model"))
 
@@ -0,0 +1,254 @@
+from contextlib import contextmanager
+import bisect
+import logging
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger("fin_mcp_server")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = (16e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6)
+MEMORY_BUCKETS = (1e6, 4e6, 16e6, 64e6, 128e6, 256e6, 512e6, 1e9, 2e9)
+
+
+def _format_labels(names, values, extra: dict = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = [f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs]
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': bound})} {cumulative}")
+                cumulative += counts[-1]
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """取值由回调函数在导出时计算的 gauge"""
+
+    def __init__(self, name: str, documentation: str, value_fn):
+        self.name = name
+        self.documentation = documentation
+        self.value_fn = value_fn
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            lines.append(f"{self.name} {float(self.value_fn())}")
+        except Exception as e:
+            logger.warning(f"采集指标 {self.name} 失败: {e}")
+        return lines
+
+
+class Registry:
+    """进程内指标注册表，按 Prometheus 文本格式输出"""
+
+    def __init__(self):
+        self.metrics = []
+        self.stats_sources = []
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, value_fn) -> Gauge:
+        metric = Gauge(name, documentation, value_fn)
+        self.metrics.append(metric)
+        return metric
+
+    def register_stats(self, name: str, documentation: str, labels: dict, stats_fn):
+        """
+        把已有组件的 stats 计数字典（如缓存的 hits/misses）作为 counter 导出
+
+        Args:
+            labels: 该数据源的固定标签，如 {"cache": "report"}
+            stats_fn: 无参数函数，返回 {event: count}
+        """
+        self.stats_sources.append((name, documentation, dict(labels), stats_fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        described = set()
+        # 同名指标的样本必须连续输出
+        for name, documentation, labels, stats_fn in sorted(self.stats_sources, key=lambda source: source[0]):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} counter")
+            try:
+                stats = dict(stats_fn() or {})
+            except Exception as e:
+                logger.warning(f"采集指标 {name} 失败: {e}")
+                continue
+            for event, value in sorted(stats.items()):
+                sample_labels = {**labels, "event": event}
+                lines.append(f"{name}{_format_labels(sample_labels.keys(), sample_labels.values())} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("fin_stage_duration_seconds", "Duration of each pipeline stage", ("stage",))
+FETCHED_BYTES = REGISTRY.counter("fin_fetched_bytes_total", "Bytes fetched from Yahoo (frame memory size or HTTP body size)",
+                                 ("kind",))
+IMAGE_BYTES = REGISTRY.histogram("fin_image_bytes", "Chart image size before and after encoding for the LLM",
+                                 ("kind",), BYTES_BUCKETS)
+PEAK_MEMORY = REGISTRY.histogram("fin_stage_peak_memory_bytes",
+                                 "Peak traced Python/numpy memory during each stage (requires memory tracing)",
+                                 ("stage",), MEMORY_BUCKETS)
+LLM_TOKENS = REGISTRY.counter("fin_llm_tokens_total", "LLM token usage", ("model", "mode", "type"))
+REPORT_SECONDS = REGISTRY.histogram("fin_report_generation_seconds", "Report generation time (cache misses) by mode",
+                                    ("mode",))
+
+_collecting = threading.local()
+
+
+class _MemoryTracker:
+    """
+    基于 tracemalloc 的阶段峰值内存
+
+    tracemalloc 只有一个全局峰值，每当有阶段开始或结束时，把上次重置以来的峰值计入所有进行中的阶段再重置，
+    嵌套阶段互不干扰。主进程中并发请求的内存会相互计入，峰值为上界；进程池中每个任务独占进程，结果是准确的。
+    """
+
+    def __init__(self):
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def _fold(self):
+        _, peak = tracemalloc.get_traced_memory()
+        for token, (baseline, seen) in self._active.items():
+            self._active[token] = (baseline, max(seen, peak))
+        tracemalloc.reset_peak()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            return None
+        token = object()
+        with self._lock:
+            self._fold()
+            current, _ = tracemalloc.get_traced_memory()
+            self._active[token] = (current, current)
+        return token
+
+    def stop(self, token):
+        """返回阶段内相对开始时增加的峰值字节数"""
+        if token is None or not tracemalloc.is_tracing():
+            return None
+        with self._lock:
+            self._fold()
+            baseline, seen = self._active.pop(token)
+        return max(0, seen - baseline)
+
+
+_memory = _MemoryTracker()
+
+
+def start_memory_tracing():
+    """开启 tracemalloc，之后的 span 同时记录峰值内存；也用作进程池的 initializer"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+@contextmanager
+def span(stage: str):
+    """记录一个阶段的耗时（开启内存跟踪时还有峰值内存）；在 collect_spans 中时只收集，由调用方在主进程中记录"""
+    token = _memory.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = _memory.stop(token)
+        collected = getattr(_collecting, "spans", None)
+        if collected is not None:
+            collected.append((stage, elapsed, peak))
+        else:
+            record_spans([(stage, elapsed, peak)])
+        if peak is None:
+            logger.debug(f"stage={stage} seconds={elapsed:.4f}")
+        else:
+            logger.debug(f"stage={stage} seconds={elapsed:.4f} peak_bytes={peak}")
+
+
+@contextmanager
+def collect_spans():
+    """收集代码块内的 span 而不记录，用于把工作进程中的耗时带回主进程"""
+    _collecting.spans = []
+    try:
+        yield _collecting.spans
+    finally:
+        _collecting.spans = None
+
+
+def record_spans(spans):
+    for stage, elapsed, peak in spans:
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if peak is not None:
+            PEAK_MEMORY.observe(peak, stage=stage)
+
+
+def record_llm_usage(model: str, usage, mode: str = "vision"):
+    """记录模型返回的 usage（prompt/completion/total tokens），mode 为报告模式"""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = getattr(usage, kind, None)
+        if value:
+            LLM_TOKENS.inc(value, model=model, mode=mode, type=kind)
@@ -1,14 +1,73 @@
+import matplotlib
+matplotlib.use("Agg")  # 无界面后端，可在工作进程中渲染
 import mplfinance as mpf
 from matplotlib import pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.figure import Figure
 from matplotlib.legend import Legend
+from matplotlib.ticker import FuncFormatter, MaxNLocator
+import functools
+import numpy as np
 import pandas as pd
 import os 
+import threading
 from datetime import datetime
-def plot_kline(df: pd.DataFrame, cur:pd.DataFrame, path:str, symbol:str):
+
+from .fileio import atomic_path
+
+# 渲染预设：llm 用于多模态模型输入，human 用于人工查看
+RENDER_PRESETS = {
+    "llm": {"figsize": (12, 14), "dpi": 100},
+    "human": {"figsize": (15, 18), "dpi": 300},
+}
+UP_COLOR = '#00FF00'
+DOWN_COLOR = '#FF0000'
+VOLUME_COLOR = '#1F77B4'
+PANEL_RATIOS = (4, 1, 1, 1, 1, 1, 1)
+
+
+@functools.lru_cache(maxsize=None)
+def _kline_style():
+    """专业级K线样式，每个进程只创建一次"""
+    mc = mpf.make_marketcolors(
+        up=UP_COLOR,  # 阳线颜色
+        down=DOWN_COLOR, # 阴线颜色
+        edge='black',   # K线边框
+        wick={'up':'green','down':'red'}, # 影线颜色
+        volume=VOLUME_COLOR # 成交量颜色
+    )
+    return mpf.make_mpf_style(
+        base_mpf_style='yahoo',
+        rc={
+            'font.size': 10,
+            'axes.labelsize': 11,
+            'axes.titlesize': 14,
+        },
+        marketcolors=mc,
+        gridstyle=':',      # 网格样式
+        y_on_right=False,    # Y轴位置
+        # figure_facecolor='#FFFFFF',  # 图表背景色
+        gridaxis='horizontal'  # 只显示水平网格线
+    )
+
+
+def plot_kline(df: pd.DataFrame, cur:pd.DataFrame, path:str, symbol:str, image_name:str = None,
+               preset:str = "human", fast:bool = False):
+    """
+    绘制带技术指标的K线图
+
+    Args:
+        preset: 渲染预设，llm 或 human，决定图片尺寸和 DPI
+        fast: 使用可复用的图表模板渲染，只更新数据而不重建图表
+    """
     os.makedirs(path, exist_ok=True)
+    render_preset = RENDER_PRESETS[preset]
+    if fast:
+        return plot_kline_fast(df, cur, path, symbol, image_name, preset)
     
     try:
-        df = df.copy().set_index('Date')
+        df = df.set_index('Date')  # set_index 返回新的 DataFrame，无需先复制
         df.index = pd.to_datetime(df.index, format='%Y-%m-%d')
     except Exception as e:
         print(f"日期格式转换错误: {e}")
@@ -27,27 +86,7 @@ def plot_kline(df: pd.DataFrame, cur:pd.DataFrame, path:str, symbol:str):
             save_date = str(current_date)[:10]  # 取前10个字符作为日期
     except Exception:
         save_date = "unknown"
-    # 创建专业级K线配置
-    mc = mpf.make_marketcolors(
-        up='#00FF00',  # 阳线颜色
-        down='#FF0000', # 阴线颜色
-        edge='black',   # K线边框
-        wick={'up':'green','down':'red'}, # 影线颜色
-        volume='#1F77B4' # 成交量颜色
-    )
-    style = mpf.make_mpf_style(
-        base_mpf_style='yahoo',
-        rc={
-            'font.size': 10,
-            'axes.labelsize': 11,
-            'axes.titlesize': 14,
-        },
-        marketcolors=mc,
-        gridstyle=':',      # 网格样式
-        y_on_right=False,    # Y轴位置
-        # figure_facecolor='#FFFFFF',  # 图表背景色
-        gridaxis='horizontal'  # 只显示水平网格线
-    )
+    style = _kline_style()
     # 添加技术指标
     apds = [
         mpf.make_addplot(df['EMA5'], color='orange', width=1.5, label='EMA5'),
@@ -84,7 +123,8 @@ def plot_kline(df: pd.DataFrame, cur:pd.DataFrame, path:str, symbol:str):
         # 添加一些边距
         price_range = max_price - min_price
         margin = price_range * 0.05  # 5%的边距
-        ylim = (min_price - margin, max_price + margin)
+        # mplfinance 只接受 Python float/int，float32 数据的 numpy 标量会被 ylim 校验拒绝
+        ylim = (float(min_price - margin), float(max_price + margin))
     else:
         ylim = None
     current_time = datetime.now().strftime('%Y-%m-%d %H:%M')
@@ -113,7 +153,7 @@ def plot_kline(df: pd.DataFrame, cur:pd.DataFrame, path:str, symbol:str):
              },
              ylabel='Price',
              ylabel_lower='Volume',
-             figsize=(15, 18),
+             figsize=render_preset["figsize"],
              figratio=(12, 6),
              figscale=1.5,
              panel_ratios=(4, 1, 1, 1,1, 1, 1),
@@ -186,7 +226,181 @@ def plot_kline(df: pd.DataFrame, cur:pd.DataFrame, path:str, symbol:str):
             borderaxespad=0.5)
     ax.add_artist(leg)
     
-    save_path = f"{path}/kline-{symbol}-{save_date}.png"
-    plt.savefig(save_path,dpi=300, bbox_inches='tight')
-    plt.close()
-    return save_path,f"kline-{symbol}-{save_date}.png"
\ No newline at end of file
+    if image_name is None:
+        image_name = f"kline-{symbol}-{save_date}.png"
+    save_path = f"{path}/{image_name}"
+    with atomic_path(save_path) as tmp_path:
+        fig.savefig(tmp_path, format="png", dpi=render_preset["dpi"], bbox_inches='tight')
+    plt.close(fig)
+    return save_path, image_name
+
+# 快速渲染：(面板, 列名, 颜色, 线型, 透明度)，与经典模式的 addplot 保持一致
+FAST_LINES = [
+    (0, 'EMA5', 'orange', '-', 1.0),
+    (0, 'EMA20', 'blue', '-', 1.0),
+    (0, 'UpperBB', 'grey', '--', 1.0),
+    (0, 'LowerBB', 'grey', '--', 1.0),
+    (2, 'MACD', '#1f77b4', '-', 1.0),
+    (2, 'MACD_SIGNAL', '#ff7f0e', '-', 1.0),
+    (3, 'K', '#1f77b4', '-', 1.0),
+    (3, 'D', '#ff7f0e', '-', 1.0),
+    (3, 'J', '#4dbeee', '-', 0.5),
+    (4, 'RSI', '#2ca02c', '-', 1.0),
+    (5, 'OBV', '#9467bd', '-', 1.0),
+    (5, 'OBV_SMA', '#ff7f0e', '-', 1.0),
+    (6, 'CCI', 'gold', '-', 1.0),
+]
+FAST_YLABELS = ['Price', 'Volume', 'MACD', 'KDJ', 'RSI', 'OBV', 'CCI']
+
+
+class FastChartTemplate:
+    """
+    可复用的K线图模板
+
+    图表、面板布局、线条、图例只在首次使用时创建，之后每次渲染只替换数据、坐标范围和标题。
+    直接使用 Figure + Agg 画布，不依赖 pyplot 全局状态；同一模板的渲染通过锁串行化。
+    """
+
+    def __init__(self, figsize):
+        self.lock = threading.Lock()
+        self.dates = []
+        with plt.style.context(_kline_style()['base_mpl_style']):
+            self.fig = Figure(figsize=figsize)
+            FigureCanvasAgg(self.fig)
+            grid = self.fig.add_gridspec(len(PANEL_RATIOS), 1, height_ratios=PANEL_RATIOS, hspace=0.08)
+            self.axes = [self.fig.add_subplot(grid[0])]
+            self.axes += [self.fig.add_subplot(grid[i], sharex=self.axes[0]) for i in range(1, len(PANEL_RATIOS))]
+        for ax, ylabel in zip(self.axes, FAST_YLABELS):
+            ax.set_ylabel(ylabel)
+            ax.grid(axis='y', linestyle=':')
+            ax.tick_params(labelbottom=False)
+        bottom = self.axes[-1]
+        bottom.tick_params(labelbottom=True, labelrotation=45)
+        bottom.xaxis.set_major_locator(MaxNLocator(nbins=12, integer=True))
+        bottom.xaxis.set_major_formatter(FuncFormatter(self._format_date))
+
+        price_ax, volume_ax, macd_ax, _, rsi_ax = self.axes[:5]
+        self.wicks = LineCollection([], linewidths=0.8)
+        self.bodies = PolyCollection([], edgecolors='black', linewidths=0.8)
+        self.volume = PolyCollection([], facecolors=VOLUME_COLOR)
+        self.macd_hist = PolyCollection([], facecolors='#4dbeee', alpha=0.5, label='MACD_HIST')
+        price_ax.add_collection(self.wicks)
+        price_ax.add_collection(self.bodies)
+        volume_ax.add_collection(self.volume)
+        macd_ax.add_collection(self.macd_hist)
+        self.lines = {}
+        for panel, column, color, linestyle, alpha in FAST_LINES:
+            self.lines[column] = self.axes[panel].plot([], [], color=color, linestyle=linestyle, alpha=alpha,
+                                                       linewidth=1.5 if panel == 0 else 1.0, label=column)[0]
+        self.current = price_ax.plot([], [], marker='v', color='gold', markersize=10, markeredgecolor='black',
+                                     linestyle='none', zorder=5, label='Current Point')[0]
+        self.annotation = price_ax.annotate("", xy=(0, 0), xytext=(0, 0),
+                                            arrowprops=dict(arrowstyle="->", color='gold', lw=1.2),
+                                            bbox=dict(pad=0.2, facecolor='gold', alpha=0.9, edgecolor='#2C3E50'),
+                                            fontsize=9, ha='center')
+        self.vlines = [ax.axvline(0, color='#FF6B6B', linestyle='--', alpha=0.5, linewidth=1.5, zorder=3)
+                       for ax in self.axes]
+        rsi_ax.axhline(70, color='#E74C3C', linestyle='--', linewidth=1, alpha=0.7)
+        rsi_ax.axhline(30, color='#2ECC71', linestyle='--', linewidth=1, alpha=0.7)
+        rsi_ax.text(0.02, 0.8, 'Overbought (70)', transform=rsi_ax.transAxes, color='#E74C3C', fontsize=9,
+                    verticalalignment='top')
+        rsi_ax.text(0.02, 0.2, 'Oversold (30)', transform=rsi_ax.transAxes, color='#2ECC71', fontsize=9,
+                    verticalalignment='bottom')
+        rsi_ax.set_ylim(0, 100)
+        for ax in (price_ax, macd_ax, self.axes[3], self.axes[5], self.axes[6]):
+            ax.legend(loc='upper left', frameon=True, framealpha=0.9, fontsize=8)
+        self.title = self.fig.suptitle("", va='top', y=0.995)
+        self.fig.subplots_adjust(left=0.06, right=0.94, top=0.95, bottom=0.05)
+
+    def _format_date(self, x, pos=None):
+        index = int(round(x))
+        return self.dates[index] if 0 <= index < len(self.dates) else ""
+
+    @staticmethod
+    def _ylim(ax, *arrays):
+        values = np.concatenate([np.asarray(a, dtype=float) for a in arrays])
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+        low, high = values.min(), values.max()
+        margin = (high - low) * 0.05 or abs(high) * 0.05 or 1.0
+        ax.set_ylim(low - margin, high + margin)
+
+    def render(self, df: pd.DataFrame, title: str, save_path: str, dpi: int):
+        x = np.arange(len(df))
+        o, h, l, c = (df[col].to_numpy(dtype=float) for col in ('Open', 'High', 'Low', 'Close'))
+        up = c >= o
+        half = 0.4
+        with self.lock:
+            # 日内K线的刻度需要显示时间
+            date_format = '%Y-%m-%d' if (df.index == df.index.normalize()).all() else '%m-%d %H:%M'
+            self.dates = [d.strftime(date_format) for d in df.index]
+            self.wicks.set_segments(np.stack([np.column_stack([x, l]), np.column_stack([x, h])], axis=1))
+            self.wicks.set_colors(np.where(up, 'green', 'red'))
+            self.bodies.set_verts(self._bars(x, o, c, half))
+            self.bodies.set_facecolors(np.where(up, UP_COLOR, DOWN_COLOR))
+            self.volume.set_verts(self._bars(x, np.zeros_like(x, dtype=float), df['Volume'].to_numpy(dtype=float), half))
+            self.macd_hist.set_verts(self._bars(x, np.zeros_like(x, dtype=float), df['MACD_HIST'].to_numpy(dtype=float), half))
+            for column, line in self.lines.items():
+                line.set_data(x, df[column].to_numpy(dtype=float))
+
+            last = len(df) - 1
+            self.current.set_data([last], [h[-1] * 1.008])
+            self.annotation.set_text(f"Latest\nO:{o[-1]:.2f}\nH:{h[-1]:.2f}\nL:{l[-1]:.2f}\nC:{c[-1]:.2f}")
+            self.annotation.xy = (last, h[-1] * 1.001)
+            self.annotation.set_position((last - 3, h[-1] * 1.01))
+            for vline in self.vlines:
+                vline.set_xdata([last, last])
+
+            price_ax, volume_ax, macd_ax, kdj_ax, _, obv_ax, cci_ax = self.axes
+            price_ax.set_xlim(-1, len(df))
+            self._ylim(price_ax, l, h, df['UpperBB'], df['LowerBB'], [h[-1] * 1.02])
+            self._ylim(volume_ax, [0], df['Volume'])
+            self._ylim(macd_ax, df['MACD'], df['MACD_SIGNAL'], df['MACD_HIST'])
+            self._ylim(kdj_ax, df['K'], df['D'], df['J'])
+            self._ylim(obv_ax, df['OBV'], df['OBV_SMA'])
+            self._ylim(cci_ax, df['CCI'])
+            self.title.set_text(title)
+            with atomic_path(save_path) as tmp_path:
+                self.fig.savefig(tmp_path, format="png", dpi=dpi)
+
+    @staticmethod
+    def _bars(x, bottom, top, half):
+        return np.stack([
+            np.column_stack([x - half, bottom]), np.column_stack([x - half, top]),
+            np.column_stack([x + half, top]), np.column_stack([x + half, bottom]),
+        ], axis=1)
+
+
+_FAST_TEMPLATES = {}
+_FAST_TEMPLATES_LOCK = threading.Lock()
+
+
+def _fast_template(preset: str) -> FastChartTemplate:
+    with _FAST_TEMPLATES_LOCK:
+        if preset not in _FAST_TEMPLATES:
+            _FAST_TEMPLATES[preset] = FastChartTemplate(RENDER_PRESETS[preset]["figsize"])
+        return _FAST_TEMPLATES[preset]
+
+
+def plot_kline_fast(df: pd.DataFrame, cur, path: str, symbol: str, image_name: str = None, preset: str = "llm"):
+    """使用可复用模板快速渲染K线图，返回 (save_path, image_name)"""
+    os.makedirs(path, exist_ok=True)
+    df = df.set_index('Date')
+    df.index = pd.to_datetime(df.index)
+    save_date = df.index[-1].strftime('%Y-%m-%d')
+    last_bar = save_date if df.index[-1] == df.index[-1].normalize() else df.index[-1].strftime('%Y-%m-%d %H:%M')
+    closes = df['Close'].to_numpy(dtype=float)
+    if len(closes) > 1:
+        price_change = closes[-1] - closes[-2]
+        price_change_pct = price_change / closes[-2] * 100
+        price_info = f"{closes[-1]:.2f} ({price_change:+.2f}, {price_change_pct:+.2f}%)"
+    else:
+        price_info = f"{closes[-1]:.2f}"
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M')
+    title = f'{symbol} -Professional Technical Analysis Chart\n{last_bar} | Close: {price_info} | Updated: {current_time}'
+    if image_name is None:
+        image_name = f"kline-{symbol}-{save_date}.png"
+    save_path = f"{path}/{image_name}"
+    _fast_template(preset).render(df, title, save_path, RENDER_PRESETS[preset]["dpi"])
+    return save_path, image_name
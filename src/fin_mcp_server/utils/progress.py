@@ -0,0 +1,72 @@
+import logging
+import time
+
+logger = logging.getLogger("fin_mcp_server")
+
+
+class ProgressBroadcaster:
+    """
+    把报告生成的阶段进度和模型输出的增量文本，通过 MCP 进度通知转发给所有等待同一份报告的客户端
+
+    增量文本先缓冲，达到 flush_chars 字符或距上次发送超过 flush_interval 秒时再发送，避免通知过于频繁。
+    """
+
+    def __init__(self, total: int = 4, flush_interval: float = 0.3, flush_chars: int = 200):
+        self.total = total
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self._states = {}
+
+    def subscribe(self, key: str, ctx):
+        state = self._states.setdefault(key, {"listeners": [], "progress": 0.0, "buffer": [],
+                                              "buffered": 0, "chunks": 0, "flushed_at": time.monotonic()})
+        if ctx is not None:
+            state["listeners"].append(ctx)
+
+    def unsubscribe(self, key: str, ctx):
+        state = self._states.get(key)
+        if state is None:
+            return
+        if ctx in state["listeners"]:
+            state["listeners"].remove(ctx)
+        if not state["listeners"]:
+            self._states.pop(key, None)
+
+    async def _send(self, key: str, progress: float, message: str):
+        state = self._states.get(key)
+        if state is None:
+            return
+        # MCP 要求进度单调递增
+        state["progress"] = max(state["progress"], progress)
+        for ctx in list(state["listeners"]):
+            try:
+                await ctx.report_progress(state["progress"], self.total, message)
+            except Exception as e:
+                logger.debug(f"发送进度通知失败: {e}")
+
+    async def stage(self, key: str, step: int, message: str):
+        """进入第 step 个阶段（从 0 开始）"""
+        await self.flush(key)
+        await self._send(key, float(step), message)
+
+    async def text(self, key: str, delta: str):
+        """模型输出的增量文本"""
+        state = self._states.get(key)
+        if state is None:
+            return
+        state["buffer"].append(delta)
+        state["buffered"] += len(delta)
+        state["chunks"] += 1
+        if state["buffered"] >= self.flush_chars or time.monotonic() - state["flushed_at"] >= self.flush_interval:
+            await self.flush(key)
+
+    async def flush(self, key: str):
+        state = self._states.get(key)
+        if state is None or not state["buffer"]:
+            return
+        text = "".join(state["buffer"])
+        state["buffer"], state["buffered"] = [], 0
+        state["flushed_at"] = time.monotonic()
+        # 模型阶段的进度在 total-1 与 total 之间随输出增长逼近 total
+        progress = self.total - 1 + state["chunks"] / (state["chunks"] + 50)
+        await self._send(key, progress, text)
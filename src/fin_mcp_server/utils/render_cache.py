@@ -0,0 +1,91 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import pandas as pd
+
+logger = logging.getLogger("fin_mcp_server")
+
+# 图表样式或布局变化时递增，使旧的缓存图片失效
+STYLE_VERSION = 2
+
+DEFAULT_RENDER_CACHE_CONFIG = {
+    "max_files": 500,  # 最多保留的K线图数量
+    "max_mb": 512,     # K线图占用的最大磁盘空间
+}
+
+
+class RenderCache:
+    """
+    K线图渲染缓存
+
+    文件名由 (symbol, 最后一根K线, windows, 指标配置, 样式版本) 的哈希决定，命中时直接返回已有图片而不重新绘制；
+    超出数量或容量上限时按最近使用时间淘汰旧图片。
+    """
+    stats = {"hits": 0, "misses": 0, "evictions": 0}
+    _lock = threading.Lock()
+
+    def __init__(self, cache_dir: str, config: dict = None):
+        cache_config = dict(DEFAULT_RENDER_CACHE_CONFIG)
+        if config:
+            cache_config.update(config)
+        self.cache_dir = cache_dir
+        self.max_files = int(cache_config["max_files"])
+        self.max_bytes = int(cache_config["max_mb"] * 1024 * 1024)
+
+    @staticmethod
+    def image_name(symbol: str, history: pd.DataFrame, windows: int, config: dict, **extra) -> str:
+        """根据渲染输入生成内容寻址的图片文件名"""
+        last = history.iloc[-1]
+        last_date = pd.Timestamp(last["Date"]).strftime("%Y-%m-%d")
+        # 最后一根K线在盘中会变化，把它的 OHLCV 一并计入哈希
+        last_bar = [float(last[col]) for col in ("Open", "High", "Low", "Close", "Volume")]
+        payload = json.dumps([symbol, last_date, last_bar, int(windows), config or {}, STYLE_VERSION, extra],
+                             sort_keys=True, default=str)
+        digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+        return f"kline-{symbol}-{last_date}-{digest}.png"
+
+    def lookup(self, image_name: str):
+        """命中时返回 (chart_path, image_name) 并刷新使用时间，未命中返回 None"""
+        path = os.path.join(self.cache_dir, image_name)
+        try:
+            # 直接刷新使用时间，文件不存在（或刚被其他进程淘汰）都算未命中
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        else:
+            with self._lock:
+                RenderCache.stats["hits"] += 1
+            return path, image_name
+        with self._lock:
+            RenderCache.stats["misses"] += 1
+        return None
+
+    def evict(self):
+        """按最近使用时间淘汰超出数量或容量上限的图片"""
+        files = []
+        for path in glob.glob(os.path.join(self.cache_dir, "kline-*.png")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        count = len(files)
+        for _, size, path in files:
+            if count <= self.max_files and total <= self.max_bytes:
+                break
+            # 同时删除图片旁边的编码缓存
+            for file in [path] + glob.glob(f"{glob.escape(path)}.*"):
+                try:
+                    os.remove(file)
+                except FileNotFoundError:
+                    pass
+            count -= 1
+            total -= size
+            with self._lock:
+                RenderCache.stats["evictions"] += 1
+        return count
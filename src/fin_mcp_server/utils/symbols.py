@@ -0,0 +1,16 @@
+def normalize_symbol(symbol: str) -> str:
+    """
+    股票代码的统一写法（去掉空白并转为大写），所有工具的缓存键、本地仓库文件名都使用该写法
+
+    Raises:
+        ValueError: 代码为空
+    """
+    normalized = str(symbol or "").strip().upper()
+    if not normalized:
+        raise ValueError("Symbol must not be empty")
+    return normalized
+
+
+def normalize_symbols(symbols) -> list:
+    """逐个规范化股票代码，跳过空值并去重，保持顺序"""
+    return list(dict.fromkeys(normalize_symbol(s) for s in symbols or [] if s and str(s).strip()))
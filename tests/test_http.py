@@ -0,0 +1,113 @@
+"""YahooClient 的重试、退避与限流，针对本地 http.server 桩服务验证"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from fin_mcp_server.utils.http import RetryableHTTPError, YahooClient
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """/flaky 首次返回 429 之后返回 200，/down 始终返回 503，其他路径返回 200"""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.setdefault(self.path, []).append(time.monotonic())
+            count = len(server.hits[self.path])
+        if self.path == "/down" or (self.path == "/flaky" and count == 1):
+            status = 503 if self.path == "/down" else 429
+        else:
+            status = 200
+        body = b"ok" if status == 200 else b"error"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.hits = {}
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _client(**config):
+    client = YahooClient(config, session=requests.Session())
+    delays = []
+    backoff = client.backoff
+
+    def recording_backoff(attempt):
+        delay = backoff(attempt)
+        delays.append((attempt, delay))
+        return delay
+
+    client.backoff = recording_backoff
+    return client, delays
+
+
+def _url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def test_retries_429_then_succeeds(stub_server):
+    client, delays = _client(rate=100, burst=10, backoff_base=0.2, backoff_max=1.0)
+
+    response = client.request("GET", _url(stub_server, "/flaky"))
+
+    assert response.status_code == 200
+    assert response.text == "ok"
+    assert client.stats == {"requests": 2, "retries": 1}
+    hits = stub_server.hits["/flaky"]
+    assert len(hits) == 2
+    # 第 0 次重试的退避上限为 backoff_base，抖动落在 [上限/2, 上限] 内，且确实等待了这么久
+    [(attempt, delay)] = delays
+    assert attempt == 0
+    assert 0.1 <= delay <= 0.2
+    assert hits[1] - hits[0] >= delay
+
+
+def test_gives_up_after_max_retries(stub_server):
+    client, delays = _client(rate=100, burst=10, max_retries=2, backoff_base=0.05, backoff_max=0.08)
+
+    with pytest.raises(RetryableHTTPError) as excinfo:
+        client.request("GET", _url(stub_server, "/down"))
+
+    assert excinfo.value.status == 503
+    assert client.stats == {"requests": 3, "retries": 2}
+    assert len(stub_server.hits["/down"]) == 3
+    # 退避按指数增长并受 backoff_max 限制：0.05、0.08（0.1 被截断）
+    assert [attempt for attempt, _ in delays] == [0, 1]
+    assert 0.025 <= delays[0][1] <= 0.05
+    assert 0.04 <= delays[1][1] <= 0.08
+
+
+def test_rate_limiter_paces_requests(stub_server):
+    rate, burst, count = 20.0, 2, 6
+    client, _ = _client(rate=rate, burst=burst)
+
+    start = time.monotonic()
+    for _ in range(count):
+        assert client.request("GET", _url(stub_server, "/ok")).status_code == 200
+    elapsed = time.monotonic() - start
+
+    # 令牌桶创建时已满，突发额度用完后每个令牌需要 1/rate 秒补充
+    assert elapsed >= (count - burst) / rate
+    hits = stub_server.hits["/ok"]
+    assert len(hits) == count
+    # 服务端看到的间隔：突发请求进行期间也在补充令牌，留出余量
+    assert hits[-1] - hits[burst - 1] >= (count - burst) / rate * 0.8
+    assert client.stats == {"requests": count, "retries": 0}